@@ -2,144 +2,1373 @@
 #include <math.h>
 #include <stdbool.h>
 #include <stddef.h>
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
-bool is_const(const double array[], int n) {
-    const int a0 = array[0];
-    for (int i = 1; i < n; i++) {
-        if (array[i] != a0)
+/*
+    Internally, every matrix is an array of column pointers together with the
+    distance between two consecutive samples of a column (`stride`, counted
+    in elements). This covers both the column pointer arrays of the public
+    API (stride 1) and strided views on C- or Fortran-ordered memory, so
+    neither needs to be copied.
+
+    All temporary memory is taken from an `evpi_workspace`, so the `_ws`
+    functions do not allocate at all.
+*/
+
+struct evpi_workspace {
+    // capacity, calls with more samples or options are rejected
+    size_t n_samples;
+    size_t n_options;
+    // fixed number of bins, 0 for the cubic root of the sample number
+    unsigned int n_bins;
+    // upper limit for the number of bins, i.e. rows in each table
+    unsigned int max_n_bins;
+    int n_threads;
+    // one accumulator table (max_n_bins x n_options) per thread
+    double* bin_sums;
+    // column pointers of y
+    double** y_cols;
+    evpi_binning binning;
+    // for quantile binning: cut points (max_n_bins) and a copy of the input
+    // samples (n_samples) per thread, NULL otherwise
+    double* scratch;
+    // for evipi: bin populations (max_n_bins), CDF differences
+    // (2 * max_n_bins) and posterior expected outcomes (n_options) per
+    // thread
+    double* evipi_scratch;
+    // for group EVPPI, NULL until reserved: the cell key of every sample
+    // (n_samples), an open-addressing hash table of the occupied cells
+    // (group_capacity slots holding key + 1, 0 marks an empty slot, and the
+    // cell index) and one row of option sums per occupied cell (at most
+    // n_samples)
+    uint64_t* group_keys;
+    uint64_t* group_slots;
+    size_t* group_cells;
+    double* group_sums;
+    size_t group_capacity;
+    // for bootstrap intervals, NULL until reserved: the bin of every sample
+    // (n_samples), one table of option sums per thread (max_n_bins x
+    // n_options) and the total weight, the expected maximum value and the
+    // EVPPI of every replicate (3 x bootstrap_capacity)
+    unsigned int* bootstrap_bins;
+    double* bootstrap_sums;
+    double* bootstrap_replicates;
+    size_t bootstrap_capacity;
+};
+
+int resolve_n_threads(int n_threads) {
+#ifdef _OPENMP
+    // non-positive values use the OpenMP default (usually all cores)
+    if (n_threads <= 0)
+        return omp_get_max_threads();
+    return n_threads;
+#else
+    (void)n_threads;
+    return 1;
+#endif
+}
+
+unsigned int default_n_bins(size_t n_samples) {
+    // Use cubic root of sample number as default bin number.
+    unsigned int n_bins = (unsigned int)cbrt(n_samples);
+    return n_bins > 0 ? n_bins : 1;
+}
+
+evpi_workspace* evpi_workspace_new(size_t n_samples, size_t n_options,
+                                   unsigned int n_bins, int n_threads) {
+    evpi_workspace* ws = malloc(sizeof(evpi_workspace));
+    if (ws == NULL)
+        return NULL;
+    ws->n_samples = n_samples;
+    ws->n_options = n_options;
+    ws->n_bins = n_bins;
+    ws->max_n_bins = n_bins > 0 ? n_bins : default_n_bins(n_samples);
+    ws->n_threads = resolve_n_threads(n_threads);
+    ws->bin_sums = malloc((size_t)ws->n_threads * ws->max_n_bins * n_options *
+                          sizeof(double));
+    ws->y_cols = malloc(n_options * sizeof(double*));
+    ws->binning = EVPI_BINNING_UNIFORM;
+    ws->scratch = NULL;
+    ws->group_keys = NULL;
+    ws->group_slots = NULL;
+    ws->group_cells = NULL;
+    ws->group_sums = NULL;
+    ws->group_capacity = 0;
+    ws->bootstrap_bins = NULL;
+    ws->bootstrap_sums = NULL;
+    ws->bootstrap_replicates = NULL;
+    ws->bootstrap_capacity = 0;
+    ws->evipi_scratch =
+        malloc((size_t)ws->n_threads *
+               (3 * (size_t)ws->max_n_bins + n_options) * sizeof(double));
+    if (ws->bin_sums == NULL || ws->y_cols == NULL ||
+        ws->evipi_scratch == NULL) {
+        evpi_workspace_free(ws);
+        return NULL;
+    }
+    return ws;
+}
+
+void evpi_workspace_free(evpi_workspace* ws) {
+    if (ws == NULL)
+        return;
+    free(ws->bin_sums);
+    free(ws->y_cols);
+    free(ws->scratch);
+    free(ws->evipi_scratch);
+    free(ws->group_keys);
+    free(ws->group_slots);
+    free(ws->group_cells);
+    free(ws->group_sums);
+    free(ws->bootstrap_bins);
+    free(ws->bootstrap_sums);
+    free(ws->bootstrap_replicates);
+    free(ws);
+}
+
+int evpi_workspace_set_binning(evpi_workspace* ws, evpi_binning binning) {
+    if (binning == EVPI_BINNING_QUANTILE && ws->scratch == NULL) {
+        ws->scratch = malloc((size_t)ws->n_threads *
+                             (ws->max_n_bins + ws->n_samples) * sizeof(double));
+        if (ws->scratch == NULL)
+            return -1;
+    }
+    ws->binning = binning;
+    return 0;
+}
+
+int evpi_workspace_reserve_groups(evpi_workspace* ws) {
+    if (ws->group_keys != NULL)
+        return 0;
+    // at most half of the slots are used, so probe sequences stay short
+    size_t capacity = 1;
+    while (capacity < 2 * ws->n_samples)
+        capacity *= 2;
+    ws->group_keys = malloc(ws->n_samples * sizeof(uint64_t));
+    ws->group_slots = malloc(capacity * sizeof(uint64_t));
+    ws->group_cells = malloc(capacity * sizeof(size_t));
+    ws->group_sums = malloc(ws->n_samples * ws->n_options * sizeof(double));
+    if (ws->group_keys == NULL || ws->group_slots == NULL ||
+        ws->group_cells == NULL || ws->group_sums == NULL) {
+        free(ws->group_keys);
+        free(ws->group_slots);
+        free(ws->group_cells);
+        free(ws->group_sums);
+        ws->group_keys = NULL;
+        ws->group_slots = NULL;
+        ws->group_cells = NULL;
+        ws->group_sums = NULL;
+        return -1;
+    }
+    ws->group_capacity = capacity;
+    return 0;
+}
+
+int evpi_workspace_reserve_bootstrap(evpi_workspace* ws, size_t n_bootstrap) {
+    if (n_bootstrap <= ws->bootstrap_capacity)
+        return 0;
+    free(ws->bootstrap_replicates);
+    ws->bootstrap_capacity = 0;
+    ws->bootstrap_replicates = malloc(3 * n_bootstrap * sizeof(double));
+    if (ws->bootstrap_bins == NULL) {
+        ws->bootstrap_bins = malloc(ws->n_samples * sizeof(unsigned int));
+        ws->bootstrap_sums = malloc((size_t)ws->n_threads * ws->max_n_bins *
+                                    ws->n_options * sizeof(double));
+    }
+    if (ws->bootstrap_bins == NULL || ws->bootstrap_sums == NULL ||
+        ws->bootstrap_replicates == NULL)
+        return -1;
+    ws->bootstrap_capacity = n_bootstrap;
+    return 0;
+}
+
+bool fits_workspace(const evpi_workspace* ws, size_t n_samples,
+                    size_t n_options) {
+    return ws != NULL && n_samples > 0 && n_samples <= ws->n_samples &&
+           n_options > 0 && n_options <= ws->n_options;
+}
+
+unsigned int workspace_n_bins(const evpi_workspace* ws, size_t n_samples) {
+    return ws->n_bins > 0 ? ws->n_bins : default_n_bins(n_samples);
+}
+
+// scratch memory of one thread for quantile binning, NULL for uniform bins
+double* workspace_scratch(const evpi_workspace* ws, int thread_i) {
+    if (ws->binning != EVPI_BINNING_QUANTILE)
+        return NULL;
+    return ws->scratch + (size_t)thread_i * (ws->max_n_bins + ws->n_samples);
+}
+
+void fill_strided_cols(double** cols, double* base, ptrdiff_t col_stride,
+                       size_t n_cols) {
+    for (size_t j = 0; j < n_cols; j++) {
+        cols[j] = base + (ptrdiff_t)j * col_stride;
+    }
+}
+
+bool is_const(double* array, ptrdiff_t stride, size_t n) {
+    const double a0 = array[0];
+    for (size_t i = 1; i < n; i++) {
+        if (array[(ptrdiff_t)i * stride] != a0)
             return false;
     }
     return true;
 }
 
-double* mean_samples(double** matrix, size_t n_samples, size_t n_vars) {
-    double* result = malloc(n_vars * sizeof(double));
-    for (size_t j = 0; j < n_vars; j++) {
+double maximum(double* vector, size_t length) {
+    double result = vector[0];
+    for (size_t i = 1; i < length; i++) {
+        if (vector[i] > result) {
+            result = vector[i];
+        }
+    }
+    return result;
+}
+
+/*
+    Sample weights are given by a pointer and a stride like the columns of a
+    matrix. NULL weighs every sample with one, so all means are divided by
+    the total weight instead of the sample number.
+*/
+double total_weight(const double* weights, ptrdiff_t w_stride,
+                    size_t n_samples) {
+    if (weights == NULL)
+        return (double)n_samples;
+    double total = 0;
+    for (size_t i = 0; i < n_samples; i++) {
+        total += weights[(ptrdiff_t)i * w_stride];
+    }
+    return total;
+}
+
+double expected_max_value(double** y, ptrdiff_t stride, const double* weights,
+                          ptrdiff_t w_stride, size_t n_samples,
+                          size_t n_options) {
+    // highest (weighted) mean over all decision options
+    double result = 0;
+    for (size_t j = 0; j < n_options; j++) {
         double sum = 0;
         for (size_t i = 0; i < n_samples; i++) {
-            sum += matrix[j][i];
+            double weight =
+                weights != NULL ? weights[(ptrdiff_t)i * w_stride] : 1;
+            sum += weight * y[j][(ptrdiff_t)i * stride];
         }
-        result[j] = sum / n_samples;
+        if (j == 0 || sum > result)
+            result = sum;
     }
-    return result;
+    return result / total_weight(weights, w_stride, n_samples);
 }
 
-double* max_vars(double** matrix, size_t n_samples, size_t n_vars) {
-    double* result = malloc(n_samples * sizeof(double));
-    double max_val;
+double mean_max_vars(double** y, ptrdiff_t stride, const double* weights,
+                     ptrdiff_t w_stride, size_t n_samples, size_t n_options,
+                     int n_threads) {
+    // (weighted) mean over all samples of the highest value among all options
+    double sum = 0;
+#pragma omp parallel for num_threads(n_threads) schedule(static)               \
+    reduction(+ : sum)
     for (size_t i = 0; i < n_samples; i++) {
-        max_val = matrix[0][i];
-        for (size_t j = 1; j < n_vars; j++) {
-            if (matrix[j][i] > max_val) {
-                max_val = matrix[j][i];
+        double max_val = y[0][(ptrdiff_t)i * stride];
+        for (size_t j = 1; j < n_options; j++) {
+            if (y[j][(ptrdiff_t)i * stride] > max_val) {
+                max_val = y[j][(ptrdiff_t)i * stride];
             }
         }
-        result[i] = max_val;
+        double weight = weights != NULL ? weights[(ptrdiff_t)i * w_stride] : 1;
+        sum += weight * max_val;
     }
-    return result;
+    return sum / total_weight(weights, w_stride, n_samples);
 }
 
-double minimum(double* vector, size_t length) {
-    double result = vector[0];
+void min_max(double* vector, ptrdiff_t stride, size_t length, double* min_val,
+             double* max_val, int n_threads) {
+    double min_res = vector[0];
+    double max_res = vector[0];
+#pragma omp parallel for num_threads(n_threads) schedule(static)               \
+    reduction(min : min_res) reduction(max : max_res)
     for (size_t i = 1; i < length; i++) {
-        if (vector[i] < result) {
-            result = vector[i];
-        }
+        double val = vector[(ptrdiff_t)i * stride];
+        if (val < min_res)
+            min_res = val;
+        if (val > max_res)
+            max_res = val;
     }
-    return result;
+    *min_val = min_res;
+    *max_val = max_res;
 }
 
-double maximum(double* vector, size_t length) {
-    double result = vector[0];
-    for (size_t i = 1; i < length; i++) {
-        if (vector[i] > result) {
-            result = vector[i];
+void swap(double* a, double* b) {
+    double tmp = *a;
+    *a = *b;
+    *b = tmp;
+}
+
+// Partially reorders `values[lo..hi)`, so that `values[k]` is the value of
+// rank `k` (quickselect, expected linear time).
+void select_nth(double* values, size_t lo, size_t hi, size_t k) {
+    while (hi - lo > 1) {
+        // median of three as pivot
+        double a = values[lo];
+        double b = values[lo + (hi - lo) / 2];
+        double c = values[hi - 1];
+        double pivot = a < b ? (b < c ? b : (a < c ? c : a))
+                             : (a < c ? a : (b < c ? c : b));
+        // three-way partition, so many equal values do not degrade it
+        size_t lt = lo, i = lo, gt = hi;
+        while (i < gt) {
+            if (values[i] < pivot)
+                swap(&values[lt++], &values[i++]);
+            else if (values[i] > pivot)
+                swap(&values[i], &values[--gt]);
+            else
+                i++;
         }
+        if (k < lt)
+            hi = lt;
+        else if (k >= gt)
+            lo = gt;
+        else
+            return;
     }
-    return result;
 }
 
-double mean(double* vector, size_t length) {
-    double sum = 0;
-    for (size_t i = 0; i < length; i++) {
-        sum += vector[i];
-    }
-    double result = sum / length;
-    return result;
+// Finds the cut points `k_lo <= k < k_hi` between bins with equal sample
+// counts, i.e. the values of rank `k * n_samples / n_bins`. Selecting the
+// middle cut first splits the remaining work in halves.
+void select_cuts(double* values, size_t lo, size_t hi, size_t n_samples,
+                 unsigned int n_bins, unsigned int k_lo, unsigned int k_hi,
+                 double* cuts) {
+    if (k_lo >= k_hi)
+        return;
+    unsigned int k = k_lo + (k_hi - k_lo) / 2;
+    size_t rank = (size_t)k * n_samples / n_bins;
+    select_nth(values, lo, hi, rank);
+    cuts[k - 1] = values[rank];
+    select_cuts(values, lo, rank, n_samples, n_bins, k_lo, k, cuts);
+    select_cuts(values, rank + 1, hi, n_samples, n_bins, k + 1, k_hi, cuts);
 }
 
-double* get_row(double** matrix, size_t row_idx) { return matrix[row_idx]; }
+// Bin of `value` given the `n_bins - 1` sorted cut points: the number of
+// cut points less or equal to it.
+size_t quantile_bin(const double* cuts, unsigned int n_bins, double value) {
+    size_t lo = 0, hi = n_bins - 1;
+    while (lo < hi) {
+        size_t mid = lo + (hi - lo) / 2;
+        if (cuts[mid] <= value)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+    return lo;
+}
 
-double calc_ev_pi(double* x, double** y, size_t n_samples, size_t n_options,
-                  unsigned int n_bins) {
-    double* y_subset_sum = malloc(n_options * sizeof(double));
+double calc_ev_pi(double* x, ptrdiff_t x_stride, double** y, ptrdiff_t y_stride,
+                  const double* weights, ptrdiff_t w_stride, size_t n_samples,
+                  size_t n_options, unsigned int n_bins, double* bin_sums,
+                  double* scratch, int n_threads) {
+    // accumulator table with one row of option sums per bin, one table per
+    // thread, so the samples can be split between threads without locking
+    size_t table_size = (size_t)n_bins * n_options;
     double sum_res = 0;
 
-    unsigned int* bin_idxs = malloc(n_samples * sizeof(unsigned int));
-    double x_min = minimum(x, n_samples);
-    double x_max = maximum(x, n_samples);
-    double bin_size = (x_max - x_min) / n_bins;
-    // iterate over all samples
-    for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
-        bin_idxs[sample_i] = (int)((x[sample_i] - x_min) / bin_size);
+    // equally wide bins by default, bins with equal sample counts, if
+    // there is scratch memory for the cut points
+    double x_min = 0, x_max = 0, bin_scale = 0;
+    double* cuts = scratch;
+    if (cuts != NULL) {
+        double* values = scratch + n_bins;
+        for (size_t i = 0; i < n_samples; i++) {
+            values[i] = x[(ptrdiff_t)i * x_stride];
+        }
+        select_cuts(values, 0, n_samples, n_samples, n_bins, 1, n_bins, cuts);
+    } else {
+        min_max(x, x_stride, n_samples, &x_min, &x_max, n_threads);
+        bin_scale = n_bins / (x_max - x_min);
     }
 
-    // iterate over all bins
-    for (unsigned int bin_i = 0; bin_i < n_bins; bin_i++) {
-        // (re)set y_subset_sum to zero
-        for (size_t option_i = 0; option_i < n_options; option_i++) {
-            y_subset_sum[option_i] = 0;
-        }
-        // iterate over all samples
+    // the team might get less threads than requested, so all tables are reset
+    memset(bin_sums, 0, n_threads * table_size * sizeof(double));
+
+#pragma omp parallel num_threads(n_threads)
+    {
+#ifdef _OPENMP
+        int thread_i = omp_get_thread_num();
+#else
+        int thread_i = 0;
+#endif
+        double* thread_sums = bin_sums + thread_i * table_size;
+        // add every sample to the row of its bin in a single pass
+#pragma omp for schedule(static)
         for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
-            if (bin_idxs[sample_i] != bin_i)
-                continue;
-            // if in bin iterate over decision options
-            for (size_t option_i = 0; option_i < n_options; option_i++) {
-                y_subset_sum[option_i] += y[option_i][sample_i];
+            double value = x[(ptrdiff_t)sample_i * x_stride];
+            size_t bin_i;
+            if (cuts != NULL) {
+                bin_i = quantile_bin(cuts, n_bins, value);
+            } else {
+                bin_i = (size_t)((value - x_min) * bin_scale);
+                // the maximum sample lies on the upper edge of the last bin
+                if (bin_i >= n_bins)
+                    bin_i = n_bins - 1;
             }
+            double* bin_row = thread_sums + bin_i * n_options;
+            if (weights != NULL) {
+                double weight = weights[(ptrdiff_t)sample_i * w_stride];
+                for (size_t option_i = 0; option_i < n_options; option_i++) {
+                    bin_row[option_i] +=
+                        weight * y[option_i][(ptrdiff_t)sample_i * y_stride];
+                }
+            } else {
+                for (size_t option_i = 0; option_i < n_options; option_i++) {
+                    bin_row[option_i] +=
+                        y[option_i][(ptrdiff_t)sample_i * y_stride];
+                }
+            }
+        }
+    }
+
+    // merge the tables of all threads into the first one
+    for (int thread_i = 1; thread_i < n_threads; thread_i++) {
+        double* thread_sums = bin_sums + thread_i * table_size;
+        for (size_t i = 0; i < table_size; i++) {
+            bin_sums[i] += thread_sums[i];
         }
-        sum_res += maximum(y_subset_sum, n_options);
     }
-    return sum_res / (double)n_samples;
+
+    // take the best decision option in every bin
+    for (unsigned int bin_i = 0; bin_i < n_bins; bin_i++) {
+        sum_res += maximum(bin_sums + (size_t)bin_i * n_options, n_options);
+    }
+    return sum_res / total_weight(weights, w_stride, n_samples);
 }
 
-double evppi(double* x, double** y, size_t n_samples, size_t n_options) {
+double evppi_cols(double* x, ptrdiff_t x_stride, double** y, ptrdiff_t y_stride,
+                  const double* weights, ptrdiff_t w_stride, size_t n_samples,
+                  size_t n_options, double emv, unsigned int n_bins,
+                  double* bin_sums, double* scratch, int n_threads) {
     /*
     Check if there is variance (-> uncertainty) in the input.
     If there is none, then there can't be any value in reducing it.
     */
-    if (is_const(x, n_samples)) {
+    if (is_const(x, x_stride, n_samples)) {
         return 0;
     }
+    double ev_pi =
+        calc_ev_pi(x, x_stride, y, y_stride, weights, w_stride, n_samples,
+                   n_options, n_bins, bin_sums, scratch, n_threads);
+    return ev_pi - emv;
+}
 
-    // Use cubic root of sample number as default bin number.
-    unsigned int n_bins = (unsigned int)cbrt(n_samples);
-
-    // expected maximum value
-    double emv = maximum(mean_samples(y, n_samples, n_options), n_options);
-    double ev_pi = calc_ev_pi(x, y, n_samples, n_options, n_bins);
+double evpi_cols(double** y, ptrdiff_t y_stride, const double* weights,
+                 ptrdiff_t w_stride, size_t n_samples, size_t n_options,
+                 int n_threads) {
+    double emv = expected_max_value(y, y_stride, weights, w_stride, n_samples,
+                                    n_options);
+    double ev_pi = mean_max_vars(y, y_stride, weights, w_stride, n_samples,
+                                 n_options, n_threads);
     return ev_pi - emv;
 }
 
+void multi_evppi_cols(double** x_cols, double* x, ptrdiff_t x_row_stride,
+                      ptrdiff_t x_col_stride, double** y, ptrdiff_t y_stride,
+                      const double* weights, ptrdiff_t w_stride,
+                      size_t n_samples, size_t n_variables, size_t n_options,
+                      double threshold, evpi_workspace* ws, double* out) {
+    int n_threads = ws->n_threads;
+    unsigned int n_bins = workspace_n_bins(ws, n_samples);
+    size_t table_size = (size_t)n_bins * n_options;
+    double emv = expected_max_value(y, y_stride, weights, w_stride, n_samples,
+                                    n_options);
+    double evpi_val = mean_max_vars(y, y_stride, weights, w_stride, n_samples,
+                                    n_options, n_threads) -
+                      emv;
+
+    /*
+    With enough variables every thread processes whole variables, otherwise
+    the threads share the samples of one variable at a time.
+    */
+    int n_outer_threads = 1;
+    int n_inner_threads = n_threads;
+    if (n_variables >= (size_t)n_threads) {
+        n_outer_threads = n_threads;
+        n_inner_threads = 1;
+    }
+
+#pragma omp parallel num_threads(n_outer_threads)
+    {
+#ifdef _OPENMP
+        int thread_i = n_outer_threads > 1 ? omp_get_thread_num() : 0;
+#else
+        int thread_i = 0;
+#endif
+        double* bin_sums = ws->bin_sums + thread_i * table_size;
+        double* scratch = workspace_scratch(ws, thread_i);
+#pragma omp for schedule(dynamic)
+        for (size_t variable_i = 0; variable_i < n_variables; variable_i++) {
+            // x is either given by column pointers or by strides
+            double* x_var = x_cols != NULL
+                                ? x_cols[variable_i]
+                                : x + (ptrdiff_t)variable_i * x_col_stride;
+            out[variable_i] = evppi_cols(
+                x_var, x_row_stride, y, y_stride, weights, w_stride, n_samples,
+                n_options, emv, n_bins, bin_sums, scratch, n_inner_threads);
+            if (out[variable_i] < evpi_val * threshold)
+                out[variable_i] = 0;
+        }
+    }
+}
+
+double evppi_weighted_ws(double* x, ptrdiff_t x_stride, double* y,
+                         ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                         const double* weights, ptrdiff_t w_stride,
+                         size_t n_samples, size_t n_options,
+                         evpi_workspace* ws) {
+    if (!fits_workspace(ws, n_samples, n_options))
+        return NAN;
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    double emv = expected_max_value(ws->y_cols, y_row_stride, weights, w_stride,
+                                    n_samples, n_options);
+    return evppi_cols(x, x_stride, ws->y_cols, y_row_stride, weights, w_stride,
+                      n_samples, n_options, emv,
+                      workspace_n_bins(ws, n_samples), ws->bin_sums,
+                      workspace_scratch(ws, 0), ws->n_threads);
+}
+
+double evppi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, evpi_workspace* ws) {
+    return evppi_weighted_ws(x, x_stride, y, y_row_stride, y_col_stride, NULL,
+                             0, n_samples, n_options, ws);
+}
+
+double evpi_weighted_ws(double* y, ptrdiff_t y_row_stride,
+                        ptrdiff_t y_col_stride, const double* weights,
+                        ptrdiff_t w_stride, size_t n_samples, size_t n_options,
+                        evpi_workspace* ws) {
+    if (!fits_workspace(ws, n_samples, n_options))
+        return NAN;
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    return evpi_cols(ws->y_cols, y_row_stride, weights, w_stride, n_samples,
+                     n_options, ws->n_threads);
+}
+
+double evpi_ws(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+               size_t n_samples, size_t n_options, evpi_workspace* ws) {
+    return evpi_weighted_ws(y, y_row_stride, y_col_stride, NULL, 0, n_samples,
+                            n_options, ws);
+}
+
+void multi_evppi_weighted_ws(double* x, ptrdiff_t x_row_stride,
+                             ptrdiff_t x_col_stride, double* y,
+                             ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                             const double* weights, ptrdiff_t w_stride,
+                             size_t n_samples, size_t n_variables,
+                             size_t n_options, double threshold,
+                             evpi_workspace* ws, double* out) {
+    if (!fits_workspace(ws, n_samples, n_options)) {
+        for (size_t i = 0; i < n_variables; i++) {
+            out[i] = NAN;
+        }
+        return;
+    }
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    multi_evppi_cols(NULL, x, x_row_stride, x_col_stride, ws->y_cols,
+                     y_row_stride, weights, w_stride, n_samples, n_variables,
+                     n_options, threshold, ws, out);
+}
+
+void multi_evppi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    double threshold, evpi_workspace* ws, double* out) {
+    multi_evppi_weighted_ws(x, x_row_stride, x_col_stride, y, y_row_stride,
+                            y_col_stride, NULL, 0, n_samples, n_variables,
+                            n_options, threshold, ws, out);
+}
+
+double evppi(double* x, double** y, size_t n_samples, size_t n_options,
+             int n_threads) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, n_threads);
+    if (ws == NULL)
+        return NAN;
+    double emv = expected_max_value(y, 1, NULL, 0, n_samples, n_options);
+    double res = evppi_cols(x, 1, y, 1, NULL, 0, n_samples, n_options, emv,
+                            workspace_n_bins(ws, n_samples), ws->bin_sums, NULL,
+                            ws->n_threads);
+    evpi_workspace_free(ws);
+    return res;
+}
+
 double evpi(double** y, size_t n_samples, size_t n_options) {
-    double emv = maximum(mean_samples(y, n_samples, n_options), n_options);
-    double ev_pi = mean(max_vars(y, n_samples, n_options), n_samples);
-    return ev_pi - emv;
+    return evpi_cols(y, 1, NULL, 0, n_samples, n_options, 1);
 }
 
 double* multi_evppi(double** x, double** y, size_t n_samples,
-                    size_t n_variables, size_t n_options, double threshold) {
-    double evpi_val = evpi(y, n_samples, n_options);
-    double* x_var;
-    double* evppi_val = malloc(n_variables * sizeof(double));
+                    size_t n_variables, size_t n_options, double threshold,
+                    int n_threads) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, n_threads);
+    double* out = malloc(n_variables * sizeof(double));
+    if (ws == NULL || out == NULL) {
+        evpi_workspace_free(ws);
+        free(out);
+        return NULL;
+    }
+    multi_evppi_cols(x, NULL, 1, 0, y, 1, NULL, 0, n_samples, n_variables,
+                     n_options, threshold, ws, out);
+    evpi_workspace_free(ws);
+    return out;
+}
+
+double evppi_strided(double* x, ptrdiff_t x_stride, double* y,
+                     ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                     size_t n_samples, size_t n_options, int n_threads) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, n_threads);
+    double res = evppi_ws(x, x_stride, y, y_row_stride, y_col_stride, n_samples,
+                          n_options, ws);
+    evpi_workspace_free(ws);
+    return res;
+}
+
+double evpi_strided(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_options) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, 1);
+    double res =
+        evpi_ws(y, y_row_stride, y_col_stride, n_samples, n_options, ws);
+    evpi_workspace_free(ws);
+    return res;
+}
+
+double* multi_evppi_strided(double* x, ptrdiff_t x_row_stride,
+                            ptrdiff_t x_col_stride, double* y,
+                            ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                            size_t n_samples, size_t n_variables,
+                            size_t n_options, double threshold, int n_threads) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, n_threads);
+    double* out = malloc(n_variables * sizeof(double));
+    if (ws == NULL || out == NULL) {
+        evpi_workspace_free(ws);
+        free(out);
+        return NULL;
+    }
+    multi_evppi_ws(x, x_row_stride, x_col_stride, y, y_row_stride, y_col_stride,
+                   n_samples, n_variables, n_options, threshold, ws, out);
+    evpi_workspace_free(ws);
+    return out;
+}
+
+unsigned int default_group_n_bins(size_t n_samples, size_t n_dims) {
+    // n^(1/(d+2)) bins per dimension, the cubic root for a single variable
+    unsigned int n_bins =
+        (unsigned int)(pow((double)n_samples, 1.0 / (n_dims + 2)) + 1e-9);
+    return n_bins > 0 ? n_bins : 1;
+}
+
+/*
+    Group EVPPI, s. `group_evppi` of the Python package. The bin indices of
+    all dimensions are combined into one mixed-radix key per sample, which
+    is looked up in an open-addressing hash table of the occupied cells, so
+    only as many rows of option sums as there are occupied cells are needed
+    instead of a dense table with a row for every cell.
+*/
+double group_evppi_cols(double** x_cols, double* x, ptrdiff_t x_row_stride,
+                        ptrdiff_t x_col_stride, double** y, ptrdiff_t y_stride,
+                        size_t n_samples, size_t n_dims, size_t n_options,
+                        const unsigned int* n_bins_per_dim,
+                        evpi_workspace* ws) {
+    int n_threads = ws->n_threads;
+    uint64_t* keys = ws->group_keys;
+
+    // the keys of all cells and the empty slot marker must fit into 64 bits
+    uint64_t n_cells_dense = 1;
+    for (size_t dim_i = 0; dim_i < n_dims; dim_i++) {
+        uint64_t n_bins = n_bins_per_dim != NULL && n_bins_per_dim[dim_i] > 0
+                              ? n_bins_per_dim[dim_i]
+                              : default_group_n_bins(n_samples, n_dims);
+        if (n_cells_dense > (UINT64_MAX - 1) / n_bins)
+            return NAN;
+        n_cells_dense *= n_bins;
+    }
+
+    memset(keys, 0, n_samples * sizeof(uint64_t));
+    for (size_t dim_i = 0; dim_i < n_dims; dim_i++) {
+        double* x_dim = x_cols != NULL ? x_cols[dim_i]
+                                       : x + (ptrdiff_t)dim_i * x_col_stride;
+        unsigned int n_bins =
+            n_bins_per_dim != NULL && n_bins_per_dim[dim_i] > 0
+                ? n_bins_per_dim[dim_i]
+                : default_group_n_bins(n_samples, n_dims);
+        double x_min, x_max;
+        min_max(x_dim, x_row_stride, n_samples, &x_min, &x_max, n_threads);
+        // constant dimensions are put into the first bin entirely
+        double bin_scale = x_max > x_min ? n_bins / (x_max - x_min) : 0;
+#pragma omp parallel for num_threads(n_threads) schedule(static)
+        for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+            size_t bin_i =
+                (size_t)((x_dim[(ptrdiff_t)sample_i * x_row_stride] - x_min) *
+                         bin_scale);
+            // the maximum sample lies on the upper edge of the last bin
+            if (bin_i >= n_bins)
+                bin_i = n_bins - 1;
+            keys[sample_i] = keys[sample_i] * n_bins + bin_i;
+        }
+    }
+
+    // Fibonacci hashing of the keys into a power of two sized table
+    int shift = 64;
+    for (size_t capacity = ws->group_capacity; capacity > 1; capacity /= 2)
+        shift--;
+    size_t mask = ws->group_capacity - 1;
+    memset(ws->group_slots, 0, ws->group_capacity * sizeof(uint64_t));
+    size_t n_cells = 0;
+    for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+        uint64_t slot_key = keys[sample_i] + 1;
+        size_t slot_i =
+            shift < 64 ? (size_t)((slot_key * 0x9E3779B97F4A7C15ULL) >> shift)
+                       : 0;
+        while (ws->group_slots[slot_i] != 0 &&
+               ws->group_slots[slot_i] != slot_key)
+            slot_i = (slot_i + 1) & mask;
+        double* cell_row;
+        if (ws->group_slots[slot_i] == 0) {
+            ws->group_slots[slot_i] = slot_key;
+            ws->group_cells[slot_i] = n_cells;
+            cell_row = ws->group_sums + n_cells * n_options;
+            memset(cell_row, 0, n_options * sizeof(double));
+            n_cells++;
+        } else {
+            cell_row = ws->group_sums + ws->group_cells[slot_i] * n_options;
+        }
+        for (size_t option_i = 0; option_i < n_options; option_i++) {
+            cell_row[option_i] += y[option_i][(ptrdiff_t)sample_i * y_stride];
+        }
+    }
+
+    // if the whole group is deterministic, further information can not have
+    // any value
+    if (n_cells == 1)
+        return 0;
+
+    // take the best decision option in every occupied cell
+    double sum_res = 0;
+    for (size_t cell_i = 0; cell_i < n_cells; cell_i++) {
+        sum_res += maximum(ws->group_sums + cell_i * n_options, n_options);
+    }
+    double emv = expected_max_value(y, y_stride, NULL, 0, n_samples, n_options);
+    return sum_res / (double)n_samples - emv;
+}
+
+double group_evppi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                      double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                      size_t n_samples, size_t n_dims, size_t n_options,
+                      const unsigned int* n_bins_per_dim, evpi_workspace* ws) {
+    if (!fits_workspace(ws, n_samples, n_options) || ws->group_keys == NULL ||
+        n_dims == 0)
+        return NAN;
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    return group_evppi_cols(NULL, x, x_row_stride, x_col_stride, ws->y_cols,
+                            y_row_stride, n_samples, n_dims, n_options,
+                            n_bins_per_dim, ws);
+}
+
+double group_evppi(double** x, double** y, size_t n_samples, size_t n_dims,
+                   size_t n_options, const unsigned int* n_bins_per_dim,
+                   int n_threads) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, n_threads);
+    if (ws == NULL || n_dims == 0 || evpi_workspace_reserve_groups(ws) != 0) {
+        evpi_workspace_free(ws);
+        return NAN;
+    }
+    double res = group_evppi_cols(x, NULL, 1, 0, y, 1, n_samples, n_dims,
+                                  n_options, n_bins_per_dim, ws);
+    evpi_workspace_free(ws);
+    return res;
+}
+
+// Bin of every sample of `x`, with the binning of `calc_ev_pi`.
+void bin_samples(double* x, ptrdiff_t x_stride, size_t n_samples,
+                 unsigned int n_bins, double* scratch, unsigned int* bins) {
+    double x_min = 0, x_max = 0, bin_scale = 0;
+    double* cuts = scratch;
+    if (cuts != NULL) {
+        double* values = scratch + n_bins;
+        for (size_t i = 0; i < n_samples; i++) {
+            values[i] = x[(ptrdiff_t)i * x_stride];
+        }
+        select_cuts(values, 0, n_samples, n_samples, n_bins, 1, n_bins, cuts);
+    } else {
+        min_max(x, x_stride, n_samples, &x_min, &x_max, 1);
+        bin_scale = n_bins / (x_max - x_min);
+    }
+    for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+        double value = x[(ptrdiff_t)sample_i * x_stride];
+        size_t bin_i;
+        if (cuts != NULL) {
+            bin_i = quantile_bin(cuts, n_bins, value);
+        } else {
+            bin_i = (size_t)((value - x_min) * bin_scale);
+            if (bin_i >= n_bins)
+                bin_i = n_bins - 1;
+        }
+        bins[sample_i] = (unsigned int)bin_i;
+    }
+}
+
+uint64_t splitmix64(uint64_t z) {
+    z += 0x9E3779B97F4A7C15ULL;
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+// Poisson(1) counts above this are cut off (probability below 1e-7).
+#define POISSON_TABLE_SIZE 10
+
+// cumulative probabilities of the Poisson(1) distribution, scaled to the
+// range of 64 bit integers
+void poisson_thresholds(uint64_t* thresholds) {
+    double p = exp(-1.0);
+    double cdf = p;
+    for (int k = 0; k < POISSON_TABLE_SIZE; k++) {
+        thresholds[k] = (uint64_t)(cdf * 0x1.0p64);
+        p /= k + 1;
+        cdf += p;
+    }
+}
+
+/*
+    Poisson(1) weight of a sample in a replicate. The weight only depends on
+    the key of the replicate and the sample index (counter-based), so it is
+    the same for all variables and any number of threads. It is found by
+    comparing a uniform integer with all cumulative probabilities instead of
+    searching, which avoids unpredictable branches.
+*/
+double poisson_weight(const uint64_t* thresholds, uint64_t replicate_key,
+                      size_t sample_i) {
+    uint64_t u = splitmix64(replicate_key ^ sample_i);
+    int k = 0;
+    for (int i = 0; i < POISSON_TABLE_SIZE; i++)
+        k += u > thresholds[i];
+    return k;
+}
+
+int compare_doubles(const void* a, const void* b) {
+    double diff = *(const double*)a - *(const double*)b;
+    return (diff > 0) - (diff < 0);
+}
+
+// percentile with linear interpolation between the sorted values
+double sorted_percentile(const double* sorted, size_t n, double q) {
+    double position = q * (n - 1);
+    size_t lo = (size_t)position;
+    if (lo + 1 >= n)
+        return sorted[n - 1];
+    return sorted[lo] + (position - lo) * (sorted[lo + 1] - sorted[lo]);
+}
+
+/*
+    Bootstrap confidence intervals, s. `bootstrap_intervals` of the Python
+    package. The bins of a variable are assigned once, then every replicate
+    reweights the samples with Poisson(1) counts while summing them per bin.
+    The threads share the replicates.
+*/
+void multi_evppi_bootstrap_cols(double* x, ptrdiff_t x_row_stride,
+                                ptrdiff_t x_col_stride, double** y,
+                                ptrdiff_t y_stride, size_t n_samples,
+                                size_t n_variables, size_t n_options,
+                                size_t n_bootstrap, double confidence,
+                                uint64_t seed, evpi_workspace* ws,
+                                double* lower, double* upper) {
+    int n_threads = ws->n_threads;
+    unsigned int n_bins = workspace_n_bins(ws, n_samples);
+    size_t table_size = (size_t)n_bins * n_options;
+    double* totals = ws->bootstrap_replicates + n_bootstrap;
+    double* emvs = ws->bootstrap_replicates + 2 * n_bootstrap;
+    double* replicates = ws->bootstrap_replicates;
+    uint64_t thresholds[POISSON_TABLE_SIZE];
+    poisson_thresholds(thresholds);
+    double alpha = (1 - confidence) / 2;
+
+    // total weight and expected maximum value of every replicate, which are
+    // shared by all variables
+#pragma omp parallel num_threads(n_threads)
+    {
+#ifdef _OPENMP
+        int thread_i = omp_get_thread_num();
+#else
+        int thread_i = 0;
+#endif
+        double* option_sums = ws->bootstrap_sums + thread_i * table_size;
+#pragma omp for schedule(static)
+        for (size_t replicate_i = 0; replicate_i < n_bootstrap; replicate_i++) {
+            uint64_t key = splitmix64(seed + replicate_i);
+            double total = 0;
+            memset(option_sums, 0, n_options * sizeof(double));
+            for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+                double weight = poisson_weight(thresholds, key, sample_i);
+                total += weight;
+                for (size_t option_i = 0; option_i < n_options; option_i++) {
+                    option_sums[option_i] +=
+                        weight * y[option_i][(ptrdiff_t)sample_i * y_stride];
+                }
+            }
+            totals[replicate_i] = total;
+            emvs[replicate_i] = maximum(option_sums, n_options) / total;
+        }
+    }
+
     for (size_t variable_i = 0; variable_i < n_variables; variable_i++) {
-        x_var = get_row(x, variable_i);
-        evppi_val[variable_i] = evppi(x_var, y, n_samples, n_options);
-        if (evppi_val[variable_i] < evpi_val * threshold)
-            evppi_val[variable_i] = 0;
+        double* x_var = x + (ptrdiff_t)variable_i * x_col_stride;
+        // if input is deterministic, further information can not have any
+        // value
+        if (is_const(x_var, x_row_stride, n_samples)) {
+            lower[variable_i] = 0;
+            upper[variable_i] = 0;
+            continue;
+        }
+        bin_samples(x_var, x_row_stride, n_samples, n_bins,
+                    workspace_scratch(ws, 0), ws->bootstrap_bins);
+
+#pragma omp parallel num_threads(n_threads)
+        {
+#ifdef _OPENMP
+            int thread_i = omp_get_thread_num();
+#else
+            int thread_i = 0;
+#endif
+            double* bin_sums = ws->bootstrap_sums + thread_i * table_size;
+#pragma omp for schedule(static)
+            for (size_t replicate_i = 0; replicate_i < n_bootstrap;
+                 replicate_i++) {
+                uint64_t key = splitmix64(seed + replicate_i);
+                memset(bin_sums, 0, table_size * sizeof(double));
+                for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+                    double weight = poisson_weight(thresholds, key, sample_i);
+                    double* bin_row =
+                        bin_sums + ws->bootstrap_bins[sample_i] * n_options;
+                    for (size_t option_i = 0; option_i < n_options;
+                         option_i++) {
+                        bin_row[option_i] +=
+                            weight *
+                            y[option_i][(ptrdiff_t)sample_i * y_stride];
+                    }
+                }
+                double sum_res = 0;
+                for (unsigned int bin_i = 0; bin_i < n_bins; bin_i++) {
+                    sum_res += maximum(bin_sums + (size_t)bin_i * n_options,
+                                       n_options);
+                }
+                replicates[replicate_i] =
+                    sum_res / totals[replicate_i] - emvs[replicate_i];
+            }
+        }
+
+        qsort(replicates, n_bootstrap, sizeof(double), compare_doubles);
+        lower[variable_i] = sorted_percentile(replicates, n_bootstrap, alpha);
+        upper[variable_i] =
+            sorted_percentile(replicates, n_bootstrap, 1 - alpha);
+    }
+}
+
+void multi_evppi_bootstrap_ws(
+    double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride, double* y,
+    ptrdiff_t y_row_stride, ptrdiff_t y_col_stride, size_t n_samples,
+    size_t n_variables, size_t n_options, size_t n_bootstrap, double confidence,
+    uint64_t seed, evpi_workspace* ws, double* lower, double* upper) {
+    if (!fits_workspace(ws, n_samples, n_options) || n_bootstrap == 0 ||
+        n_bootstrap > ws->bootstrap_capacity) {
+        for (size_t i = 0; i < n_variables; i++) {
+            lower[i] = NAN;
+            upper[i] = NAN;
+        }
+        return;
+    }
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    multi_evppi_bootstrap_cols(x, x_row_stride, x_col_stride, ws->y_cols,
+                               y_row_stride, n_samples, n_variables, n_options,
+                               n_bootstrap, confidence, seed, ws, lower, upper);
+}
+
+/*
+    EVIPI (imperfect information), s. `_calc_ev_ipi` of the Python package.
+    After information with posterior standard deviation `std`, the posterior
+    mean is normally distributed with the remaining variance
+    `var(x) - std**2`. For a posterior mean in the center of bin `i`, the
+    probability of the true value lying in bin `j` only depends on `j - i`,
+    since all bins are equally wide, so one table of normal CDF differences
+    per standard deviation covers the whole transition matrix.
+*/
+
+double normal_cdf(double z) { return 0.5 * erfc(-z / sqrt(2)); }
+
+// probability of a normal variable lying between `lower` and `upper`
+double normal_prob(double lower, double upper, double mean, double std) {
+    if (std == 0)
+        return lower <= mean && mean < upper ? 1 : 0;
+    return normal_cdf((upper - mean) / std) - normal_cdf((lower - mean) / std);
+}
+
+void calc_ev_ipi(double* x, ptrdiff_t x_stride, double** y, ptrdiff_t y_stride,
+                 size_t n_samples, size_t n_options, unsigned int n_bins,
+                 const double* std, size_t n_std, double emv, double* bin_sums,
+                 double* scratch, double* out) {
+    double x_min, x_max;
+    min_max(x, x_stride, n_samples, &x_min, &x_max, 1);
+    double x_sum = 0, x_sq_sum = 0;
+    for (size_t i = 0; i < n_samples; i++) {
+        x_sum += x[(ptrdiff_t)i * x_stride];
+    }
+    double x_mean = x_sum / n_samples;
+    for (size_t i = 0; i < n_samples; i++) {
+        double diff = x[(ptrdiff_t)i * x_stride] - x_mean;
+        x_sq_sum += diff * diff;
+    }
+    double x_std = sqrt(x_sq_sum / n_samples);
+    if (x_min == x_max) {
+        // deterministic input
+        for (size_t std_i = 0; std_i < n_std; std_i++) {
+            out[std_i] = 0;
+        }
+        return;
+    }
+
+    double* bin_population = scratch;
+    double* cdf_diff = scratch + n_bins;
+    double* outcome = scratch + 3 * (size_t)n_bins;
+
+    // output sums and population of every bin
+    double bin_width = (x_max - x_min) / n_bins;
+    double bin_scale = n_bins / (x_max - x_min);
+    memset(bin_sums, 0, (size_t)n_bins * n_options * sizeof(double));
+    memset(bin_population, 0, n_bins * sizeof(double));
+    for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+        size_t bin_i =
+            (size_t)((x[(ptrdiff_t)sample_i * x_stride] - x_min) * bin_scale);
+        if (bin_i >= n_bins)
+            bin_i = n_bins - 1;
+        bin_population[bin_i]++;
+        double* bin_row = bin_sums + bin_i * n_options;
+        for (size_t option_i = 0; option_i < n_options; option_i++) {
+            bin_row[option_i] += y[option_i][(ptrdiff_t)sample_i * y_stride];
+        }
     }
-    return evppi_val;
-}
\ No newline at end of file
+
+    for (size_t std_i = 0; std_i < n_std; std_i++) {
+        // information, that leaves at least the prior uncertainty, has no
+        // value (this includes deterministic inputs)
+        if (!(std[std_i] < x_std)) {
+            out[std_i] = 0;
+            continue;
+        }
+        // `cdf_diff[n_bins - 1 + d]` is the probability of the true value
+        // lying `d` bins away from the posterior mean
+        for (long d = 1 - (long)n_bins; d < (long)n_bins; d++) {
+            cdf_diff[n_bins - 1 + d] = normal_prob(
+                (d - 0.5) * bin_width, (d + 0.5) * bin_width, 0, std[std_i]);
+        }
+        double outer_std = sqrt(x_std * x_std - std[std_i] * std[std_i]);
+
+        double ev_ipi = 0, outer_prob_sum = 0;
+        for (unsigned int i = 0; i < n_bins; i++) {
+            if (bin_population[i] == 0)
+                continue;
+            double outer_prob =
+                normal_prob(x_min + i * bin_width, x_min + (i + 1) * bin_width,
+                            x_mean, outer_std);
+            outer_prob_sum += outer_prob;
+
+            // posterior expected outcome of every option
+            double transition_sum = 0;
+            memset(outcome, 0, n_options * sizeof(double));
+            for (unsigned int j = 0; j < n_bins; j++) {
+                if (bin_population[j] == 0)
+                    continue;
+                double transition = cdf_diff[n_bins - 1 + j - i];
+                transition_sum += transition;
+                double weight = transition / bin_population[j];
+                double* bin_row = bin_sums + (size_t)j * n_options;
+                for (size_t option_i = 0; option_i < n_options; option_i++) {
+                    outcome[option_i] += weight * bin_row[option_i];
+                }
+            }
+            ev_ipi += outer_prob * maximum(outcome, n_options) / transition_sum;
+        }
+        out[std_i] = ev_ipi / outer_prob_sum - emv;
+    }
+}
+
+void multi_evipi_cols(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                      double** y, ptrdiff_t y_stride, size_t n_samples,
+                      size_t n_variables, size_t n_options, const double* std,
+                      size_t n_std, evpi_workspace* ws, double* out) {
+    unsigned int n_bins = workspace_n_bins(ws, n_samples);
+    size_t table_size = (size_t)n_bins * n_options;
+    size_t scratch_size = 3 * (size_t)ws->max_n_bins + ws->n_options;
+    double emv = expected_max_value(y, y_stride, NULL, 0, n_samples, n_options);
+
+    // every thread processes whole variables
+#pragma omp parallel num_threads(ws->n_threads)
+    {
+#ifdef _OPENMP
+        int thread_i = omp_get_thread_num();
+#else
+        int thread_i = 0;
+#endif
+        double* bin_sums = ws->bin_sums + thread_i * table_size;
+        double* scratch = ws->evipi_scratch + thread_i * scratch_size;
+#pragma omp for schedule(dynamic)
+        for (size_t variable_i = 0; variable_i < n_variables; variable_i++) {
+            calc_ev_ipi(x + (ptrdiff_t)variable_i * x_col_stride, x_row_stride,
+                        y, y_stride, n_samples, n_options, n_bins, std, n_std,
+                        emv, bin_sums, scratch, out + variable_i * n_std);
+        }
+    }
+}
+
+void multi_evipi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    const double* std, size_t n_std, evpi_workspace* ws,
+                    double* out) {
+    if (!fits_workspace(ws, n_samples, n_options)) {
+        for (size_t i = 0; i < n_variables * n_std; i++) {
+            out[i] = NAN;
+        }
+        return;
+    }
+    fill_strided_cols(ws->y_cols, y, y_col_stride, n_options);
+    multi_evipi_cols(x, x_row_stride, x_col_stride, ws->y_cols, y_row_stride,
+                     n_samples, n_variables, n_options, std, n_std, ws, out);
+}
+
+double evipi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, double std,
+                evpi_workspace* ws) {
+    double res;
+    multi_evipi_ws(x, x_stride, 0, y, y_row_stride, y_col_stride, n_samples, 1,
+                   n_options, &std, 1, ws, &res);
+    return res;
+}
+
+double evipi(double* x, double** y, size_t n_samples, size_t n_options,
+             double std) {
+    evpi_workspace* ws = evpi_workspace_new(n_samples, n_options, 0, 1);
+    if (ws == NULL)
+        return NAN;
+    double res;
+    multi_evipi_cols(x, 1, 0, y, 1, n_samples, 1, n_options, &std, 1, ws, &res);
+    evpi_workspace_free(ws);
+    return res;
+}
+
+struct evpi_accumulator {
+    size_t n_variables;
+    size_t n_options;
+    unsigned int n_bins;
+    size_t n_samples;
+    // fixed histogram bounds of every variable
+    double* x_min;
+    double* x_max;
+    // observed range of every variable, to detect deterministic ones
+    double* x_seen_min;
+    double* x_seen_max;
+    // one table (n_bins x n_options) of output sums per variable
+    double* bin_sums;
+    // sum of the highest output among all options (for the total EVPI)
+    double y_max_sum;
+};
+
+evpi_accumulator* evpi_accumulator_new(size_t n_variables, size_t n_options,
+                                       unsigned int n_bins, double* x_min,
+                                       double* x_max) {
+    evpi_accumulator* acc = malloc(sizeof(evpi_accumulator));
+    if (acc == NULL)
+        return NULL;
+    acc->n_variables = n_variables;
+    acc->n_options = n_options;
+    acc->n_bins = n_bins;
+    acc->n_samples = 0;
+    acc->y_max_sum = 0;
+    acc->x_min = malloc(n_variables * sizeof(double));
+    acc->x_max = malloc(n_variables * sizeof(double));
+    acc->x_seen_min = malloc(n_variables * sizeof(double));
+    acc->x_seen_max = malloc(n_variables * sizeof(double));
+    acc->bin_sums = calloc(n_variables * n_bins * n_options, sizeof(double));
+    if (acc->x_min == NULL || acc->x_max == NULL || acc->x_seen_min == NULL ||
+        acc->x_seen_max == NULL || acc->bin_sums == NULL) {
+        evpi_accumulator_free(acc);
+        return NULL;
+    }
+    for (size_t variable_i = 0; variable_i < n_variables; variable_i++) {
+        acc->x_min[variable_i] = x_min[variable_i];
+        acc->x_max[variable_i] = x_max[variable_i];
+        acc->x_seen_min[variable_i] = INFINITY;
+        acc->x_seen_max[variable_i] = -INFINITY;
+    }
+    return acc;
+}
+
+void evpi_accumulator_free(evpi_accumulator* acc) {
+    if (acc == NULL)
+        return;
+    free(acc->x_min);
+    free(acc->x_max);
+    free(acc->x_seen_min);
+    free(acc->x_seen_max);
+    free(acc->bin_sums);
+    free(acc);
+}
+
+void evpi_column_ranges(double* x, ptrdiff_t x_row_stride,
+                        ptrdiff_t x_col_stride, size_t n_samples,
+                        size_t n_variables, double* x_min, double* x_max,
+                        int n_threads) {
+    n_threads = resolve_n_threads(n_threads);
+#pragma omp parallel for num_threads(n_threads) schedule(dynamic)
+    for (size_t variable_i = 0; variable_i < n_variables; variable_i++) {
+        double chunk_min, chunk_max;
+        min_max(x + (ptrdiff_t)variable_i * x_col_stride, x_row_stride,
+                n_samples, &chunk_min, &chunk_max, 1);
+        if (chunk_min < x_min[variable_i])
+            x_min[variable_i] = chunk_min;
+        if (chunk_max > x_max[variable_i])
+            x_max[variable_i] = chunk_max;
+    }
+}
+
+void evpi_accumulator_add(evpi_accumulator* acc, double* x,
+                          ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                          double* y, ptrdiff_t y_row_stride,
+                          ptrdiff_t y_col_stride, size_t n_samples,
+                          int n_threads) {
+    size_t n_options = acc->n_options;
+    unsigned int n_bins = acc->n_bins;
+    size_t table_size = (size_t)n_bins * n_options;
+    n_threads = resolve_n_threads(n_threads);
+
+    // every thread accumulates whole variables into their own tables
+#pragma omp parallel for num_threads(n_threads) schedule(dynamic)
+    for (size_t variable_i = 0; variable_i < acc->n_variables; variable_i++) {
+        double* x_var = x + (ptrdiff_t)variable_i * x_col_stride;
+        double* table = acc->bin_sums + variable_i * table_size;
+        double x_min = acc->x_min[variable_i];
+        double x_range = acc->x_max[variable_i] - x_min;
+        double bin_scale = x_range > 0 ? n_bins / x_range : 0;
+        double seen_min = acc->x_seen_min[variable_i];
+        double seen_max = acc->x_seen_max[variable_i];
+        for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+            double x_val = x_var[(ptrdiff_t)sample_i * x_row_stride];
+            if (x_val < seen_min)
+                seen_min = x_val;
+            if (x_val > seen_max)
+                seen_max = x_val;
+            // samples outside of the bounds go into the outer bins
+            double scaled = (x_val - x_min) * bin_scale;
+            size_t bin_i = scaled > 0 ? (size_t)scaled : 0;
+            if (bin_i >= n_bins)
+                bin_i = n_bins - 1;
+            double* bin_row = table + bin_i * n_options;
+            double* y_row = y + (ptrdiff_t)sample_i * y_row_stride;
+            for (size_t option_i = 0; option_i < n_options; option_i++) {
+                bin_row[option_i] += y_row[(ptrdiff_t)option_i * y_col_stride];
+            }
+        }
+        acc->x_seen_min[variable_i] = seen_min;
+        acc->x_seen_max[variable_i] = seen_max;
+    }
+
+    double y_max_sum = 0;
+#pragma omp parallel for num_threads(n_threads) schedule(static)               \
+    reduction(+ : y_max_sum)
+    for (size_t sample_i = 0; sample_i < n_samples; sample_i++) {
+        double* y_row = y + (ptrdiff_t)sample_i * y_row_stride;
+        double max_val = y_row[0];
+        for (size_t option_i = 1; option_i < n_options; option_i++) {
+            if (y_row[(ptrdiff_t)option_i * y_col_stride] > max_val)
+                max_val = y_row[(ptrdiff_t)option_i * y_col_stride];
+        }
+        y_max_sum += max_val;
+    }
+    acc->y_max_sum += y_max_sum;
+    acc->n_samples += n_samples;
+}
+
+int evpi_accumulator_merge(evpi_accumulator* acc,
+                           const evpi_accumulator* other) {
+    if (acc->n_variables != other->n_variables ||
+        acc->n_options != other->n_options || acc->n_bins != other->n_bins)
+        return -1;
+    for (size_t variable_i = 0; variable_i < acc->n_variables; variable_i++) {
+        if (acc->x_min[variable_i] != other->x_min[variable_i] ||
+            acc->x_max[variable_i] != other->x_max[variable_i])
+            return -1;
+    }
+
+    size_t n_values = acc->n_variables * acc->n_bins * acc->n_options;
+    for (size_t i = 0; i < n_values; i++) {
+        acc->bin_sums[i] += other->bin_sums[i];
+    }
+    for (size_t variable_i = 0; variable_i < acc->n_variables; variable_i++) {
+        if (other->x_seen_min[variable_i] < acc->x_seen_min[variable_i])
+            acc->x_seen_min[variable_i] = other->x_seen_min[variable_i];
+        if (other->x_seen_max[variable_i] > acc->x_seen_max[variable_i])
+            acc->x_seen_max[variable_i] = other->x_seen_max[variable_i];
+    }
+    acc->y_max_sum += other->y_max_sum;
+    acc->n_samples += other->n_samples;
+    return 0;
+}
+
+double accumulator_emv(const evpi_accumulator* acc) {
+    // the bin rows of any variable sum up to the totals of the options
+    double result = 0;
+    for (size_t option_i = 0; option_i < acc->n_options; option_i++) {
+        double sum = 0;
+        for (unsigned int bin_i = 0; bin_i < acc->n_bins; bin_i++) {
+            sum += acc->bin_sums[(size_t)bin_i * acc->n_options + option_i];
+        }
+        if (option_i == 0 || sum > result)
+            result = sum;
+    }
+    return result / acc->n_samples;
+}
+
+double evpi_accumulator_evpi(const evpi_accumulator* acc) {
+    if (acc->n_samples == 0 || acc->n_variables == 0)
+        return NAN;
+    return acc->y_max_sum / acc->n_samples - accumulator_emv(acc);
+}
+
+void evpi_accumulator_result(const evpi_accumulator* acc, double threshold,
+                             double* out) {
+    double evpi_val = evpi_accumulator_evpi(acc);
+    if (isnan(evpi_val)) {
+        for (size_t variable_i = 0; variable_i < acc->n_variables;
+             variable_i++) {
+            out[variable_i] = NAN;
+        }
+        return;
+    }
+    double emv = accumulator_emv(acc);
+    size_t table_size = (size_t)acc->n_bins * acc->n_options;
+    for (size_t variable_i = 0; variable_i < acc->n_variables; variable_i++) {
+        // if input is deterministic, further information has no value
+        if (acc->x_seen_min[variable_i] == acc->x_seen_max[variable_i]) {
+            out[variable_i] = 0;
+            continue;
+        }
+        double* table = acc->bin_sums + variable_i * table_size;
+        double sum_res = 0;
+        for (unsigned int bin_i = 0; bin_i < acc->n_bins; bin_i++) {
+            sum_res +=
+                maximum(table + (size_t)bin_i * acc->n_options, acc->n_options);
+        }
+        out[variable_i] = sum_res / acc->n_samples - emv;
+        if (out[variable_i] < evpi_val * threshold)
+            out[variable_i] = 0;
+    }
+}
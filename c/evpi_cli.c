@@ -0,0 +1,261 @@
+#define _DEFAULT_SOURCE
+#include "evpi.h"
+#include "evpi_file.h"
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#define DEFAULT_MEMORY_BUDGET (1UL << 28)
+
+const char* usage =
+    "Usage: evpi [OPTION]... [X] Y\n"
+    "Calculate the EVPPI of every input variable in X or, if only Y is given,\n"
+    "the total EVPI of the utility samples in Y.\n"
+    "X and Y are CSV files (samples are rows, first line is a header) or raw\n"
+    "binary files of 64 bit floats stored column by column.\n"
+    "\n"
+    "  -b N    number of histogram bins (default: cubic root of the sample\n"
+    "          number)\n"
+    "  -q      use bins with equal sample counts instead of equally wide ones\n"
+    "  -t N    number of threads (default: all cores)\n"
+    "  -s T    significance threshold relative to the total EVPI (default:\n"
+    "          0.001)\n"
+    "  -f FMT  output format, json or csv (default: json)\n"
+    "  -n      CSV files have no header line\n"
+    "  -v N    number of variables in a raw binary X\n"
+    "  -o N    number of decision options in a raw binary Y\n"
+    "  -m B    memory budget for raw binary files in bytes (default: 2^28)\n"
+    "  -h      show this help\n";
+
+// samples in Fortran order, either read from a CSV file or memory-mapped
+typedef struct {
+    evpi_table table;
+    int is_mapped;
+} samples;
+
+int is_csv(const char* path) {
+    size_t length = strlen(path);
+    return length >= 4 && strcmp(path + length - 4, ".csv") == 0;
+}
+
+int load_samples(const char* path, size_t n_columns, int has_header,
+                 int n_threads, samples* s) {
+    if (is_csv(path)) {
+        s->is_mapped = 0;
+        return evpi_read_csv(path, has_header, n_threads, &s->table);
+    }
+    if (n_columns == 0)
+        return -1;
+    size_t n_values;
+    s->is_mapped = 1;
+    s->table.n_columns = n_columns;
+    s->table.data = evpi_map_file(path, &n_values);
+    if (s->table.data == NULL)
+        return -1;
+    s->table.n_rows = n_values / n_columns;
+    return n_values % n_columns == 0 ? 0 : -1;
+}
+
+void print_load_error(const char* path, int status) {
+    if (status == -2)
+        fprintf(stderr, "evpi: %s has no samples\n", path);
+    else
+        fprintf(stderr, "evpi: could not read %s\n", path);
+}
+
+void free_samples(samples* s) {
+    if (s->is_mapped && s->table.data != NULL)
+        evpi_unmap_file(s->table.data, s->table.n_rows * s->table.n_columns);
+    else if (!s->is_mapped)
+        evpi_table_free(&s->table);
+}
+
+void print_name(const char* name, int is_json) {
+    if (!is_json) {
+        printf("%s", name);
+        return;
+    }
+    putchar('"');
+    for (const char* c = name; *c != '\0'; c++) {
+        if (*c == '"' || *c == '\\')
+            putchar('\\');
+        putchar(*c);
+    }
+    putchar('"');
+}
+
+void print_value(double value, int is_json) {
+    // JSON has no NaN or infinity
+    if (is_json && !isfinite(value))
+        printf("null");
+    else
+        printf("%.17g", value);
+}
+
+void print_results(double evpi_res, double* evppi_res, char** names,
+                   size_t n_variables, int is_json) {
+    char default_name[32];
+    if (evppi_res == NULL) {
+        printf(is_json ? "{\"evpi\": " : "evpi\n");
+        print_value(evpi_res, is_json);
+        printf(is_json ? "}\n" : "\n");
+        return;
+    }
+    if (is_json) {
+        printf("{\"evpi\": ");
+        print_value(evpi_res, is_json);
+        printf(", \"evppi\": {");
+    } else {
+        printf("variable,evppi\n");
+    }
+    for (size_t i = 0; i < n_variables; i++) {
+        snprintf(default_name, sizeof(default_name), "x%zu", i + 1);
+        print_name(names == NULL ? default_name : names[i], is_json);
+        printf(is_json ? ": " : ",");
+        print_value(evppi_res[i], is_json);
+        printf(is_json ? (i + 1 < n_variables ? ", " : "") : "\n");
+    }
+    if (is_json)
+        printf("}}\n");
+}
+
+int main(int argc, char** argv) {
+    unsigned int n_bins = 0;
+    evpi_binning binning = EVPI_BINNING_UNIFORM;
+    int n_threads = 0;
+    double threshold = 1e-3;
+    int is_json = 1;
+    int has_header = 1;
+    size_t n_variables = 0, n_options = 0;
+    size_t memory_budget = DEFAULT_MEMORY_BUDGET;
+
+    int opt;
+    while ((opt = getopt(argc, argv, "b:qt:s:f:nv:o:m:h")) != -1) {
+        switch (opt) {
+        case 'b':
+            n_bins = strtoul(optarg, NULL, 10);
+            break;
+        case 'q':
+            binning = EVPI_BINNING_QUANTILE;
+            break;
+        case 't':
+            n_threads = atoi(optarg);
+            break;
+        case 's':
+            threshold = atof(optarg);
+            break;
+        case 'f':
+            if (strcmp(optarg, "json") != 0 && strcmp(optarg, "csv") != 0) {
+                fprintf(stderr, "evpi: unknown output format %s\n", optarg);
+                return 2;
+            }
+            is_json = strcmp(optarg, "json") == 0;
+            break;
+        case 'n':
+            has_header = 0;
+            break;
+        case 'v':
+            n_variables = strtoul(optarg, NULL, 10);
+            break;
+        case 'o':
+            n_options = strtoul(optarg, NULL, 10);
+            break;
+        case 'm':
+            memory_budget = strtoul(optarg, NULL, 10);
+            break;
+        case 'h':
+            printf("%s", usage);
+            return 0;
+        default:
+            fprintf(stderr, "%s", usage);
+            return 2;
+        }
+    }
+    int n_files = argc - optind;
+    if (n_files < 1 || n_files > 2) {
+        fprintf(stderr, "%s", usage);
+        return 2;
+    }
+    const char* x_path = n_files == 2 ? argv[optind] : NULL;
+    const char* y_path = argv[argc - 1];
+
+    if ((x_path != NULL && !is_csv(x_path) && n_variables == 0) ||
+        (!is_csv(y_path) && n_options == 0)) {
+        fprintf(stderr, "evpi: raw binary files need -v and -o\n");
+        return 2;
+    }
+
+    // raw binary files are processed chunk by chunk without loading them,
+    // unless the bins depend on all samples
+    if (x_path != NULL && !is_csv(x_path) && !is_csv(y_path) &&
+        binning == EVPI_BINNING_UNIFORM) {
+        double* evppi_res = malloc(n_variables * sizeof(double));
+        double evpi_res;
+        if (evppi_res == NULL ||
+            multi_evppi_file(x_path, y_path, n_variables, n_options, n_bins,
+                             threshold, memory_budget, n_threads, evppi_res,
+                             &evpi_res) != 0) {
+            fprintf(stderr, "evpi: could not process %s and %s\n", x_path,
+                    y_path);
+            free(evppi_res);
+            return 1;
+        }
+        print_results(evpi_res, evppi_res, NULL, n_variables, is_json);
+        free(evppi_res);
+        return 0;
+    }
+
+    samples x = {{NULL, 0, 0, NULL}, 0}, y = {{NULL, 0, 0, NULL}, 0};
+    double* evppi_res = NULL;
+    evpi_workspace* ws = NULL;
+    int status = 1;
+    int load_status =
+        load_samples(y_path, n_options, has_header, n_threads, &y);
+    if (load_status != 0) {
+        print_load_error(y_path, load_status);
+        goto cleanup;
+    }
+    if (x_path != NULL) {
+        load_status =
+            load_samples(x_path, n_variables, has_header, n_threads, &x);
+        if (load_status != 0) {
+            print_load_error(x_path, load_status);
+            goto cleanup;
+        }
+        if (x.table.n_rows != y.table.n_rows) {
+            fprintf(stderr, "evpi: number of samples in X and Y differ\n");
+            goto cleanup;
+        }
+    }
+
+    size_t n_samples = y.table.n_rows;
+    ws = evpi_workspace_new(n_samples, y.table.n_columns, n_bins, n_threads);
+    if (ws == NULL || evpi_workspace_set_binning(ws, binning) != 0) {
+        fprintf(stderr, "evpi: out of memory\n");
+        goto cleanup;
+    }
+    double evpi_res =
+        evpi_ws(y.table.data, 1, n_samples, n_samples, y.table.n_columns, ws);
+    if (x_path != NULL) {
+        evppi_res = malloc(x.table.n_columns * sizeof(double));
+        if (evppi_res == NULL) {
+            fprintf(stderr, "evpi: out of memory\n");
+            goto cleanup;
+        }
+        multi_evppi_ws(x.table.data, 1, n_samples, y.table.data, 1, n_samples,
+                       n_samples, x.table.n_columns, y.table.n_columns,
+                       threshold, ws, evppi_res);
+    }
+    print_results(evpi_res, evppi_res, x.table.names, x.table.n_columns,
+                  is_json);
+    status = 0;
+
+cleanup:
+    evpi_workspace_free(ws);
+    free(evppi_res);
+    free_samples(&x);
+    free_samples(&y);
+    return status;
+}
@@ -0,0 +1,343 @@
+#define _DEFAULT_SOURCE
+#include "evpi_file.h"
+#include "evpi.h"
+#include <fcntl.h>
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// longest number in a CSV file, longer fields are rejected
+#define MAX_FIELD_LENGTH 64
+
+char* map_bytes(const char* path, size_t* n_bytes) {
+    int fd = open(path, O_RDONLY);
+    if (fd < 0)
+        return NULL;
+    struct stat file_stat;
+    if (fstat(fd, &file_stat) != 0 || file_stat.st_size == 0) {
+        close(fd);
+        return NULL;
+    }
+    void* data = mmap(NULL, file_stat.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    // the mapping stays valid after closing the file descriptor
+    close(fd);
+    if (data == MAP_FAILED)
+        return NULL;
+    madvise(data, file_stat.st_size, MADV_SEQUENTIAL);
+    *n_bytes = file_stat.st_size;
+    return data;
+}
+
+double* evpi_map_file(const char* path, size_t* n_values) {
+    size_t n_bytes;
+    double* data = (double*)map_bytes(path, &n_bytes);
+    if (data != NULL)
+        *n_values = n_bytes / sizeof(double);
+    return data;
+}
+
+void evpi_unmap_file(double* data, size_t n_values) {
+    munmap(data, n_values * sizeof(double));
+}
+
+void release_pages(double* data, size_t n_values) {
+    // only whole pages inside the range can be released
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    size_t start = ((size_t)data + page_size - 1) / page_size * page_size;
+    size_t stop = ((size_t)(data + n_values)) / page_size * page_size;
+    if (stop > start)
+        madvise((void*)start, stop - start, MADV_DONTNEED);
+}
+
+void release_chunk(double* data, size_t n_samples, size_t n_cols,
+                   size_t chunk_start, size_t chunk_size) {
+    for (size_t col_i = 0; col_i < n_cols; col_i++) {
+        release_pages(data + col_i * n_samples + chunk_start, chunk_size);
+    }
+}
+
+int multi_evppi_file(const char* x_path, const char* y_path, size_t n_variables,
+                     size_t n_options, unsigned int n_bins, double threshold,
+                     size_t memory_budget, int n_threads, double* out,
+                     double* evpi_out) {
+    size_t n_x_values, n_y_values;
+    double* x = evpi_map_file(x_path, &n_x_values);
+    double* y = evpi_map_file(y_path, &n_y_values);
+    int status = -1;
+    double* x_min = malloc(n_variables * sizeof(double));
+    double* x_max = malloc(n_variables * sizeof(double));
+    evpi_accumulator* acc = NULL;
+    if (x == NULL || y == NULL || x_min == NULL || x_max == NULL ||
+        n_variables == 0 || n_options == 0)
+        goto cleanup;
+
+    size_t n_samples = n_x_values / n_variables;
+    if (n_samples == 0 || n_samples * n_variables != n_x_values ||
+        n_samples * n_options != n_y_values)
+        goto cleanup;
+    if (n_bins == 0)
+        n_bins = (unsigned int)cbrt(n_samples);
+
+    size_t chunk_size =
+        memory_budget / ((n_variables + n_options) * sizeof(double));
+    if (chunk_size == 0)
+        chunk_size = 1;
+
+    // first pass: range of every variable
+    for (size_t i = 0; i < n_variables; i++) {
+        x_min[i] = INFINITY;
+        x_max[i] = -INFINITY;
+    }
+    for (size_t start = 0; start < n_samples; start += chunk_size) {
+        size_t size =
+            start + chunk_size < n_samples ? chunk_size : n_samples - start;
+        evpi_column_ranges(x + start, 1, n_samples, size, n_variables, x_min,
+                           x_max, n_threads);
+        release_chunk(x, n_samples, n_variables, start, size);
+    }
+
+    // second pass: output sums per bin
+    acc = evpi_accumulator_new(n_variables, n_options, n_bins, x_min, x_max);
+    if (acc == NULL)
+        goto cleanup;
+    for (size_t start = 0; start < n_samples; start += chunk_size) {
+        size_t size =
+            start + chunk_size < n_samples ? chunk_size : n_samples - start;
+        evpi_accumulator_add(acc, x + start, 1, n_samples, y + start, 1,
+                             n_samples, size, n_threads);
+        release_chunk(x, n_samples, n_variables, start, size);
+        release_chunk(y, n_samples, n_options, start, size);
+    }
+
+    evpi_accumulator_result(acc, threshold, out);
+    if (evpi_out != NULL)
+        *evpi_out = evpi_accumulator_evpi(acc);
+    status = 0;
+
+cleanup:
+    evpi_accumulator_free(acc);
+    free(x_min);
+    free(x_max);
+    if (x != NULL)
+        evpi_unmap_file(x, n_x_values);
+    if (y != NULL)
+        evpi_unmap_file(y, n_y_values);
+    return status;
+}
+
+// end of the line starting at `p` without the line break
+const char* line_end(const char* p, const char* end) {
+    const char* newline = memchr(p, '\n', end - p);
+    if (newline == NULL)
+        newline = end;
+    if (newline > p && newline[-1] == '\r')
+        newline--;
+    return newline;
+}
+
+// start of the line after the one containing `p`
+const char* next_line(const char* p, const char* end) {
+    const char* newline = memchr(p, '\n', end - p);
+    return newline == NULL ? end : newline + 1;
+}
+
+int is_blank(const char* p, const char* end) {
+    for (; p < end; p++) {
+        if (*p != ' ' && *p != '\t')
+            return 0;
+    }
+    return 1;
+}
+
+size_t count_rows(const char* p, const char* end) {
+    size_t n_rows = 0;
+    for (; p < end; p = next_line(p, end)) {
+        if (!is_blank(p, line_end(p, end)))
+            n_rows++;
+    }
+    return n_rows;
+}
+
+// parses the fields of one line into row `row` of a column-major table,
+// skipping the first `n_skip` fields
+int parse_row(const char* p, const char* end, size_t n_skip, size_t n_columns,
+              double* data, size_t row, size_t n_rows) {
+    char field[MAX_FIELD_LENGTH];
+    for (size_t j = 0; j < n_skip + n_columns; j++) {
+        const char* field_end = memchr(p, ',', end - p);
+        if (field_end == NULL)
+            field_end = end;
+        if (j >= n_skip) {
+            size_t length = field_end - p;
+            if (length >= MAX_FIELD_LENGTH)
+                return -1;
+            memcpy(field, p, length);
+            field[length] = '\0';
+            char* parse_end;
+            double value = strtod(field, &parse_end);
+            while (*parse_end == ' ' || *parse_end == '\t')
+                parse_end++;
+            if (parse_end == field || *parse_end != '\0')
+                return -1;
+            data[(j - n_skip) * n_rows + row] = value;
+        }
+        if (field_end == end)
+            return j + 1 == n_skip + n_columns ? 0 : -1;
+        p = field_end + 1;
+    }
+    // more fields than expected
+    return -1;
+}
+
+int parse_rows(const char* p, const char* end, size_t n_skip, size_t n_columns,
+               double* data, size_t row, size_t n_rows) {
+    for (; p < end; p = next_line(p, end)) {
+        const char* row_end = line_end(p, end);
+        if (is_blank(p, row_end))
+            continue;
+        if (parse_row(p, row_end, n_skip, n_columns, data, row, n_rows) != 0)
+            return -1;
+        row++;
+    }
+    return 0;
+}
+
+char** parse_names(const char* p, const char* end, size_t n_skip,
+                   size_t n_columns) {
+    char** names = calloc(n_columns, sizeof(char*));
+    if (names == NULL)
+        return NULL;
+    for (size_t j = 0; j < n_skip + n_columns; j++) {
+        const char* field_end = memchr(p, ',', end - p);
+        if (field_end == NULL)
+            field_end = end;
+        if (j >= n_skip) {
+            const char* name_start = p;
+            const char* name_end = field_end;
+            if (name_end - name_start >= 2 && *name_start == '"' &&
+                name_end[-1] == '"') {
+                name_start++;
+                name_end--;
+            }
+            char* name = malloc(name_end - name_start + 1);
+            if (name == NULL)
+                break;
+            memcpy(name, name_start, name_end - name_start);
+            name[name_end - name_start] = '\0';
+            names[j - n_skip] = name;
+        }
+        p = field_end + 1;
+    }
+    return names;
+}
+
+int evpi_read_csv(const char* path, int has_header, int n_threads,
+                  evpi_table* table) {
+    table->data = NULL;
+    table->names = NULL;
+    table->n_rows = 0;
+    table->n_columns = 0;
+
+    size_t n_bytes;
+    char* text = map_bytes(path, &n_bytes);
+    if (text == NULL)
+        return -1;
+    const char* p = text;
+    const char* end = text + n_bytes;
+
+    // the first line determines the number of columns
+    const char* first_end = line_end(p, end);
+    size_t n_fields = 1;
+    for (const char* c = p; c < first_end; c++) {
+        if (*c == ',')
+            n_fields++;
+    }
+    size_t n_skip = 0;
+    if (has_header) {
+        if (first_end > p && *p == ',')
+            n_skip = 1;
+        table->names = parse_names(p, first_end, n_skip, n_fields - n_skip);
+        p = next_line(p, end);
+    }
+    table->n_columns = n_fields - n_skip;
+
+#ifdef _OPENMP
+    if (n_threads < 1)
+        n_threads = omp_get_max_threads();
+#else
+    n_threads = 1;
+#endif
+    // blocks of whole lines, one per thread
+    int status = 0;
+    const char** block_starts = malloc((n_threads + 1) * sizeof(char*));
+    size_t* row_offsets = malloc((n_threads + 1) * sizeof(size_t));
+    int failed = block_starts == NULL || row_offsets == NULL ||
+                 (has_header && table->names == NULL);
+    if (failed)
+        goto cleanup;
+    block_starts[0] = p;
+    for (int t = 1; t < n_threads; t++) {
+        const char* candidate = p + (end - p) * t / n_threads;
+        if (candidate <= block_starts[t - 1])
+            block_starts[t] = block_starts[t - 1];
+        else
+            block_starts[t] = next_line(candidate - 1, end);
+    }
+    block_starts[n_threads] = end;
+
+    row_offsets[0] = 0;
+#pragma omp parallel for num_threads(n_threads)
+    for (int t = 0; t < n_threads; t++) {
+        row_offsets[t + 1] = count_rows(block_starts[t], block_starts[t + 1]);
+    }
+    for (int t = 0; t < n_threads; t++) {
+        row_offsets[t + 1] += row_offsets[t];
+    }
+    table->n_rows = row_offsets[n_threads];
+    if (table->n_rows == 0) {
+        // nothing to parse, and `malloc(0)` may be NULL anyway
+        status = -2;
+        goto cleanup;
+    }
+
+    table->data = malloc(table->n_rows * table->n_columns * sizeof(double));
+    if (table->data == NULL) {
+        failed = 1;
+        goto cleanup;
+    }
+#pragma omp parallel for num_threads(n_threads) reduction(| : failed)
+    for (int t = 0; t < n_threads; t++) {
+        failed |= parse_rows(block_starts[t], block_starts[t + 1], n_skip,
+                             table->n_columns, table->data, row_offsets[t],
+                             table->n_rows) != 0;
+    }
+
+cleanup:
+    free(block_starts);
+    free(row_offsets);
+    munmap(text, n_bytes);
+    if (failed)
+        status = -1;
+    if (status != 0)
+        evpi_table_free(table);
+    return status;
+}
+
+void evpi_table_free(evpi_table* table) {
+    if (table->names != NULL) {
+        for (size_t j = 0; j < table->n_columns; j++) {
+            free(table->names[j]);
+        }
+    }
+    free(table->names);
+    free(table->data);
+    table->names = NULL;
+    table->data = NULL;
+}
@@ -0,0 +1,105 @@
+#ifndef EVPI_FILE_H
+#define EVPI_FILE_H
+
+#include <stddef.h>
+
+/*
+    Out-of-core processing of Monte Carlo samples stored in raw binary files
+    (POSIX only). A raw file contains 64 bit floats column by column (Fortran
+    order), i.e. all samples of the first variable, then all samples of the
+    second one, and so on.
+*/
+
+/*
+    Maps a raw binary file read-only into memory and advises the kernel to
+    read it sequentially. Nothing is read until the memory is accessed.
+
+    Returns
+    -------
+    Pointer to the first value or NULL on error. The number of values is
+    written to `n_values`. Release the mapping with `evpi_unmap_file`.
+*/
+double* evpi_map_file(const char* path, size_t* n_values);
+
+void evpi_unmap_file(double* data, size_t n_values);
+
+/*
+    Samples read from a CSV file. The values are stored column by column
+    (Fortran order), i.e. `data + j * n_rows` is the first value of column
+    `j`. `names` holds the column names of the header or is NULL.
+*/
+typedef struct {
+    double* data;
+    size_t n_rows;
+    size_t n_columns;
+    char** names;
+} evpi_table;
+
+/*
+    Reads a comma-separated file of numbers into a table.
+    The file is memory-mapped and split into one block of lines per thread,
+    which are counted and parsed in parallel. Lines may have any length and
+    end with "\n" or "\r\n", empty lines are skipped. If the first field of
+    the header is empty, the first column is considered an index (as
+    written by `pandas.DataFrame.to_csv`) and skipped.
+
+    Parameters
+    ----------
+    path : const char*
+        Path of the CSV file.
+    has_header : int
+        Whether the first line contains the column names.
+    n_threads : int
+        Number of threads. Values below one use the OpenMP default.
+    table : evpi_table*
+        Table to fill. Release its memory with `evpi_table_free`.
+
+    Returns
+    -------
+    0 on success, -1 if the file could not be read, a line has a different
+    number of fields than the first one, a field is not a number or memory
+    could not be allocated, -2 if the file has no data rows.
+*/
+int evpi_read_csv(const char* path, int has_header, int n_threads,
+                  evpi_table* table);
+
+void evpi_table_free(evpi_table* table);
+
+/*
+    Calculate EVPPI for multiple input variables from raw binary files
+    without loading them into memory. S. `multi_evppi`.
+    The files are mapped into memory and processed in two sequential passes
+    over chunks of samples, one for the range of each variable and one for
+    the bin sums. Pages of finished chunks are released again, so not more
+    than roughly `memory_budget` bytes of the files are resident at a time.
+
+    Parameters
+    ----------
+    x_path, y_path : const char*
+        Raw binary files of the input samples (`n_variables` columns) and
+        the output samples (`n_options` columns).
+    n_bins : unsigned int
+        Number of histogram bins. 0 uses the cubic root of the sample number.
+    threshold : float
+        Percentage of the total EVPI, below which EVPI values will be set to
+        zero.
+    memory_budget : size_t
+        Rough upper limit for the resident memory of the files in bytes.
+    n_threads : int
+        Number of threads. Values below one use the OpenMP default.
+    out : double*
+        Array for one EVPPI per variable.
+    evpi_out : double*
+        Total EVPI of the samples, if not NULL.
+
+    Returns
+    -------
+    0 on success, -1 if a file could not be mapped, the sample numbers do
+    not match or memory could not be allocated.
+*/
+int multi_evppi_file(const char* x_path, const char* y_path, size_t n_variables,
+                     size_t n_options, unsigned int n_bins, double threshold,
+                     size_t memory_budget, int n_threads, double* out,
+                     double* evpi_out);
+
+#endif
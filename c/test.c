@@ -1,66 +1,38 @@
+#define _DEFAULT_SOURCE
 #include "evpi.h"
+#include "evpi_file.h"
 #include <math.h>
 #include <stdbool.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <unistd.h>
 
-#define MAXCHAR 100
-
-unsigned int count_samples(FILE* fp) {
-    unsigned int samplecount = 0;
-    for (char c = getc(fp); c != EOF; c = getc(fp))
-        if (c == '\n')
-            samplecount++;
-    rewind(fp);
-    return samplecount - 1;
-}
-
-unsigned int count_vars(FILE* fp) {
-    unsigned int varcount = 0;
-    for (char c = getc(fp); c != '\n'; c = getc(fp))
-        if (c == ',')
-            varcount++;
-    rewind(fp);
-    return varcount;
-}
-
-double** get_vals(FILE* fp, size_t n_samples, size_t n_vars) {
-    // set up 2d array as pointer of pointers
-    double* data = malloc(n_samples * n_vars * sizeof(double));
-    double** result = malloc(n_vars * sizeof(double*));
-    for (size_t i = 0; i < n_vars; i++)
-        result[i] = data + i * n_samples;
-
-    // parse csv into this array
-    char row[MAXCHAR];
-    char* token;
-    size_t i, j;
-    i = 0;
-    fgets(row, MAXCHAR, fp); // skip first row (header)
-    while (feof(fp) != true) {
-        fgets(row, MAXCHAR, fp);
-        token = strtok(row, ",");
-        token = strtok(NULL, ","); // skip first col (index)
-        j = 0;
-        while (token != NULL) {
-            result[j][i] = atof(token);
-            token = strtok(NULL, ",");
-            j++;
-        }
-        i++;
+double** parse_csv(char* path, size_t* n_samples, size_t* n_vars) {
+    // set up 2d array as pointer of pointers into the column-major table
+    evpi_table table;
+    if (evpi_read_csv(path, 1, 0, &table) != 0) {
+        printf("Could not read %s\n", path);
+        exit(1);
     }
-    return result;
+    *n_samples = table.n_rows;
+    *n_vars = table.n_columns;
+    double** matrix = malloc(*n_vars * sizeof(double*));
+    for (size_t i = 0; i < *n_vars; i++)
+        matrix[i] = table.data + i * *n_samples;
+    table.data = NULL;
+    evpi_table_free(&table);
+    return (matrix);
 }
 
-double** parse_csv(char* path, size_t* n_samples, size_t* n_vars) {
-    FILE* fp;
-    fp = fopen(path, "r");
-    *n_samples = count_samples(fp);
-    *n_vars = count_vars(fp);
-    double** matrix = get_vals(fp, *n_samples, *n_vars);
-    fclose(fp);
-    return (matrix);
+// fixtures are written to a new temporary file, `path` is a mkstemp template
+FILE* open_temp_file(char* path) {
+    int fd = mkstemp(path);
+    if (fd < 0) {
+        printf("Could not create a temporary file\n");
+        exit(1);
+    }
+    return fdopen(fd, "wb");
 }
 
 int main() {
@@ -75,13 +47,271 @@ int main() {
         xvar = x[i];
         // double* y2 = get_col(y, n_samples_y, n_vars_y, 2);
 
-        evppi_res = evppi(xvar, y, n_samples_x, n_vars_y);
+        evppi_res = evppi(xvar, y, n_samples_x, n_vars_y, 0);
         if (fabs(evppi_res - reference_evppi[i]) > 0.5) {
             printf("Wrong EVPI for variable %i: %f is not %f\n", i, evppi_res,
                    reference_evppi[i]);
             return 1;
         }
     }
+
+    // the parallel multi_evppi must agree with the single variable results
+    double* multi_evppi_res =
+        multi_evppi(x, y, n_samples_x, n_vars_x, n_vars_y, 0, 2);
+    for (unsigned char i = 0; i < 3; i++) {
+        evppi_res = evppi(x[i], y, n_samples_x, n_vars_y, 1);
+        if (fabs(multi_evppi_res[i] - evppi_res) > 1e-9) {
+            printf("Wrong parallel EVPPI for variable %i: %f is not %f\n", i,
+                   multi_evppi_res[i], evppi_res);
+            return 1;
+        }
+    }
+    free(multi_evppi_res);
+
+    // strided views on Fortran- and C-ordered copies must agree as well
+    double* y_c_order = malloc(n_samples_y * n_vars_y * sizeof(double));
+    for (size_t i = 0; i < n_samples_y; i++) {
+        for (size_t j = 0; j < n_vars_y; j++) {
+            y_c_order[i * n_vars_y + j] = y[j][i];
+        }
+    }
+    double* strided_res =
+        multi_evppi_strided(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                            n_samples_x, n_vars_x, n_vars_y, 0, 1);
+    double evpi_res = evpi(y, n_samples_y, n_vars_y);
+    double strided_evpi_res =
+        evpi_strided(y_c_order, n_vars_y, 1, n_samples_y, n_vars_y);
+    for (unsigned char i = 0; i < 3; i++) {
+        evppi_res = evppi(x[i], y, n_samples_x, n_vars_y, 1);
+        if (fabs(strided_res[i] - evppi_res) > 1e-9) {
+            printf("Wrong strided EVPPI for variable %i: %f is not %f\n", i,
+                   strided_res[i], evppi_res);
+            return 1;
+        }
+    }
+    if (fabs(strided_evpi_res - evpi_res) > 1e-9) {
+        printf("Wrong strided EVPI: %f is not %f\n", strided_evpi_res,
+               evpi_res);
+        return 1;
+    }
+
+    // repeated calls with one workspace and caller-provided output
+    evpi_workspace* ws = evpi_workspace_new(n_samples_x, n_vars_y, 0, 2);
+    double ws_res[3];
+    for (unsigned char repetition = 0; repetition < 2; repetition++) {
+        multi_evppi_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                       n_samples_x, n_vars_x, n_vars_y, 0, ws, ws_res);
+        for (unsigned char i = 0; i < 3; i++) {
+            if (fabs(ws_res[i] - strided_res[i]) > 1e-9) {
+                printf("Wrong workspace EVPPI for variable %i: %f is not %f\n",
+                       i, ws_res[i], strided_res[i]);
+                return 1;
+            }
+        }
+    }
+
+    // equal-frequency bins, reference values from the Python implementation
+    double reference_quantile_evppi[3] = {7.17765285, 2.41067503, 10.14027329};
+    evpi_workspace_set_binning(ws, EVPI_BINNING_QUANTILE);
+    multi_evppi_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1, n_samples_x,
+                   n_vars_x, n_vars_y, 0, ws, ws_res);
+    for (unsigned char i = 0; i < 3; i++) {
+        if (fabs(ws_res[i] - reference_quantile_evppi[i]) > 1e-6) {
+            printf("Wrong quantile EVPPI for variable %i: %f is not %f\n", i,
+                   ws_res[i], reference_quantile_evppi[i]);
+            return 1;
+        }
+    }
+
+    // imperfect information, reference values from the Python implementation
+    double evipi_std[2] = {0, 3};
+    double reference_evipi[3][2] = {
+        {7.04826602, 6.57017756}, {2.40557449, 0}, {10.09189495, 9.85579795}};
+    double evipi_res[6];
+    multi_evipi_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1, n_samples_x,
+                   n_vars_x, n_vars_y, evipi_std, 2, ws, evipi_res);
+    for (unsigned char i = 0; i < 3; i++) {
+        for (unsigned char j = 0; j < 2; j++) {
+            if (fabs(evipi_res[i * 2 + j] - reference_evipi[i][j]) > 1e-6) {
+                printf("Wrong EVIPI for variable %i: %f is not %f\n", i,
+                       evipi_res[i * 2 + j], reference_evipi[i][j]);
+                return 1;
+            }
+        }
+    }
+    if (fabs(evipi(x[0], y, n_samples_x, n_vars_y, 3) - evipi_res[1]) > 1e-9) {
+        printf("Wrong single EVIPI\n");
+        return 1;
+    }
+
+    // joint bins of a group, reference values from the Python implementation
+    if (evpi_workspace_reserve_groups(ws) != 0 ||
+        fabs(group_evppi_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                            n_samples_x, n_vars_x, n_vars_y, NULL, ws) -
+             17.27202464) > 1e-6) {
+        printf("Wrong group EVPPI\n");
+        return 1;
+    }
+    double* group_x[2] = {x[0], x[2]};
+    unsigned int group_n_bins[2] = {17, 5};
+    if (fabs(
+            group_evppi(group_x, y, n_samples_x, 2, n_vars_y, group_n_bins, 2) -
+            14.51532502) > 1e-6) {
+        printf("Wrong group EVPPI of two variables\n");
+        return 1;
+    }
+    evpi_workspace_free(ws);
+
+    // integer weights are the same as repeating the samples, as long as the
+    // bins stay the same
+    double* weights = malloc(n_samples_x * sizeof(double));
+    size_t n_expanded = 0;
+    for (size_t i = 0; i < n_samples_x; i++) {
+        weights[i] = (double)(i % 3 + 1);
+        n_expanded += i % 3 + 1;
+    }
+    double* x_expanded = malloc(n_expanded * n_vars_x * sizeof(double));
+    double* y_expanded = malloc(n_expanded * n_vars_y * sizeof(double));
+    size_t expanded_i = 0;
+    for (size_t i = 0; i < n_samples_x; i++) {
+        for (size_t repeat = 0; repeat < i % 3 + 1; repeat++) {
+            for (size_t j = 0; j < n_vars_x; j++)
+                x_expanded[j * n_expanded + expanded_i] = x[j][i];
+            for (size_t j = 0; j < n_vars_y; j++)
+                y_expanded[j * n_expanded + expanded_i] = y[j][i];
+            expanded_i++;
+        }
+    }
+    double weighted_res[3], expanded_res[3];
+    ws = evpi_workspace_new(n_expanded, n_vars_y, 46, 2);
+    multi_evppi_weighted_ws(x[0], 1, n_samples_x, y[0], 1, n_samples_y, weights,
+                            1, n_samples_x, n_vars_x, n_vars_y, 0, ws,
+                            weighted_res);
+    multi_evppi_ws(x_expanded, 1, n_expanded, y_expanded, 1, n_expanded,
+                   n_expanded, n_vars_x, n_vars_y, 0, ws, expanded_res);
+    for (unsigned char i = 0; i < 3; i++) {
+        if (fabs(weighted_res[i] - expanded_res[i]) > 1e-9 ||
+            fabs(evppi_weighted_ws(x[i], 1, y[0], 1, n_samples_y, weights, 1,
+                                   n_samples_x, n_vars_y, ws) -
+                 expanded_res[i]) > 1e-9) {
+            printf("Wrong weighted EVPPI for variable %i: %f is not %f\n", i,
+                   weighted_res[i], expanded_res[i]);
+            return 1;
+        }
+    }
+    if (fabs(evpi_weighted_ws(y[0], 1, n_samples_y, weights, 1, n_samples_y,
+                              n_vars_y, ws) -
+             evpi_ws(y_expanded, 1, n_expanded, n_expanded, n_vars_y, ws)) >
+        1e-9) {
+        printf("Wrong weighted EVPI\n");
+        return 1;
+    }
+    evpi_workspace_free(ws);
+    free(weights);
+    free(x_expanded);
+    free(y_expanded);
+
+    // bootstrap intervals, that do not depend on the number of threads and
+    // agree with the Python implementation up to the resampling noise
+    double reference_lower[3] = {7.03466361, 2.21203939, 9.89993966};
+    double reference_upper[3] = {7.27133583, 2.59044432, 10.26619169};
+    double lower[3], upper[3], lower_single[3], upper_single[3];
+    evpi_workspace* ws_single = evpi_workspace_new(n_samples_x, n_vars_y, 0, 1);
+    ws = evpi_workspace_new(n_samples_x, n_vars_y, 0, 2);
+    if (evpi_workspace_reserve_bootstrap(ws, 200) != 0 ||
+        evpi_workspace_reserve_bootstrap(ws_single, 200) != 0) {
+        printf("Could not allocate the bootstrap workspace\n");
+        return 1;
+    }
+    multi_evppi_bootstrap_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                             n_samples_x, n_vars_x, n_vars_y, 200, 0.95, 1, ws,
+                             lower, upper);
+    multi_evppi_bootstrap_ws(x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                             n_samples_x, n_vars_x, n_vars_y, 200, 0.95, 1,
+                             ws_single, lower_single, upper_single);
+    for (unsigned char i = 0; i < 3; i++) {
+        if (lower[i] != lower_single[i] || upper[i] != upper_single[i] ||
+            fabs(lower[i] - reference_lower[i]) > 0.05 ||
+            fabs(upper[i] - reference_upper[i]) > 0.05) {
+            printf("Wrong bootstrap interval for variable %i: [%f, %f] is "
+                   "not [%f, %f]\n",
+                   i, lower[i], upper[i], reference_lower[i],
+                   reference_upper[i]);
+            return 1;
+        }
+    }
+    evpi_workspace_free(ws_single);
+    evpi_workspace_free(ws);
+
+    // chunked accumulation and the memory-mapped file version agree with the
+    // in-memory result, as long as the bins are the same
+    double x_min[3], x_max[3];
+    for (unsigned char i = 0; i < 3; i++) {
+        x_min[i] = INFINITY;
+        x_max[i] = -INFINITY;
+    }
+    evpi_column_ranges(x[0], 1, n_samples_x, n_samples_x, n_vars_x, x_min,
+                       x_max, 2);
+    evpi_accumulator* acc = evpi_accumulator_new(
+        n_vars_x, n_vars_y, (unsigned int)cbrt(n_samples_x), x_min, x_max);
+    size_t half = n_samples_x / 2;
+    evpi_accumulator_add(acc, x[0], 1, n_samples_x, y_c_order, n_vars_y, 1,
+                         half, 2);
+    evpi_accumulator_add(acc, x[0] + half, 1, n_samples_x,
+                         y_c_order + half * n_vars_y, n_vars_y, 1,
+                         n_samples_x - half, 2);
+    double acc_res[3], file_res[3], file_evpi_res;
+    evpi_accumulator_result(acc, 0, acc_res);
+    evpi_accumulator_free(acc);
+
+    char x_path[] = "/tmp/evpi_test_x_XXXXXX";
+    char y_path[] = "/tmp/evpi_test_y_XXXXXX";
+    FILE* x_file = open_temp_file(x_path);
+    fwrite(x[0], sizeof(double), n_samples_x * n_vars_x, x_file);
+    fclose(x_file);
+    FILE* y_file = open_temp_file(y_path);
+    fwrite(y[0], sizeof(double), n_samples_y * n_vars_y, y_file);
+    fclose(y_file);
+    int file_status = multi_evppi_file(x_path, y_path, n_vars_x, n_vars_y, 0, 0,
+                                       1 << 16, 2, file_res, &file_evpi_res);
+    remove(x_path);
+    remove(y_path);
+    if (file_status != 0) {
+        printf("Could not read sample files\n");
+        return 1;
+    }
+    for (unsigned char i = 0; i < 3; i++) {
+        if (fabs(acc_res[i] - strided_res[i]) > 1e-9 ||
+            fabs(file_res[i] - strided_res[i]) > 1e-9) {
+            printf("Wrong chunked EVPPI for variable %i: %f, %f is not %f\n", i,
+                   acc_res[i], file_res[i], strided_res[i]);
+            return 1;
+        }
+    }
+    if (fabs(file_evpi_res - evpi_res) > 1e-9) {
+        printf("Wrong chunked EVPI: %f is not %f\n", file_evpi_res, evpi_res);
+        return 1;
+    }
+
+    // a header without data rows is not an allocation failure
+    char empty_path[] = "/tmp/evpi_test_empty_XXXXXX";
+    FILE* empty_file = open_temp_file(empty_path);
+    fputs(",a,b\n", empty_file);
+    fclose(empty_file);
+    evpi_table empty_table;
+    int empty_status = evpi_read_csv(empty_path, 1, 2, &empty_table);
+    remove(empty_path);
+    if (empty_status != -2) {
+        printf("CSV without data rows not recognized\n");
+        return 1;
+    }
+
+    free(strided_res);
+    free(y_c_order);
+    free(x[0]);
+    free(x);
+    free(y[0]);
+    free(y);
     printf("Test passed.\n");
 
     return 0;
@@ -3,7 +3,7 @@ import matplotlib.pyplot as plt
 import scipy.stats
 import scipy.integrate
 import time
-from py_evpi import multi_evppi
+from py_evpi import multi_evppi, regression_evppi, sequential_evppi
 
 import regression_evpi
 from benchmark_problems import LinearBenchmarkProblem1
@@ -14,10 +14,12 @@ p = LinearBenchmarkProblem1()
 nested_error = []
 binning_error = []
 regression_error = []
+spline_error = []
 
 nested_time = 0
 binning_time = 0
 regression_time = 0
+spline_time = 0
 
 n_sample_range = range(1000, 50000, 1000)
 
@@ -97,12 +99,27 @@ for j, N_SAMPLES in enumerate(n_sample_range):
     regression_evppi_res = regression_evpi.multi_evppi(x, y)
     regression_time += time.time() - timer
 
+    timer = time.time()
+    spline_evppi_res = regression_evppi(x, y)
+    spline_time += time.time() - timer
+
     def rms(diff):
         return (np.sqrt(np.sum(diff*diff)))
 
     nested_error.append(rms(true_evppis - nested_mc_evppi_res))
     binning_error.append(rms(true_evppis - binning_evppi))
     regression_error.append(rms(true_evppis - regression_evppi_res))
+    spline_error.append(rms(true_evppis - spline_evppi_res))
+
+# instead of sweeping the sample number, the sequential driver draws samples
+# until the estimates are stable
+print("tolerance", "samples", "error", "estimated standard errors", sep="\t")
+for tolerance in (2e-2, 1e-2, 5e-3):
+    sequential_res, sequential_std, n_samples, _ = sequential_evppi(
+        p.x, p.utility, tolerance)
+    print(tolerance, n_samples,
+          "{:.3f}".format(np.sqrt(np.sum((true_evppis - sequential_res)**2))),
+          np.round(sequential_std, 3), sep="\t")
 
 fig, ax = plt.subplots(1)
 ax.plot(n_sample_range, nested_error,
@@ -111,6 +128,9 @@ ax.plot(n_sample_range, binning_error,
         label="1-level MC with binning ({:.2f} s)".format(binning_time))
 ax.plot(n_sample_range, regression_error,
         label="1-level MC with regression ({:.2f} s)".format(regression_time))
+ax.plot(n_sample_range, spline_error,
+        label="1-level MC with P-spline regression ({:.2f} s)".format(
+            spline_time))
 ax.legend()
 ax.set_xlabel("number of Monte Carlo samples")
 ax.set_ylabel("root mean square error of the 3 EVPPI values")
@@ -0,0 +1,66 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import time
+
+import py_evpi
+from benchmark_problems import LinearBenchmarkProblem1, \
+    NonlinearBenchmarkProblem
+
+plt.style.use("seaborn-v0_8-whitegrid")
+
+# exact EVPPIs of the single variables of the linear problem (s.
+# `benchmark_linear.py`)
+true_evppis = np.array([19.0150780, 2.7691518, 9.63411])
+
+n_sample_range = np.logspace(3, 6, 7).astype(int)
+
+methods = {
+    "binning": lambda x, y: py_evpi.multi_evppi(x, y),
+    "k nearest neighbors": lambda x, y: np.array(
+        [py_evpi.knn_evppi(x[:, i], y) for i in range(x.shape[1])]),
+}
+errors = {name: [] for name in methods}
+times = {name: [] for name in methods}
+
+p = LinearBenchmarkProblem1()
+for N_SAMPLES in n_sample_range:
+    print(N_SAMPLES)
+    x = p.x(N_SAMPLES)
+    y = p.y()
+    for name, method in methods.items():
+        timer = time.time()
+        res = method(x, y)
+        times[name].append(time.time() - timer)
+        errors[name].append(np.sqrt(np.sum((true_evppis - res)**2)))
+
+# groups of two variables of the nonlinear problem, where binning and the
+# nearest neighbors have to agree with each other
+p = NonlinearBenchmarkProblem()
+x = p.x(10**5)
+y = p.y()
+print("group", "binning", "k nearest neighbors", sep="\t")
+for group in ([0, 1], [0, 2], [1, 2], [0, 1, 2]):
+    timer = time.time()
+    group_res = py_evpi.group_evppi(x[:, group], y)
+    group_time = time.time() - timer
+    timer = time.time()
+    knn_res = py_evpi.knn_evppi(x[:, group], y)
+    knn_time = time.time() - timer
+    print(group, "{:.3f} ({:.2f} s)".format(group_res, group_time),
+          "{:.3f} ({:.2f} s)".format(knn_res, knn_time), sep="\t")
+
+fig, (ax_error, ax_time) = plt.subplots(1, 2, figsize=(10, 5))
+for name in methods:
+    ax_error.plot(n_sample_range, errors[name], label=name)
+    ax_time.plot(n_sample_range, times[name], label=name)
+ax_error.set_xscale("log")
+ax_error.set_yscale("log")
+ax_error.set_xlabel("number of Monte Carlo samples")
+ax_error.set_ylabel("root mean square error of the 3 EVPPI values")
+ax_time.set_xscale("log")
+ax_time.set_yscale("log")
+ax_time.set_xlabel("number of Monte Carlo samples")
+ax_time.set_ylabel("time in s")
+ax_error.legend()
+fig.tight_layout()
+plt.show()
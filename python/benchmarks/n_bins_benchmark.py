@@ -1,9 +1,7 @@
-import numpy as np
 import matplotlib.pyplot as plt
 import time
 
 import py_evpi
-import sorting_evpi
 from benchmark_problems import LinearBenchmarkProblem1
 
 plt.style.use("seaborn-v0_8-whitegrid")
@@ -14,38 +12,39 @@ plt.rcParams.update({
 p = LinearBenchmarkProblem1()
 
 n_samples = 10**5
-n_bins = int(n_samples ** (1/3))
+x = p.x(n_samples)
+y = p.y()
 
 
 fig, ax = plt.subplots(1, figsize=(5, 5))
 
+bins = list(range(1, 101, 3))
 
-hist_evppis = []
-sorting_evppis = []
+# every variable is sorted once for all bin numbers
+time_start = time.time()
+hist_evppis = py_evpi.evppi_curve(x, y, bins)
+hist_time = time.time()-time_start
 
-hist_time = 0
-sorting_time = 0
+time_start = time.time()
+quantile_evppis = py_evpi.evppi_curve(x, y, bins, binning="quantile")
+quantile_time = time.time()-time_start
 
-bins = list(range(1, 101, 3))
+# reference: one full run per bin number
+time_start = time.time()
 for i in bins:
-    time_start = time.time()
-    hist_evppis.append(py_evpi.multi_evppi(
-        p.x(n_samples), p.y(), i))
-    hist_time += time.time()-time_start
-
-    time_start = time.time()
-    sorting_evppis.append(sorting_evpi.sorting_multi_evppi(
-        p.x(n_samples), p.y(), i))
-    sorting_time += time.time()-time_start
-
-hist_evppis = np.array(hist_evppis)
-sorting_evppis = np.array(sorting_evppis)
+    py_evpi.multi_evppi(x, y, i)
+single_time = time.time()-time_start
+print("evppi_curve: {:.3f} s, multi_evppi per bin number: {:.3f} s".format(
+    hist_time, single_time))
+
 for i in range(3):
     ax.plot(bins, hist_evppis[:, i],
-            label="histogram EVPPI (variable {}, {} s)".format(i, hist_time),
+            label="histogram EVPPI (variable {}, {:.2f} s)".format(
+                i, hist_time),
             c="C"+str(i))
-    ax.plot(bins, sorting_evppis[:, i],
-            label="sorting EVPPI (variable {}, {} s)".format(i, sorting_time),
+    ax.plot(bins, quantile_evppis[:, i],
+            label="quantile EVPPI (variable {}, {:.2f} s)".format(
+                i, quantile_time),
             c="C"+str(i),
             linestyle="dotted")
 ax.legend()
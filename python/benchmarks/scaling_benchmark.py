@@ -0,0 +1,63 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import time
+
+import py_evpi
+from benchmark_problems import LinearBenchmarkProblem1
+
+plt.style.use("seaborn-v0_8-whitegrid")
+
+p = LinearBenchmarkProblem1()
+
+
+def masked_evppi(x, y, n_bins=None):
+    # reference implementation, that masks all samples once for every bin
+    n_samples = x.shape[0]
+    if n_bins is None:
+        n_bins = int(np.cbrt(n_samples))
+    bin_size = (np.max(x) - np.min(x)) / n_bins
+    bin_idxs = ((x-np.min(x))/bin_size).astype(int)
+
+    sum_res = 0
+    for i in range(n_bins):
+        sum_res += np.max(np.sum(y[bin_idxs == i, :], axis=0))
+    return sum_res / n_samples - np.max(np.mean(y, axis=0))
+
+
+n_sample_range = np.logspace(3, 7, 9).astype(int)
+
+masked_times = []
+scatter_times = []
+
+for N_SAMPLES in n_sample_range:
+    print(N_SAMPLES)
+
+    x = p.x(N_SAMPLES)
+    y = p.y()
+
+    timer = time.time()
+    for i in range(3):
+        masked_evppi(x[:, i], y)
+    masked_times.append(time.time() - timer)
+
+    timer = time.time()
+    for i in range(3):
+        py_evpi.evppi(x[:, i], y)
+    scatter_times.append(time.time() - timer)
+
+masked_times = np.array(masked_times)
+scatter_times = np.array(scatter_times)
+
+fig, ax = plt.subplots(1)
+ax.loglog(n_sample_range, masked_times, label="one mask per bin")
+ax.loglog(n_sample_range, scatter_times, label="single pass (bincount)")
+# linear reference anchored at the largest sample number
+ax.loglog(n_sample_range,
+          scatter_times[-1] * n_sample_range / n_sample_range[-1],
+          label="linear scaling", c="grey", linestyle="dotted")
+ax.legend()
+ax.set_xlabel("number of Monte Carlo samples")
+ax.set_ylabel("time for 3 EVPPI values in s")
+ax.set_title("scaling of the binning EVPPI with the sample number\n"
+             "(cubic root of the sample number as bin number)")
+plt.show()
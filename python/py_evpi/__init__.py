@@ -1,5 +1,24 @@
-from .evpi import evpi, evppi, multi_evppi, evipi
+from .evpi import evpi, evppi, multi_evppi, evppi_curve, group_evppi, \
+    evipi, multi_evipi, BinnedInputs
 from .binary_evpi import binary_evpi, binary_evppi, binary_multi_evppi
+from .accumulator import EVPPIAccumulator
+from .sequential import sequential_evppi
+from .screening import screen_evppi
+from .binning_cache import BinningCache
+from .net_benefit import net_benefit_evpi, net_benefit_multi_evppi
+from .pairwise import pairwise_evppi
+from .regression import regression_evppi
+from .knn import knn_evppi
+from .permutation import calibrated_multi_evppi, \
+    calibrated_binary_multi_evppi
+from .out_of_core import open_samples, out_of_core_multi_evppi
 
-__all__ = ["evpi", "evppi", "multi_evppi", "evipi",
-           "binary_evpi", "binary_evppi", "binary_multi_evppi"]
+__all__ = ["evpi", "evppi", "multi_evppi", "evppi_curve", "group_evppi",
+           "pairwise_evppi", "regression_evppi", "knn_evppi",
+           "evipi", "multi_evipi",
+           "binary_evpi", "binary_evppi", "binary_multi_evppi",
+           "calibrated_multi_evppi", "calibrated_binary_multi_evppi",
+           "BinnedInputs", "BinningCache", "EVPPIAccumulator",
+           "sequential_evppi", "screen_evppi",
+           "open_samples", "out_of_core_multi_evppi",
+           "net_benefit_evpi", "net_benefit_multi_evppi"]
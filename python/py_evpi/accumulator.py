@@ -0,0 +1,187 @@
+import numpy as np
+
+from .evpi import _bin_idxs, _bin_sums
+
+
+class EVPPIAccumulator:
+    """Streaming EVPPI for Monte Carlo samples, that arrive in chunks.
+    Only the sums of the output samples per variable, bin and decision
+    option are kept, so the memory usage does not depend on the number of
+    samples. The histogram bins are fixed, either by known bounds of the
+    input variables or by the minimum and maximum of the first chunk.
+    Samples outside these bounds are counted in the first or last bin.
+
+    Accumulators with the same bins (e.g. from parallel workers) can be
+    combined with `merge`.
+
+    Parameters
+    ----------
+    n_bins : int
+        Number of histogram bins per variable. A good choice is the cubic
+        root of the expected total sample number.
+    x_min, x_max : 1D array_like
+        Lower and upper bound of each input variable. Default to the
+        minimum and maximum of the first chunk.
+
+    Examples
+    --------
+    >>> acc = EVPPIAccumulator(n_bins=100)
+    >>> for x_chunk, y_chunk in chunks:
+    ...     acc.partial_fit(x_chunk, y_chunk)
+    >>> acc.result()
+    """
+
+    def __init__(self, n_bins, x_min=None, x_max=None):
+        if (x_min is None) != (x_max is None):
+            raise ValueError("Either both or none of x_min and x_max must be "
+                             "given.")
+        self.n_bins = n_bins
+        self.x_min = None if x_min is None else np.asarray(x_min, dtype=float)
+        self.x_max = None if x_max is None else np.asarray(x_max, dtype=float)
+        self.n_samples = 0
+        # sum of the output per variable, bin and decision option
+        self.y_sums = None
+        # sum of the highest output among all options (for the total EVPI)
+        self.y_max_sum = 0
+        # observed range, to detect deterministic variables
+        self.x_seen_min = None
+        self.x_seen_max = None
+
+    def partial_fit(self, x, y):
+        """Adds a chunk of Monte Carlo samples.
+
+        Parameters
+        ----------
+        x : 2D array_like
+            Input samples of this chunk. Columns are variables, rows are
+            samples. A 1D array is considered a single variable.
+        y : 2D array_like
+            The respective output samples. Samples are rows, decision
+            options are columns.
+
+        Returns
+        -------
+        self
+        """
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 1:
+            x = x[:, np.newaxis]
+        y = np.asarray(y, dtype=float)
+        if x.shape[0] != y.shape[0]:
+            raise ValueError("Number of samples in x and y must match.")
+        if x.shape[0] == 0:
+            return self
+
+        if self.x_min is None:
+            self.x_min = np.min(x, axis=0)
+            self.x_max = np.max(x, axis=0)
+        if self.y_sums is None:
+            self.y_sums = np.zeros((x.shape[1], self.n_bins, y.shape[1]))
+            self.x_seen_min = np.full(x.shape[1], np.inf)
+            self.x_seen_max = np.full(x.shape[1], -np.inf)
+        elif self.y_sums.shape[0] != x.shape[1] or \
+                self.y_sums.shape[2] != y.shape[1]:
+            raise ValueError("Number of variables or decision options "
+                             "changed between chunks.")
+
+        bin_idxs = _bin_idxs(x, self.n_bins, self.x_min, self.x_max)
+        self.y_sums += _bin_sums(bin_idxs, y, self.n_bins)
+        self.y_max_sum += np.sum(np.max(y, axis=1))
+        self.n_samples += x.shape[0]
+
+        np.minimum(self.x_seen_min, np.min(x, axis=0), out=self.x_seen_min)
+        np.maximum(self.x_seen_max, np.max(x, axis=0), out=self.x_seen_max)
+        return self
+
+    def merge(self, other):
+        """Adds the samples of another accumulator with the same bins.
+
+        Parameters
+        ----------
+        other : EVPPIAccumulator
+            Accumulator with equal `n_bins`, `x_min` and `x_max`.
+
+        Returns
+        -------
+        self
+        """
+        if other.y_sums is None:
+            return self
+        if self.y_sums is None:
+            if self.x_min is not None and not self._same_bins(other):
+                raise ValueError("Only accumulators with equal bins can be "
+                                 "merged.")
+            self.x_min = other.x_min.copy()
+            self.x_max = other.x_max.copy()
+            self.y_sums = np.zeros_like(other.y_sums)
+            self.x_seen_min = np.full_like(other.x_seen_min, np.inf)
+            self.x_seen_max = np.full_like(other.x_seen_max, -np.inf)
+        elif not self._same_bins(other) or \
+                self.y_sums.shape != other.y_sums.shape:
+            raise ValueError("Only accumulators with equal bins can be "
+                             "merged.")
+
+        self.y_sums += other.y_sums
+        self.y_max_sum += other.y_max_sum
+        self.n_samples += other.n_samples
+        np.minimum(self.x_seen_min, other.x_seen_min, out=self.x_seen_min)
+        np.maximum(self.x_seen_max, other.x_seen_max, out=self.x_seen_max)
+        return self
+
+    def _same_bins(self, other):
+        return self.n_bins == other.n_bins and \
+            np.array_equal(self.x_min, other.x_min) and \
+            np.array_equal(self.x_max, other.x_max)
+
+    def _emv(self):
+        # expected maximum value, every bin row sums up to the option totals
+        return np.max(np.sum(self.y_sums[0], axis=0)) / self.n_samples
+
+    def evpi(self):
+        """Total EVPI of all samples added so far. S. `py_evpi.evpi`."""
+        if self.n_samples == 0:
+            raise ValueError("No samples have been added yet.")
+        return self.y_max_sum / self.n_samples - self._emv()
+
+    def result(self, significance_threshold=1e-3, n_bins=None):
+        """EVPPI of all samples added so far. S. `py_evpi.multi_evppi`.
+
+        Parameters
+        ----------
+        significance_threshold : float
+            Percentage of the total EVPI, below which EVPI values will be set
+            to zero, since really small positive values are mostly numerical
+            artifacts.
+        n_bins : int
+            Upper limit for the number of bins of the result. Groups of
+            adjacent bins are merged, so an accumulator with many bins can
+            be evaluated with few samples, too. Defaults to the bins of the
+            accumulator.
+
+        Returns
+        -------
+        1D array
+            One EVPPI value per variable.
+        """
+        if self.n_samples == 0:
+            raise ValueError("No samples have been added yet.")
+
+        y_sums = self.y_sums
+        if n_bins is not None and n_bins < self.n_bins:
+            group_size = -(-self.n_bins // n_bins)
+            y_sums = np.add.reduceat(
+                y_sums, np.arange(0, self.n_bins, group_size), axis=1)
+
+        ev_pi = np.sum(np.max(y_sums, axis=2), axis=1) / self.n_samples
+        evppi_results = ev_pi - self._emv()
+
+        # if input is deterministic, further information can not have any
+        # value
+        evppi_results[self.x_seen_min == self.x_seen_max] = 0
+
+        # Since this method tends to overestimate EVPIs, that are actually
+        # zero, we want to test, if the EVPI is "significant" (not in the
+        # sense of a statistical test).
+        evppi_results[evppi_results <
+                      self.evpi() * significance_threshold] = 0
+        return evppi_results
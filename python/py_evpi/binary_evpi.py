@@ -1,12 +1,57 @@
 import numpy as np
 
+from .evpi import _check_weights
 
-def _calc_binary_ev_pi(x, y, n_bins):
+# Since the expected value for just a handful of samples will
+# always describe this bin a lot better than the expected
+# value of the entire population (even though the sampling might
+# have been completely random), this might seem like there is
+# significant information value, when in fact there is not.
+# Therefore bins with too few samples are kicked out.
+# (Up to this point, this value showed no big impact in my tests.)
+MIN_SAMPLES_PER_BIN = 1
+
+# Just a safety limit to avoid infinite loops for really weird input
+# distributions
+MAX_N_BINS = 1000
+
+
+def _binary_histogram(x, n_bins):
+    """Histogram with at least `n_bins` bins with enough samples in them and
+    the bin of every sample.
+
+    Returns
+    ------
+    hist : 1D array of int
+        Number of samples in each bin.
+    bin_idxs : 1D array of int
+        Bin index of each sample.
+    """
+    # increase the number of total bins, so we have at least `n_bins`
+    # bins with enough samples in them
+    total_n_bins = n_bins
+    n_bins_sufficient = 0
+    while n_bins_sufficient < n_bins and total_n_bins < MAX_N_BINS:
+        total_n_bins += n_bins_sufficient
+
+        # divide the estimate samples into histogram bins
+        hist, hist_bins = np.histogram(x, bins=total_n_bins)
+        # count number of bins with enough samples
+        n_bins_sufficient = np.count_nonzero(hist >= MIN_SAMPLES_PER_BIN)
+
+    # assign every sample to its histogram bin, the last bin includes its
+    # upper edge just like in `np.histogram`
+    bin_idxs = np.searchsorted(hist_bins, x, side="right") - 1
+    np.minimum(bin_idxs, total_n_bins - 1, out=bin_idxs)
+    return hist, bin_idxs
+
+
+def _calc_binary_ev_pi(x, y, n_bins, weights=None):
     """Expected outcome given perfect information on x.
-    Loops through the bins of a histogram over the input and calculated the sum
-    of the respective output samples if positive, zero otherwise. This is then
-    normalized by the number of samples considered. The result can be though of
-    as weighted average over the respective expected outcomes of all the bins.
+    Sums up the output samples in every bin of a histogram over the input and
+    keeps this sum if positive, zero otherwise. This is then normalized by the
+    number of samples considered. The result can be though of as weighted
+    average over the respective expected outcomes of all the bins.
 
     Parameters
     ----------
@@ -16,6 +61,9 @@ def _calc_binary_ev_pi(x, y, n_bins):
         Output samples.
     n_bins : int
         Number of non-empty histogram bins.
+    weights : 1D array
+        Weight of each sample. The bin sums are weighted and normalized by
+        the weight of the samples considered.
 
     Returns
     ------
@@ -23,63 +71,38 @@ def _calc_binary_ev_pi(x, y, n_bins):
         Expected outcome given perfect information on x.
     """
 
-    # Since the expected value for just a handful of samples will
-    # always describe this bin a lot better than the expected
-    # value of the entire population (even though the sampling might
-    # have been completely random), this might seem like there is
-    # significant information value, when in fact there is not.
-    # Therefore bins with too few samples are kicked out.
-    # (Up to this point, this value showed no big impact in my tests.)
-    MIN_SAMPLES_PER_BIN = 1
-
-    # Just a safety limit to avoid infinite loops for really weird input
-    # distributions
-    MAX_N_BINS = 1000
-
-    # increase the number of total bins, so we have at least `n_bins`
-    # bins with enough samples in them
-    total_n_bins = n_bins
-    n_bins_sufficient = 0
-    while n_bins_sufficient < n_bins and total_n_bins < MAX_N_BINS:
-        total_n_bins += n_bins_sufficient
-
-        # divide the estimate samples into histogram bins
-        hist, hist_bins = np.histogram(x, bins=total_n_bins)
-        # check which histogram bins have enough samples
-        sufficiency_mask = hist >= MIN_SAMPLES_PER_BIN
-        # count number of bins with enough samples
-        n_bins_sufficient = np.count_nonzero(sufficiency_mask)
+    hist, bin_idxs = _binary_histogram(x, n_bins)
+    sufficiency_mask = hist >= MIN_SAMPLES_PER_BIN
+    total_n_bins = len(hist)
 
     # get indices of bins with enough samples
     sufficient_bin_idxs = np.nonzero(sufficiency_mask)[0]
     # calculate the total number of samples in these bins (for
     # normalization later)
-    n_samples_considered = np.sum(hist[sufficiency_mask])
-
-    sum_res = 0
-    for i in sufficient_bin_idxs:
-        # create a binary mask for samples inside the bin
-        if i == total_n_bins-1:
-            subset_mask = (hist_bins[i] <= x) * (x <= hist_bins[i+1])
-        else:
-            subset_mask = (hist_bins[i] <= x) * (x < hist_bins[i+1])
-
-        # apply this mask on the output
-        y_subset = y[subset_mask]
-        # `np.sum(y_subset)` can be considered the expected outcome for
-        # this bin multiplied by number of samples in this bin. Since we
-        # use zero, if this expected outcome is negative, we simulate knowing
-        # that this bin contains the true sample.
-        # By summing and normalization with `n_samples_considered`, we get the
-        # weighted sum of expected outcomes.
-        sum_res += max(np.sum(y_subset), 0)
+    if weights is None:
+        n_samples_considered = np.sum(hist[sufficiency_mask])
+    else:
+        n_samples_considered = np.sum(np.bincount(
+            bin_idxs, weights=weights,
+            minlength=total_n_bins)[sufficiency_mask])
+        y = y * weights
+
+    # `bin_sums[i]` can be considered the expected outcome for bin `i`
+    # multiplied by number of samples in this bin.
+    bin_sums = np.bincount(bin_idxs, weights=y, minlength=total_n_bins)
+
+    # Since we use zero, if this expected outcome is negative, we simulate
+    # knowing that this bin contains the true sample.
+    # By summing and normalization with `n_samples_considered`, we get the
+    # weighted sum of expected outcomes.
+    sum_res = np.sum(np.maximum(bin_sums[sufficient_bin_idxs], 0))
 
     # now the normalization
     ev_pi = sum_res / n_samples_considered
     return ev_pi
 
 
-def binary_evppi(x, y, n_bins=None):
+def binary_evppi(x, y, n_bins=None, weights=None):
     """Calculates EVPPI for one estimate and one decision criterion.
     EVPI means "Expected Value of Perfect Parameter Information" and can be
     described as a measure for what a decision maker would be willing to pay
@@ -99,6 +122,9 @@ def binary_evppi(x, y, n_bins=None):
     n_bins : int
         Number of non-empty bins to use for the histogram. Defaults to 3rd
         root of sample number.
+    weights : 1D array_like
+        Weight of each sample, e.g. the likelihood ratios of importance
+        sampling. Equally weighted by default.
     """
     x = np.array(x)
     # if input is deterministic, further information can not have any value
@@ -106,9 +132,10 @@ def binary_evppi(x, y, n_bins=None):
         return 0
 
     y = np.array(y)
+    weights = _check_weights(weights, len(y))
 
     # expected value in the case of "yes"
-    ev_yes = np.mean(y)
+    ev_yes = np.average(y, weights=weights)
 
     n_samples = len(x)
 
@@ -122,7 +149,7 @@ def binary_evppi(x, y, n_bins=None):
     emv = max(0, ev_yes)
 
     # expected value given perfect information on parameter
-    ev_pi = _calc_binary_ev_pi(x, y, n_bins)
+    ev_pi = _calc_binary_ev_pi(x, y, n_bins, weights)
 
     # expected value of perfect parameter information
     evppi = ev_pi - emv
@@ -130,7 +157,7 @@ def binary_evppi(x, y, n_bins=None):
     return evppi
 
 
-def binary_evpi(y):
+def binary_evpi(y, weights=None):
     """Total EVPI.
     Expected value of making always the best decision. If the model itself is
     deterministic, i.e. the only source of uncertainty are the input variables,
@@ -140,12 +167,15 @@ def binary_evpi(y):
     ----------
     y : 1D array_like
         Monte carlo samples of model output (utility). S. `evppi`.
+    weights : 1D array_like
+        Weight of each sample. S. `binary_evppi`.
     """
 
     y = np.array(y)
+    weights = _check_weights(weights, len(y))
 
     # expected value in the case of "yes"
-    ev_yes = np.mean(y)
+    ev_yes = np.average(y, weights=weights)
 
     # expected maximum value
     emv = max(0, ev_yes)
@@ -155,7 +185,7 @@ def binary_evpi(y):
     y_pi[y_pi < 0] = 0
 
     # expected value given perfect information
-    ev_pi = np.mean(y_pi)
+    ev_pi = np.average(y_pi, weights=weights)
 
     # expected value of perfect information
     evpi = ev_pi - emv
@@ -163,7 +193,8 @@ def binary_evpi(y):
     return evpi
 
 
-def binary_multi_evppi(x, y, n_bins=None, significance_threshold=5e-2):
+def binary_multi_evppi(x, y, n_bins=None, significance_threshold=5e-2,
+                       weights=None):
     """Calculate evppi for multiple input variables and one output variable.
 
     Parameters
@@ -183,16 +214,19 @@ def binary_multi_evppi(x, y, n_bins=None, significance_threshold=5e-2):
     significance_threshold : float
         Percentage of the total EVPI, below which EVPI values will be set to
         zero, since really small positive values are mostly numerical
-        artifacts.
+        artifacts. S. `calibrated_binary_multi_evppi` for a calibrated
+        alternative.
+    weights : 1D array_like
+        Weight of each sample. S. `binary_evppi`.
     """
     x = np.array(x)
     y = np.array(y)
 
     n_variables = x.shape[1]
     evppi_results = np.zeros(n_variables)
-    evpi_result = binary_evpi(y)
+    evpi_result = binary_evpi(y, weights)
     for i in range(n_variables):
-        this_evpi = binary_evppi(x[:, i], y, n_bins)
+        this_evpi = binary_evppi(x[:, i], y, n_bins, weights)
 
         # Since this method tends to overestimate EVPIs, that are actually
         # zero, we want to test, if the EVPI is "significant" (not in the
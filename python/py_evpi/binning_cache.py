@@ -0,0 +1,126 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from .evpi import BinnedInputs, _check_binning
+
+# Default upper limit for the memory of all cached bin indices in bytes.
+DEFAULT_MAX_BYTES = 2**28
+
+
+# Number of rows of a C-ordered input, that are transposed at once for
+# hashing.
+_HASH_BLOCK_SIZE = 2**16
+
+
+def _column_hashes(x):
+    """Content hash of every column, so equal columns of different arrays
+    share an entry. SHA-1 is used for speed (it is hardware-accelerated on
+    most CPUs), not for security.
+    """
+    hashers = [hashlib.sha1() for i in range(x.shape[1])]
+    if x.flags.f_contiguous:
+        for i, hasher in enumerate(hashers):
+            hasher.update(x[:, i])
+    else:
+        for start in range(0, x.shape[0], _HASH_BLOCK_SIZE):
+            block = np.ascontiguousarray(x[start:start + _HASH_BLOCK_SIZE].T)
+            for hasher, column in zip(hashers, block):
+                hasher.update(column)
+    return [hasher.digest() for hasher in hashers]
+
+
+class BinningCache:
+    """Least recently used cache of the bin indices of input columns.
+    Columns are identified by a hash of their content together with the bin
+    number and binning, so repeated EVPPI calls with the same `x` (but
+    different `y`) only bin new columns. If the cached bin indices exceed
+    `max_bytes`, the least recently used columns are dropped.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Upper limit for the memory of all cached bin indices in bytes.
+
+    Examples
+    --------
+    >>> cache = BinningCache()
+    >>> for y in outputs:
+    ...     multi_evppi(cache.bin(x), y)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # (hash, n_samples, n_bins, binning) -> (bin indices, is constant)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bin(self, x, n_bins=None, binning="uniform"):
+        """Bins the input samples, reusing the bin indices of known columns.
+
+        Parameters
+        ----------
+        x : 2D array_like
+            Input samples. Samples are rows, variables are columns. A 1D
+            array is considered a single variable.
+        n_bins : int
+            Number of histogram bins. Defaults to 3rd root of sample number.
+        binning : {"uniform", "quantile"}
+            Equally wide bins or bins with the same number of samples.
+
+        Returns
+        -------
+        BinnedInputs
+        """
+        _check_binning(binning)
+        # one cache entry for the default and explicitly uniform bins
+        binning = "uniform" if binning is None else binning
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 1:
+            x = x[:, np.newaxis]
+        n_samples, n_variables = x.shape
+        if n_bins is None:
+            n_bins = int(np.cbrt(n_samples))
+
+        keys = [(column_hash, n_samples, n_bins, binning)
+                for column_hash in _column_hashes(x)]
+        entries = [self._entries.get(key) for key in keys]
+
+        # all unknown columns are binned at once
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            binned = BinnedInputs(x[:, missing], n_bins, binning)
+            for j, i in enumerate(missing):
+                bin_idxs = binned.bin_idxs[:, j].copy()
+                bin_idxs.flags.writeable = False
+                entries[i] = (bin_idxs, binned.is_const[j])
+        self.misses += len(missing)
+        self.hits += n_variables - len(missing)
+
+        for key, entry in zip(keys, entries):
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = entry
+                self.nbytes += entry[0].nbytes
+        self._evict()
+
+        return BinnedInputs._from_columns([entry[0] for entry in entries],
+                                          [entry[1] for entry in entries],
+                                          n_bins, binning)
+
+    def clear(self):
+        """Removes all cached bin indices."""
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            bin_idxs, _ = self._entries.popitem(last=False)[1]
+            self.nbytes -= bin_idxs.nbytes
@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Upper limit for the number of (replicate, sample) weights drawn at once,
+# for the non-zero entries of a sparse matrix of outputs per bin and for the
+# bin sums of a batch of replicates, so a batch stays in the order of 100 MB.
+MAX_BLOCK_SIZE = 2**22
+
+# Number of replicates of a batch, which share the sparse matrices.
+BATCH_SIZE = 64
+
+
+def _bin_output_matrix(bin_idxs, y, n_bins):
+    """Sparse matrix, that maps the samples to the output sums per
+    variable, bin and decision option, so the bin sums of a whole batch of
+    weighted replicates are a single product `weights @ matrix`.
+    """
+    n_samples, n_variables = bin_idxs.shape
+    n_options = y.shape[1]
+    offsets = np.arange(n_variables) * n_bins
+    # column of every (sample, variable, option)
+    cols = ((bin_idxs + offsets)[:, :, np.newaxis] * n_options +
+            np.arange(n_options)).reshape(n_samples, -1)
+    return csr_matrix(
+        (np.tile(y, n_variables).ravel(), cols.ravel(),
+         np.arange(0, cols.size + 1, cols.shape[1])),
+        shape=(n_samples, n_variables * n_bins * n_options))
+
+
+def _blocks(n_samples, n_variables, n_options, n_bins, n_replicates):
+    """Blocks of variables and chunks of samples, so the bin sums of a block
+    for a batch of replicates, the weights of a chunk and the sparse matrix
+    of a chunk and block stay below `MAX_BLOCK_SIZE`.
+    """
+    block_size = max(1, MAX_BLOCK_SIZE // (n_replicates * n_bins * n_options))
+    chunk_size = max(1, min(MAX_BLOCK_SIZE // (block_size * n_options),
+                            MAX_BLOCK_SIZE // n_replicates))
+    blocks = [slice(start, start + block_size)
+              for start in range(0, n_variables, block_size)]
+    chunks = [slice(start, start + chunk_size)
+              for start in range(0, n_samples, chunk_size)]
+    return blocks, chunks
+
+
+def _bootstrap_batch(bin_idxs, y, n_bins, n_replicates, seed,
+                     sample_weights=None):
+    """EVPPI of every variable for a batch of bootstrap replicates. Every
+    replicate weights the samples with independent Poisson(1) counts, which
+    is the multinomial resampling of the bootstrap up to a random total.
+    Weighted samples bring their weights already multiplied into `y`, so
+    only the totals need them.
+    The bin sums are accumulated over chunks of samples for one block of
+    variables at a time. The weights of each chunk have their own seed, so
+    they are drawn again for every block instead of being kept, and every
+    sparse matrix is released before the next one is built.
+    """
+    n_samples, n_variables = bin_idxs.shape
+    n_options = y.shape[1]
+    blocks, chunks = _blocks(n_samples, n_variables, n_options, n_bins,
+                             n_replicates)
+    chunk_seeds = seed.spawn(len(chunks))
+
+    res = []
+    totals, y_sums = 0, 0
+    for block_i, variables in enumerate(blocks):
+        bin_sums = 0
+        for chunk_i, samples in enumerate(chunks):
+            weights = np.random.default_rng(chunk_seeds[chunk_i]).poisson(
+                1.0, (n_replicates, y[samples].shape[0])).astype(float)
+            if block_i == 0:
+                # totals and output sums of the replicates in passing
+                if sample_weights is None:
+                    totals = totals + np.sum(weights, axis=1)
+                else:
+                    totals = totals + weights @ sample_weights[samples]
+                y_sums = y_sums + weights @ y[samples]
+            bin_sums = bin_sums + weights @ _bin_output_matrix(
+                bin_idxs[samples, variables], y[samples], n_bins)
+        if block_i == 0:
+            emv = np.max(y_sums, axis=1) / totals
+        bin_sums = bin_sums.reshape(n_replicates, -1, n_bins, n_options)
+        # empty bins have only zero sums and do not add anything
+        ev_pi = np.sum(np.max(bin_sums, axis=3), axis=2) / totals[:, None]
+        res.append(ev_pi - emv[:, None])
+    return np.concatenate(res, axis=1)
+
+
+def bootstrap_intervals(bin_idxs, is_const, y, n_bins, n_bootstrap,
+                        confidence=0.95, seed=None, n_threads=None,
+                        weights=None):
+    """Percentile bootstrap confidence intervals of the EVPPI of every
+    variable.
+    The bins are assigned only once. Instead of resampling `x` and `y`, every
+    replicate reweights the samples of the bin sums, so the bin sums of a
+    batch of replicates are the product of the weights with a sparse matrix
+    of the outputs per bin, built for one block of variables and samples at
+    a time (s. `_bootstrap_batch`). The replicates are
+    processed in batches by a pool of threads, each batch with its own seed
+    derived from `seed`, so the result does not depend on the number of
+    threads.
+
+    Parameters
+    ----------
+    bin_idxs : 2D array of int
+        Bin index of each sample (rows) for each variable (columns).
+    is_const : 1D array of bool
+        Whether a variable is deterministic.
+    y : 2D array
+        Output samples.
+    n_bins : int
+        Number of histogram bins.
+    n_bootstrap : int
+        Number of bootstrap replicates.
+    confidence : float
+        Confidence level of the intervals.
+    seed : int or np.random.SeedSequence
+        Seed of the resampling weights.
+    n_threads : int
+        Number of threads. Defaults to the number of CPUs.
+    weights : 1D array
+        Weight of each sample, which multiplies its resampling counts.
+
+    Returns
+    -------
+    2D array
+        Lower and upper bound (columns) for each variable (rows).
+    """
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+    if weights is not None:
+        y = y * weights[:, np.newaxis]
+
+    starts = range(0, n_bootstrap, BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    with ThreadPoolExecutor(n_threads) as executor:
+        replicates = np.concatenate(list(executor.map(
+            lambda start, batch_seed: _bootstrap_batch(
+                bin_idxs, y, n_bins, min(BATCH_SIZE, n_bootstrap - start),
+                batch_seed, weights),
+            starts, seeds)))
+
+    alpha = (1 - confidence) / 2
+    intervals = np.percentile(replicates, [100 * alpha, 100 * (1 - alpha)],
+                              axis=0).T
+    # if input is deterministic, further information can not have any value
+    intervals[is_const] = 0
+    return intervals
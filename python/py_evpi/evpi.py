@@ -1,53 +1,302 @@
 import numpy as np
-from scipy.stats import norm
+from scipy.special import ndtr
 
+from .bootstrap import bootstrap_intervals
 
-def _calc_ev_pi(x, y, n_bins):
-    """Loops through the bins of a histogram over the input and returns the
-    highest sum of the respective output samples.
+# Upper limit for the number of (sample, variable) pairs reduced at once, so
+# the temporary bin keys of `_bin_sums` stay in the order of 100 MB.
+MAX_BLOCK_SIZE = 2**24
+
+# Supported ways to place the histogram bins: equally wide bins between the
+# minimum and maximum or bins with equal sample counts.
+BINNINGS = ("uniform", "quantile")
+
+
+def _bin_idxs(x, n_bins, x_min=None, x_max=None):
+    """Assigns every input sample to one of `n_bins` equally wide bins per
+    variable. All columns are binned at once.
+
+    Parameters
+    ----------
+    x : 2D array
+        Input samples. Samples are rows, variables are columns.
+    n_bins : int
+        Number of histogram bins.
+    x_min, x_max : 1D array
+        Fixed lower and upper edge of the histogram of each variable.
+        Samples outside are put into the first or last bin respectively.
+        Default to the minimum and maximum of the samples.
+
+    Returns
+    ------
+    2D array of int
+        Bin index of each sample (rows) for each variable (columns).
+        Constant variables are put into the first bin entirely.
+    """
+    fixed_bounds = x_min is not None
+    if not fixed_bounds:
+        x_min = np.min(x, axis=0)
+        x_max = np.max(x, axis=0)
+    bin_size = (x_max - x_min) / n_bins
+    bin_size[bin_size == 0] = 1
+
+    scaled = x - x_min
+    scaled *= 1 / bin_size
+    bin_idxs = scaled.astype(np.intp)
+    if fixed_bounds:
+        np.clip(bin_idxs, 0, n_bins - 1, out=bin_idxs)
+    else:
+        # the maximum sample lies on the upper edge of the last bin
+        np.minimum(bin_idxs, n_bins - 1, out=bin_idxs)
+    return bin_idxs
+
+
+def _quantile_bin_idxs(x, n_bins):
+    """Assigns every input sample to one of `n_bins` bins per variable, that
+    contain (almost) the same number of samples.
+    The cut points between the bins are the order statistics at ranks
+    `k * n_samples // n_bins`, which are found by partitioning (linear time)
+    instead of sorting. Every sample is assigned to a bin, equal values
+    always share one.
+
+    Parameters
+    ----------
+    x : 2D array
+        Input samples. Samples are rows, variables are columns.
+    n_bins : int
+        Number of histogram bins.
+
+    Returns
+    ------
+    2D array of int
+        Bin index of each sample (rows) for each variable (columns).
+    """
+    n_samples, n_variables = x.shape
+    bin_idxs = np.zeros(x.shape, dtype=np.intp)
+    if n_bins < 2:
+        return bin_idxs
+
+    ranks = np.unique(np.arange(1, n_bins) * n_samples // n_bins)
+    cuts = np.partition(x, ranks, axis=0)[ranks]
+    for variable_i in range(n_variables):
+        # bin `k` holds the samples from the `k`-th cut (inclusive) up to
+        # the next one
+        bin_idxs[:, variable_i] = np.searchsorted(
+            cuts[:, variable_i], x[:, variable_i], side="right")
+    return bin_idxs
+
+
+def _bin_sums(bin_idxs, y, n_bins):
+    """Sums of the output samples per variable, bin and decision option.
+    Instead of masking the samples of each bin separately, the bin indices of
+    a block of variables are offset to a common key (variable, bin), so every
+    decision option is reduced with a single `np.bincount` for the whole
+    block. The cost is linear in the number of samples and independent of
+    the number of bins.
 
     Parameters
     ----------
-    x : 1D array
-        Input samples.
+    bin_idxs : 2D array of int
+        Bin index of each sample (rows) for each variable (columns).
+    y : 2D array
+        Output samples.
+    n_bins : int
+        Number of histogram bins.
+
+    Returns
+    ------
+    3D array
+        Sum of the output samples for each variable, bin and decision
+        option.
+    """
+    n_samples, n_variables = bin_idxs.shape
+    n_options = y.shape[1]
+    y_sums = np.empty((n_variables, n_bins, n_options))
+
+    block_size = max(1, MAX_BLOCK_SIZE // n_samples)
+    for start in range(0, n_variables, block_size):
+        stop = min(start + block_size, n_variables)
+        offsets = np.arange(stop - start) * n_bins
+        keys = (bin_idxs[:, start:stop] + offsets).ravel()
+        for option_i in range(n_options):
+            weights = np.broadcast_to(y[:, option_i, None],
+                                      (n_samples, stop - start)).ravel()
+            y_sums[start:stop, :, option_i] = np.bincount(
+                keys, weights=weights,
+                minlength=(stop - start) * n_bins).reshape(-1, n_bins)
+    return y_sums
+
+
+def _check_binning(binning):
+    # None is the default binning, i.e. the one of `BinnedInputs` or uniform
+    if binning is not None and binning not in BINNINGS:
+        raise ValueError("Unknown binning {!r}, use one of {}.".format(
+            binning, ", ".join(BINNINGS)))
+
+
+def _check_weights(weights, n_samples):
+    """Sample weights as a float array or None for equally weighted
+    samples."""
+    if weights is None:
+        return None
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (n_samples,):
+        raise ValueError("There must be one weight per sample.")
+    if np.any(weights < 0) or not np.sum(weights) > 0:
+        raise ValueError("Weights must be non-negative and not all zero.")
+    return weights
+
+
+def _assign_bins(x, n_bins, binning):
+    if binning == "quantile":
+        return _quantile_bin_idxs(x, n_bins)
+    return _bin_idxs(x, n_bins)
+
+
+def _bin_dtype(n_bins):
+    # smallest unsigned integer type for all bin indices, mostly uint8 or
+    # uint16
+    return np.min_scalar_type(max(n_bins - 1, 0))
+
+
+class BinnedInputs:
+    """Bin indices of input samples, that can be reused for any number of
+    output samples.
+    If `x` stays the same while `y` changes (e.g. new decision options or
+    cost models), binning `x` once and passing this object instead of `x` to
+    `evppi` or `multi_evppi` leaves only the reduction of `y` for every
+    call. The indices are stored in the smallest sufficient unsigned
+    integer type (usually uint8 or uint16). S. `BinningCache` for automatic
+    reuse.
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Input samples. Samples are rows, variables are columns. A 1D array is
+        considered a single variable.
+    n_bins : int
+        Number of histogram bins. Defaults to 3rd root of sample number.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples. S.
+        `multi_evppi`.
+
+    Attributes
+    ----------
+    bin_idxs : 2D array of unsigned int
+        Bin index of each sample (rows) for each variable (columns).
+    is_const : 1D array of bool
+        Whether a variable is deterministic.
+    """
+
+    def __init__(self, x, n_bins=None, binning="uniform"):
+        _check_binning(binning)
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 1:
+            x = x[:, np.newaxis]
+        if n_bins is None:
+            n_bins = int(np.cbrt(x.shape[0]))
+        self.n_bins = n_bins
+        self.binning = "uniform" if binning is None else binning
+        self.bin_idxs = _assign_bins(x, n_bins, binning).astype(
+            _bin_dtype(n_bins))
+        self.is_const = np.all(x == x[0], axis=0)
+
+    @classmethod
+    def _from_columns(cls, bin_idxs, is_const, n_bins, binning):
+        binned = cls.__new__(cls)
+        binned.n_bins = n_bins
+        binned.binning = binning
+        binned.bin_idxs = np.column_stack(bin_idxs)
+        binned.is_const = np.array(is_const, dtype=bool)
+        return binned
+
+    @property
+    def shape(self):
+        """Number of samples and variables."""
+        return self.bin_idxs.shape
+
+    @property
+    def nbytes(self):
+        """Memory of the bin indices in bytes."""
+        return self.bin_idxs.nbytes
+
+    def _check_n_bins(self, n_bins):
+        if n_bins is not None and n_bins != self.n_bins:
+            raise ValueError("The inputs are binned with {} bins, not {}."
+                             .format(self.n_bins, n_bins))
+
+    def _check_binning(self, binning):
+        if binning is not None and binning != self.binning:
+            raise ValueError("The inputs are binned with {!r} binning, not "
+                             "{!r}.".format(self.binning, binning))
+
+
+def _bin_inputs(x, n_bins, binning):
+    """Bin indices, constant columns and bin number of 2D inputs, which
+    might be binned already.
+    """
+    if isinstance(x, BinnedInputs):
+        x._check_n_bins(n_bins)
+        x._check_binning(binning)
+        return x.bin_idxs, x.is_const, x.n_bins
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        x = x[:, np.newaxis]
+
+    # use cubic root of sample number as default
+    if n_bins is None:
+        n_bins = int(np.cbrt(x.shape[0]))
+
+    # all variables are binned at once
+    bin_idxs = _assign_bins(x, n_bins, binning)
+    is_const = np.all(x == x[0], axis=0)
+    return bin_idxs, is_const, n_bins
+
+
+def _ev_pi(bin_idxs, y, n_bins, weights=None):
+    """Returns the normalized sum of the highest output sums of all bins.
+
+    Parameters
+    ----------
+    bin_idxs : 2D array of int
+        Bin index of each sample (rows) for each variable (columns).
     y : 2D array
         Output samples.
     n_bins : int
         Number of non-empty histogram bins.
+    weights : 1D array
+        Weight of each sample. The bin sums are weighted and normalized by
+        the total weight instead of the number of samples.
 
     Returns
     ------
-    int
+    1D array
         Sum of optimal decision option output for each bin. Can be
         interpreted as the expected value weighted with the number of
-        samples in the bin.
+        samples in the bin. One value per variable.
     """
+    n_samples = bin_idxs.shape[0]
+    if weights is not None:
+        y = y * weights[:, np.newaxis]
+        n_samples = np.sum(weights)
 
-    bin_size = (np.max(x) - np.min(x)) / n_bins
-    n_samples = x.shape[0]
+    # `y_sums[k, i]` can be considered the expected outcome for bin `i` of
+    # variable `k` multiplied by number of samples in this bin.
+    y_sums = _bin_sums(bin_idxs, y, n_bins)
 
-    bin_idxs = ((x-np.min(x))/bin_size).astype(int)
-
-    sum_res = 0
-    for i in range(n_bins):
-        # apply this mask on the output
-        y_subset = y[bin_idxs == i, :]
-        # get the sum over all samples (aka weighted expected value)
-        y_subset_sum = np.sum(y_subset, axis=0)
-        # `np.sum(y_subset)` can be considered the expected outcome for
-        # this bin multiplied by number of samples in this bin. Since we
-        # use the maximum value among all choices, we simulate knowing
-        # that this bin contains the true sample.
-        # By summing and normalization with `n_samples`, we get the
-        # weighted sum of expected outcomes.
-        sum_res += np.max(y_subset_sum)
+    # Since we use the maximum value among all choices, we simulate knowing
+    # that this bin contains the true sample.
+    # By summing and normalization with `n_samples`, we get the
+    # weighted sum of expected outcomes.
+    sum_res = np.sum(np.max(y_sums, axis=2), axis=1)
 
     # now the normalization
     ev_pi = sum_res / n_samples
     return ev_pi
 
 
-def evppi(x, y, n_bins=None):
+def evppi(x, y, n_bins=None, binning=None, n_bootstrap=None,
+          confidence=0.95, seed=None, weights=None):
     """Calculates EVPPI for one estimate.
     EVPPI means "Expected Value of Perfect Parameter Information" and can be
     described as a measure for what a decision maker would be willing to pay
@@ -55,10 +304,11 @@ def evppi(x, y, n_bins=None):
 
     Parameters
     ----------
-    x : 1D array_like
+    x : 1D array_like or BinnedInputs
         Monte Carlo samples from the probability distribution of the
         considered estimates or "input" variables. Samples are rows,
-        variables are columns.
+        variables are columns. `BinnedInputs` of a single variable bring
+        their own bin number and binning.
     y : 2D array_like
         The respective utility (aka outcome) samples calculated using the
         estimate samples of x. This criterion is considered to be the (only)
@@ -68,31 +318,73 @@ def evppi(x, y, n_bins=None):
     n_bins : int
         Number of non-empty bins to use for the histogram. Defaults to 3rd
         root of sample number.
-    """
-    x = np.array(x)
-    if np.all(x == x[0]):
-        return 0
-    y = np.array(y)
-
-    n_samples = x.shape[0]
+    binning : {"uniform", "quantile"}
+        "uniform" uses equally wide bins between the minimum and maximum of
+        each variable. "quantile" uses bins with the same number of samples,
+        which resolves skewed or heavy-tailed inputs (e.g. lognormal costs)
+        much better. Defaults to the binning of `BinnedInputs` and to
+        "uniform" otherwise.
+    n_bootstrap : int
+        Number of bootstrap replicates for a confidence interval. The bins
+        are assigned only once and every replicate reweights the samples of
+        the bin sums (s. `bootstrap_intervals`). No interval by default.
+    confidence : float
+        Confidence level of the percentile interval.
+    seed : int
+        Seed of the bootstrap resampling.
+    weights : 1D array_like
+        Weight of each sample, e.g. the likelihood ratios of importance
+        sampling or the stratum weights of a stratified design. The bin sums
+        are weighted and all means are divided by the total weight. Quantile
+        bins still have equal sample counts. Equally weighted by default.
 
-    # use cubic root of sample number as default
-    if n_bins is None:
-        n_bins = int(np.cbrt(n_samples))
+    Returns
+    -------
+    float or tuple
+        EVPPI, with `n_bootstrap` together with the lower and upper bound of
+        its confidence interval.
+    """
+    _check_binning(binning)
+    no_value = 0 if n_bootstrap is None else (0, (0.0, 0.0))
+    if isinstance(x, BinnedInputs):
+        if x.shape[1] != 1:
+            raise ValueError("Use multi_evppi for multiple variables.")
+        x._check_n_bins(n_bins)
+        x._check_binning(binning)
+        if x.is_const[0]:
+            return no_value
+        bin_idxs = x.bin_idxs
+        n_bins = x.n_bins
+    else:
+        x = np.asarray(x, dtype=float)
+        if np.all(x == x[0]):
+            return no_value
+
+        # use cubic root of sample number as default
+        if n_bins is None:
+            n_bins = int(np.cbrt(x.shape[0]))
+        bin_idxs = _assign_bins(x[:, np.newaxis], n_bins, binning)
+    y = np.asarray(y, dtype=float)
+    weights = _check_weights(weights, y.shape[0])
 
     # expected values for all options
-    ev = np.mean(y, axis=0)
+    ev = np.average(y, axis=0, weights=weights)
 
     # expected maximum value
     emv = np.max(ev)
 
-    ev_pi = _calc_ev_pi(x, y, n_bins)
+    ev_pi = _ev_pi(bin_idxs, y, n_bins, weights)[0]
     evppi = ev_pi - emv
 
+    if n_bootstrap is not None:
+        interval = bootstrap_intervals(bin_idxs, np.zeros(1, dtype=bool), y,
+                                       n_bins, n_bootstrap, confidence,
+                                       seed, weights=weights)[0]
+        return evppi, tuple(interval)
     return evppi
 
 
-def evpi(y):
+def evpi(y, weights=None):
     """Comparative total EVPI.
     Expected value of making always the best decision. If the model itself is
     deterministic, i.e. the only source of uncertainty are the input variables,
@@ -107,12 +399,15 @@ def evpi(y):
         decision criterion for a risk-neutral decision maker, that chooses
         the option with the highest expected utility. Samples are rows,
         decision options are columns.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
 
     y = np.array(y)
+    weights = _check_weights(weights, y.shape[0])
 
     # expected value
-    ev = np.mean(y, axis=0)
+    ev = np.average(y, axis=0, weights=weights)
 
     # expected maximum value
     emv = np.max(ev)
@@ -121,7 +416,7 @@ def evpi(y):
     y_pi = np.max(y, axis=1)
 
     # expected value given perfect information
-    ev_pi = np.mean(y_pi)
+    ev_pi = np.average(y_pi, weights=weights)
 
     # mean and max are basically swapped
 
@@ -131,15 +426,18 @@ def evpi(y):
     return evpi
 
 
-def multi_evppi(x, y, n_bins=None, significance_threshold=1e-3):
+def multi_evppi(x, y, n_bins=None, significance_threshold=1e-3,
+                binning=None, n_bootstrap=None, confidence=0.95,
+                seed=None, weights=None):
     """Calculate EVPPI for multiple input variables and one output variable.
 
     Parameters
     ----------
-    x : 2D array_like
+    x : 2D array_like or BinnedInputs
         Monte Carlo samples from the probability distribution of the
         considered parameter (aka estimates aka "input" variables). Columns
-        are variables, rows are samples.
+        are variables, rows are samples. `BinnedInputs` bring their own bin
+        number and binning, so only `y` is reduced.
     y : 2D array_like
         The respective utility (aka outcome) samples calculated using the
         estimate samples of x. This criterion is considered to be the (only)
@@ -151,92 +449,379 @@ def multi_evppi(x, y, n_bins=None, significance_threshold=1e-3):
     significance_threshold : float
         Percentage of the total EVPI, below which EVPI values will be set to
         zero, since really small positive values are mostly numerical
-        artifacts.
+        artifacts. S. `calibrated_multi_evppi` for a calibrated alternative.
+    binning : {"uniform", "quantile"}
+        "uniform" uses equally wide bins between the minimum and maximum of
+        each variable. "quantile" uses bins with the same number of samples,
+        which resolves skewed or heavy-tailed inputs (e.g. lognormal costs)
+        much better. Defaults to the binning of `BinnedInputs` and to
+        "uniform" otherwise.
+    n_bootstrap : int
+        Number of bootstrap replicates for confidence intervals. The bins
+        are assigned only once and every replicate reweights the samples of
+        the bin sums (s. `bootstrap_intervals`). No intervals by default.
+    confidence : float
+        Confidence level of the percentile intervals.
+    seed : int
+        Seed of the bootstrap resampling.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
+
+    Returns
+    -------
+    1D array or tuple
+        One EVPPI value per variable, with `n_bootstrap` together with a 2D
+        array of the lower and upper bound (columns) of each variable
+        (rows). The intervals are not subject to the significance threshold.
     """
-    x = np.array(x)
-    y = np.array(y)
+    _check_binning(binning)
+    bin_idxs, is_const, n_bins = _bin_inputs(x, n_bins, binning)
+    y = np.asarray(y, dtype=float)
+    weights = _check_weights(weights, y.shape[0])
 
-    n_variables = x.shape[1]
-    evppi_results = np.zeros(n_variables)
-    evpi_result = evpi(y)
-    for i in range(n_variables):
-        this_evpi = evppi(x[:, i], y, n_bins)
+    # expected maximum value, shared by all variables
+    emv = np.max(np.average(y, axis=0, weights=weights))
+    evpi_result = evpi(y, weights)
+
+    evppi_results = _ev_pi(bin_idxs, y, n_bins, weights) - emv
 
-        # Since this method tends to overestimate EVPIs, that are actually
-        # zero, we want to test, if the EVPI is "significant" (not in the
-        # sense of a statistical test).
-        if this_evpi < evpi_result * significance_threshold:
-            this_evpi = 0
-        evppi_results[i] = this_evpi
+    # if input is deterministic, further information can not have any value
+    evppi_results[is_const] = 0
 
+    # Since this method tends to overestimate EVPIs, that are actually
+    # zero, we want to test, if the EVPI is "significant" (not in the
+    # sense of a statistical test).
+    evppi_results[evppi_results < evpi_result * significance_threshold] = 0
+
+    if n_bootstrap is not None:
+        return evppi_results, bootstrap_intervals(
+            bin_idxs, is_const, y, n_bins, n_bootstrap, confidence, seed,
+            weights=weights)
     return evppi_results
 
 
+def evppi_curve(x, y, n_bins_range, significance_threshold=1e-3,
+                binning="uniform"):
+    """EVPPI for multiple input variables as a function of the bin number.
+    Equivalent to calling `multi_evppi` for every bin number, but each
+    variable is sorted only once. The output sums of any bin are then the
+    difference of two cumulative sums of the sorted output samples, so every
+    additional bin number only costs O(n_bins * n_options) after locating
+    its bin edges by binary search.
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples. A 1D array is considered a single
+        variable.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bins_range : iterable of int
+        Bin numbers to evaluate.
+    significance_threshold : float
+        Percentage of the total EVPI, below which EVPI values will be set to
+        zero, since really small positive values are mostly numerical
+        artifacts.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples. S.
+        `multi_evppi`.
+
+    Returns
+    -------
+    2D array
+        EVPPI for each bin number (rows) and variable (columns). 1D, if `x`
+        is 1D.
+    """
+    _check_binning(binning)
+    x = np.asarray(x, dtype=float)
+    is_single = x.ndim == 1
+    if is_single:
+        x = x[:, np.newaxis]
+    y = np.asarray(y, dtype=float)
+    n_bins_range = np.asarray(list(n_bins_range), dtype=np.intp)
+    if len(n_bins_range) == 0:
+        raise ValueError("At least one bin number is needed.")
+    if np.any(n_bins_range < 1):
+        raise ValueError("The bin numbers must be at least 1, not {}."
+                         .format(n_bins_range.min()))
+
+    n_samples, n_variables = x.shape
+    y_mean = np.mean(y, axis=0)
+    emv = np.max(y_mean)
+    evpi_result = evpi(y)
+
+    # bin `k` of every bin number, concatenated for all bin numbers
+    bin_number_starts = np.concatenate(([0], np.cumsum(n_bins_range)[:-1]))
+    k = np.arange(np.sum(n_bins_range)) - \
+        np.repeat(bin_number_starts, n_bins_range)
+    n_bins_of_k = np.repeat(n_bins_range, n_bins_range)
+    is_first = k == 0
+
+    # Cumulative sums of the centered outputs, so the difference of two large
+    # sums does not cancel out the precision of small bins.
+    y_cumsum = np.zeros((n_samples + 1, y.shape[1]))
+
+    curve = np.zeros((len(n_bins_range), n_variables))
+    for variable_i in range(n_variables):
+        order = np.argsort(x[:, variable_i])
+        x_sorted = x[order, variable_i]
+        # if input is deterministic, further information can not have any
+        # value
+        if x_sorted[0] == x_sorted[-1]:
+            continue
+        np.cumsum(y[order] - y_mean, axis=0, out=y_cumsum[1:])
+
+        # lower edge of every bin as a position in the sorted samples
+        if binning == "quantile":
+            edges = x_sorted[k * n_samples // n_bins_of_k]
+        else:
+            edges = x_sorted[0] + \
+                k * ((x_sorted[-1] - x_sorted[0]) / n_bins_of_k)
+        starts = np.searchsorted(x_sorted, edges, side="left")
+        starts[is_first] = 0
+        stops = np.append(starts[1:], n_samples)
+        stops[np.append(is_first[1:], True)] = n_samples
+
+        counts = stops - starts
+        bin_sums = y_cumsum[stops] - y_cumsum[starts] + \
+            counts[:, np.newaxis] * y_mean
+        bin_max_sums = np.max(bin_sums, axis=1)
+        curve[:, variable_i] = np.add.reduceat(
+            bin_max_sums, bin_number_starts) / n_samples - emv
+
+    # Since this method tends to overestimate EVPIs, that are actually
+    # zero, we want to test, if the EVPI is "significant" (not in the
+    # sense of a statistical test).
+    curve[curve < evpi_result * significance_threshold] = 0
+
+    if is_single:
+        return curve[:, 0]
+    return curve
+
+
+def _default_group_n_bins(n_samples, n_dims):
+    # n^(1/(d+2)) bins per dimension keep the bias and the variance of the
+    # cell means balanced, for a single variable this is the cubic root
+    return max(1, int(n_samples ** (1 / (n_dims + 2)) + 1e-9))
+
+
+def _cell_idxs(bin_idxs, n_bins_per_dim):
+    """Index of the occupied cell of every sample among all occupied cells,
+    so the sums only need memory for cells, that actually contain samples,
+    instead of all `prod(n_bins_per_dim)` cells.
+
+    Returns
+    ------
+    1D array of int
+        Cell index of each sample.
+    int
+        Number of occupied cells.
+    """
+    n_cells_dense = 1
+    for n_bins in n_bins_per_dim:
+        n_cells_dense *= int(n_bins)
+    if n_cells_dense <= np.iinfo(np.int64).max:
+        # mixed-radix key of the bin indices of all dimensions
+        keys = np.zeros(bin_idxs.shape[0], dtype=np.int64)
+        for dim_i, n_bins in enumerate(n_bins_per_dim):
+            keys *= n_bins
+            keys += bin_idxs[:, dim_i]
+        cells, cell_idxs = np.unique(keys, return_inverse=True)
+    else:
+        cells, cell_idxs = np.unique(bin_idxs, axis=0, return_inverse=True)
+    return cell_idxs.reshape(-1), len(cells)
+
+
+def group_evppi(x_group, y, n_bins_per_dim=None, binning="uniform"):
+    """Calculates EVPPI for a group of input variables, i.e. the value of
+    learning all of them at once. Correlated parameters (e.g. all parameters
+    of a treatment-effect model) are usually worth more together than the
+    sum of their single EVPPIs suggests.
+    The variables are binned jointly into a grid of cells, but the output
+    sums are only accumulated for the occupied cells (at most one per
+    sample), so memory and time are proportional to the number of samples
+    instead of `n_bins_per_dim ** n_variables`.
+
+    Parameters
+    ----------
+    x_group : 2D array_like
+        Monte Carlo samples of the variables of the group. Columns are
+        variables, rows are samples. A 1D array is considered a single
+        variable.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bins_per_dim : int or 1D array_like of int
+        Number of bins per variable, either one for all variables or one
+        each. Defaults to `n_samples ** (1 / (n_variables + 2))`, which is
+        the cubic root of the sample number for a single variable.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples per
+        variable. S. `multi_evppi`.
+
+    Returns
+    -------
+    float
+        EVPPI of the group.
+    """
+    _check_binning(binning)
+    x_group = np.asarray(x_group, dtype=float)
+    if x_group.ndim == 1:
+        x_group = x_group[:, np.newaxis]
+    y = np.asarray(y, dtype=float)
+    n_samples, n_dims = x_group.shape
+    if y.shape[0] != n_samples:
+        raise ValueError("Number of samples in x_group and y must match.")
+
+    if n_bins_per_dim is None:
+        n_bins_per_dim = _default_group_n_bins(n_samples, n_dims)
+    n_bins_per_dim = np.broadcast_to(
+        np.asarray(n_bins_per_dim, dtype=np.intp), (n_dims,))
+
+    bin_idxs = np.empty(x_group.shape, dtype=np.intp)
+    for dim_i in range(n_dims):
+        bin_idxs[:, dim_i] = _assign_bins(
+            x_group[:, dim_i, np.newaxis], n_bins_per_dim[dim_i],
+            binning)[:, 0]
+    cell_idxs, n_cells = _cell_idxs(bin_idxs, n_bins_per_dim)
+
+    # if the whole group is deterministic, further information can not have
+    # any value
+    if n_cells == 1:
+        return 0
+
+    emv = np.max(np.mean(y, axis=0))
+    return _ev_pi(cell_idxs[:, np.newaxis], y, n_cells)[0] - emv
+
+
 def _calc_ev_ipi(x, y, std, n_bins):
-    """Loops through the bins of a histogram over the input and returns the
-    highest sum of the respective output samples.
+    """Expected value given imperfect information on each input variable.
+    Imperfect information leaves a normal posterior with standard deviation
+    `std` around a posterior mean, whose distribution (preposterior) is
+    normal with the remaining variance `var(x) - std**2`. For a posterior
+    mean in the center of bin `i`, the probability of the true value lying
+    in bin `j` is the transition matrix `T[i, j]`, evaluated from the normal
+    CDF at all bin edges at once. The decision maker then chooses the option
+    with the highest posterior expected outcome `T[i] @ y_means`.
 
     Parameters
     ----------
-    x : 1D array
-        Input samples.
+    x : 2D array
+        Input samples. Samples are rows, variables are columns.
     y : 2D array
         Output samples.
+    std : 1D array
+        Standard deviations of x after new information.
     n_bins : int
-        Number of non-empty histogram bins.
-    std : float
-        Standard deviation of x after new information.
+        Number of histogram bins.
 
     Returns
     ------
-    int
-        Sum of optimal decision option output for each bin. Can be
-        interpreted as the expected value weighted with the number of
-        samples in the bin.
+    2D array
+        Expected value given imperfect information for each standard
+        deviation (rows) and variable (columns).
+    """
+    n_samples, n_variables = x.shape
+    x_min = np.min(x, axis=0)
+    x_max = np.max(x, axis=0)
+    x_mean = np.mean(x, axis=0)
+    x_std = np.std(x, axis=0)
+
+    bin_idxs = _bin_idxs(x, n_bins)
+    y_sums = _bin_sums(bin_idxs, y, n_bins)
+    bin_population = _bin_sums(bin_idxs, np.ones((n_samples, 1)),
+                               n_bins)[:, :, 0]
+
+    ev_ipi = np.empty((len(std), n_variables))
+    for variable_i in range(n_variables):
+        edges = np.linspace(x_min[variable_i], x_max[variable_i], n_bins + 1)
+        # only non-empty bins have an expected outcome
+        non_empty = bin_population[variable_i] > 0
+        lower = edges[:-1][non_empty]
+        upper = edges[1:][non_empty]
+        centers = (lower + upper) / 2
+        y_means = y_sums[variable_i, non_empty] / \
+            bin_population[variable_i, non_empty, np.newaxis]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # (std, posterior mean bin i, true value bin j)
+            scale = std[:, np.newaxis, np.newaxis]
+            transition = \
+                ndtr((upper - centers[:, np.newaxis]) / scale) - \
+                ndtr((lower - centers[:, np.newaxis]) / scale)
+            transition /= np.sum(transition, axis=2, keepdims=True)
+
+            # (std, posterior mean bin i)
+            outer_std = np.sqrt(np.maximum(x_std[variable_i]**2 - std**2, 0))
+            scale = outer_std[:, np.newaxis]
+            outer_bin_prob = ndtr((upper - x_mean[variable_i]) / scale) - \
+                ndtr((lower - x_mean[variable_i]) / scale)
+            outer_bin_prob /= np.sum(outer_bin_prob, axis=1, keepdims=True)
+
+        # best option given each posterior mean
+        best_outcome = np.max(transition @ y_means, axis=2)
+        ev_ipi[:, variable_i] = np.sum(outer_bin_prob * best_outcome, axis=1)
+    return ev_ipi
+
+
+def multi_evipi(x, y, std, n_bins=None):
+    """Calculates EVIPI for multiple input variables.
+    EVIPI means "Expected Value of Imperfect Parameter Information" and can
+    be described as a measure for what a decision maker would be willing to
+    pay for a given uncertainty on a certain variable. A grid of standard
+    deviations gives the value of information as a function of its
+    precision (similar to EVSI for different sample sizes).
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    std : float or 1D array_like
+        Standard deviation(s) of x after new information. 0 corresponds to
+        perfect information.
+    n_bins : int
+        Number of non-empty bins to use for the histogram. Defaults to 3rd
+        root of sample number.
+
+    Returns
+    -------
+    1D or 2D array
+        One EVIPI value per variable, for a grid of standard deviations one
+        row per standard deviation.
     """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    std_grid = np.atleast_1d(np.asarray(std, dtype=float))
 
-    bin_size = (np.max(x) - np.min(x)) / n_bins
+    n_samples = x.shape[0]
 
-    x_mean = np.mean(x)
-    x_std = np.std(x)
+    # use cubic root of sample number as default
+    if n_bins is None:
+        n_bins = int(np.cbrt(n_samples))
 
-    n_options = y.shape[1]
+    # expected maximum value
+    emv = np.max(np.mean(y, axis=0))
 
-    bin_idxs = ((x-np.min(x))/bin_size).astype(int)
-
-    y_subset_means = np.empty((n_bins, n_options), dtype=float)
-    bin_population = np.empty(n_bins, dtype=int)
-    for i in range(n_bins):
-        mask = bin_idxs == i
-        bin_population[i] = np.sum(mask)
-        # apply this mask on the output
-        y_subset = y[mask, :]
-        # get the mean over the subset
-        if len(y_subset) > 0:
-            y_subset_means[i, :] = np.mean(y_subset, axis=0)
-        else:
-            y_subset_means[i, :] = np.nan
-
-    def get_x_from_bin_i(i):
-        return np.min(x) + i * bin_size
-
-    weighted_sum_outcome = 0
-    for i in range(n_bins):
-        bin_center = get_x_from_bin_i(i+0.5)
-        weighted_sum_outcome_bin = 0
-        for j in range(n_bins):
-            bin_prob = norm.cdf(get_x_from_bin_i(j+1), bin_center, std) - \
-                norm.cdf(get_x_from_bin_i(j), bin_center, std)
-            outcome_bin = np.max(y_subset_means[i, :])
-            if not np.isnan(outcome_bin):
-                weighted_sum_outcome_bin += outcome_bin * bin_prob
-        outer_bin_prob = norm.cdf(get_x_from_bin_i(i+1), x_mean, x_std-std) - \
-            norm.cdf(get_x_from_bin_i(i), x_mean, x_std-std)
-        weighted_sum_outcome += weighted_sum_outcome_bin * outer_bin_prob
+    evipi_results = _calc_ev_ipi(x, y, std_grid, n_bins) - emv
 
-    # now the normalization
-    ev_pi = weighted_sum_outcome
-    return ev_pi
+    # Information, that leaves at least the prior uncertainty, has no value.
+    # This includes deterministic inputs.
+    evipi_results[std_grid[:, np.newaxis] >= np.std(x, axis=0)] = 0
+
+    if np.ndim(std) == 0:
+        return evipi_results[0]
+    return evipi_results
 
 
 def evipi(x, y, std, n_bins=None):
@@ -257,30 +842,20 @@ def evipi(x, y, std, n_bins=None):
         decision criterion for a risk-neutral decision maker, that chooses
         the option with the highest expected utility. Samples are rows,
         decision options are columns.
-    std : float
-        Standard deviation of x after new information.
+    std : float or 1D array_like
+        Standard deviation(s) of x after new information. A grid of values
+        is evaluated in one batch.
     n_bins : int
         Number of non-empty bins to use for the histogram. Defaults to 3rd
         root of sample number.
-    """
-    x = np.array(x)
-    if np.all(x == x[0]):
-        return 0
-    y = np.array(y)
 
-    n_samples = x.shape[0]
-
-    # use cubic root of sample number as default
-    if n_bins is None:
-        n_bins = int(np.cbrt(n_samples))
-
-    # expected values for all options
-    ev = np.mean(y, axis=0)
-
-    # expected maximum value
-    emv = np.max(ev)
-
-    ev_ipi = _calc_ev_ipi(x, y, std, n_bins)
-    evipi = ev_ipi - emv
-
-    return evipi
+    Returns
+    -------
+    float or 1D array
+        EVIPI for each standard deviation.
+    """
+    x = np.asarray(x, dtype=float)
+    evipi_results = multi_evipi(x[:, np.newaxis], y, std, n_bins)
+    if np.ndim(std) == 0:
+        return evipi_results[0]
+    return evipi_results[:, 0]
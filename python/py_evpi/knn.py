@@ -0,0 +1,137 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Default upper limit for the number of (query, neighbor, option) values
+# gathered at once, so a batch of queries stays in the order of 100 MB.
+MAX_BLOCK_SIZE = 2**24
+
+
+def _default_k(n_samples, n_dims):
+    # as many neighbors as samples fall into one cell of `group_evppi`
+    return max(1, int(n_samples ** (2 / (n_dims + 2)) + 1e-9))
+
+
+def _window_cond_ev(x, y, k, query_idxs):
+    """Mean outputs of the `k` nearest neighbors of single variable samples.
+    In one dimension, the neighbors are a window of `k` consecutive sorted
+    samples. Its start is the first one, whose right end is at least as far
+    away as its left end, which is found by binary search, so no tree is
+    needed and the means are differences of cumulative sums.
+    """
+    n_samples = len(x)
+    order = np.argsort(x)
+    x_sorted = x[order]
+    # cumulative sums of the centered outputs, so the difference of two
+    # large sums does not cancel out the precision of the window means
+    y_mean = np.mean(y, axis=0)
+    y_cumsum = np.zeros((n_samples + 1, y.shape[1]))
+    np.cumsum(y[order] - y_mean, axis=0, out=y_cumsum[1:])
+
+    ranks = np.empty(n_samples, dtype=np.intp)
+    ranks[order] = np.arange(n_samples)
+    x_query = x_sorted[ranks[query_idxs]]
+    window_centers = x_sorted[:n_samples - k + 1] + x_sorted[k - 1:]
+    starts = np.searchsorted(window_centers, 2 * x_query)
+    starts = np.minimum(starts, n_samples - k)
+    # the window one to the left might be closer, if the ends are not
+    # equally far away
+    previous = np.maximum(starts - 1, 0)
+    is_closer = np.maximum(x_query - x_sorted[previous],
+                           x_sorted[previous + k - 1] - x_query) < \
+        np.maximum(x_query - x_sorted[starts],
+                   x_sorted[starts + k - 1] - x_query)
+    starts[is_closer] = previous[is_closer]
+    return (y_cumsum[starts + k] - y_cumsum[starts]) / k + y_mean
+
+
+def knn_evppi(x_group, y, k=None, eps=0, n_queries=None, n_threads=None,
+              max_block_size=MAX_BLOCK_SIZE):
+    """Calculates EVPPI for one input variable or a group of them from the k
+    nearest neighbors of every sample.
+    The conditional expected value of each decision option given the
+    variables of a sample is estimated by the mean of the outputs of its `k`
+    nearest neighbors in the standardized input space, which are found with
+    a k-d tree queried in batches by multiple threads. Unlike binning (s.
+    `group_evppi`), this does not need a grid and still works for groups of
+    more than three variables. For a single variable, the neighbors are
+    found by sorting instead.
+
+    Parameters
+    ----------
+    x_group : 1D or 2D array_like
+        Monte Carlo samples of the considered variables. Columns are
+        variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    k : int
+        Number of neighbors including the sample itself. Defaults to
+        `n_samples ** (2 / (n_variables + 2))`, the expected number of
+        samples in one cell of `group_evppi`.
+    eps : float
+        Relative error of the neighbor distances, that is tolerated by
+        approximate queries of the tree.
+    n_queries : int
+        Number of samples, at which the conditional expected values are
+        estimated (evenly spread over all samples). All samples are still
+        used as neighbors. Defaults to all samples, for more than a million
+        samples a subset (together with `eps` > 0) is much faster.
+    n_threads : int
+        Number of threads querying the tree. Defaults to all available
+        cores.
+    max_block_size : int
+        Upper limit for the number of gathered values per batch of queries.
+
+    Returns
+    -------
+    float
+        EVPPI of the variable or the group.
+    """
+    x_group = np.asarray(x_group, dtype=float)
+    if x_group.ndim == 1:
+        x_group = x_group[:, np.newaxis]
+    y = np.asarray(y, dtype=float)
+    n_samples, n_dims = x_group.shape
+    n_options = y.shape[1]
+    if y.shape[0] != n_samples:
+        raise ValueError("Number of samples in x_group and y must match.")
+
+    # standardize, so every variable counts equally in the distances, and
+    # drop deterministic variables
+    x_std = np.std(x_group, axis=0)
+    is_const = x_std == 0
+    # if input is deterministic, further information can not have any value
+    if np.all(is_const):
+        return 0
+    x_group = x_group[:, ~is_const]
+    x_group = (x_group - np.mean(x_group, axis=0)) / x_std[~is_const]
+
+    if k is None:
+        k = _default_k(n_samples, x_group.shape[1])
+    k = min(k, n_samples)
+    if n_queries is None or n_queries >= n_samples:
+        query_idxs = np.arange(n_samples)
+    else:
+        query_idxs = np.unique(
+            np.linspace(0, n_samples - 1, n_queries).astype(np.intp))
+    emv = np.max(np.mean(y, axis=0))
+
+    if x_group.shape[1] == 1:
+        cond_ev = _window_cond_ev(x_group[:, 0], y, k, query_idxs)
+        return np.mean(np.max(cond_ev, axis=1)) - emv
+
+    tree = cKDTree(x_group)
+    workers = -1 if n_threads is None else n_threads
+    batch_size = max(1, max_block_size // (k * n_options))
+    sum_res = 0
+    for start in range(0, len(query_idxs), batch_size):
+        _, neighbors = tree.query(
+            x_group[query_idxs[start:start + batch_size]], k, eps=eps,
+            workers=workers)
+        if k == 1:
+            neighbors = neighbors[:, np.newaxis]
+        # conditional expected value of every option, the best one is taken
+        cond_ev = np.mean(y[neighbors], axis=1)
+        sum_res += np.sum(np.max(cond_ev, axis=1))
+    return sum_res / len(query_idxs) - emv
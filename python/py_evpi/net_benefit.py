@@ -0,0 +1,174 @@
+import numpy as np
+
+from .evpi import _bin_inputs, _bin_sums, _check_binning
+
+# Upper limit for the number of (sample, option) pairs processed at once by
+# `net_benefit_evpi`.
+MAX_BLOCK_SIZE = 2**22
+
+
+def _as_effects_costs(effects, costs):
+    effects = np.asarray(effects, dtype=float)
+    costs = np.asarray(costs, dtype=float)
+    if effects.shape != costs.shape:
+        raise ValueError("Effects and costs must have the same shape.")
+    return effects, costs
+
+
+def net_benefit_evpi(effects, costs, wtp):
+    """Total EVPI of the net benefit `wtp * effects - costs` for every
+    willingness to pay. S. `evpi`.
+    The best option of a sample only changes where its net benefit line is
+    overtaken by one with a steeper slope (more effect), i.e. at most
+    `n_options - 1` times. Instead of evaluating every willingness to pay,
+    these switching points are found for all samples at once and the
+    effects and costs of the best options are summed up for the grid
+    intervals in between. The cost is O(n_samples * n_options**2),
+    independent of the grid size.
+
+    Parameters
+    ----------
+    effects : 2D array_like
+        Monte Carlo samples of the effects (e.g. QALYs) of each decision
+        option. Samples are rows, decision options are columns.
+    costs : 2D array_like
+        The respective costs, same shape as `effects`.
+    wtp : 1D array_like
+        Willingness to pay per unit of effect (lambda).
+
+    Returns
+    -------
+    1D array
+        One EVPI value per willingness to pay.
+    """
+    effects, costs = _as_effects_costs(effects, costs)
+    wtp = np.asarray(wtp, dtype=float)
+    n_samples, n_options = effects.shape
+    order = np.argsort(wtp)
+    grid = wtp[order]
+    n_grid = len(grid)
+
+    # Sums of the effects and costs of the best options as difference
+    # arrays over the sorted grid, i.e. a sample, whose best option is `j`
+    # for grid points `start` up to (excluding) `stop`, adds its effect and
+    # cost to `start` and subtracts it at `stop`.
+    effect_diff = np.zeros(n_grid + 1)
+    cost_diff = np.zeros(n_grid + 1)
+
+    block_size = max(1, MAX_BLOCK_SIZE // n_options)
+    for block_start in range(0, n_samples, block_size):
+        e = effects[block_start:block_start + block_size]
+        c = costs[block_start:block_start + block_size]
+        best = np.argmax(grid[0] * e - c, axis=1)
+        start = np.zeros(e.shape[0], dtype=np.intp)
+        for _ in range(n_options):
+            rows = np.arange(e.shape[0])
+            e_best = e[rows, best]
+            c_best = c[rows, best]
+
+            # willingness to pay, above which a steeper option is better
+            slope = e - e_best[:, np.newaxis]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossing = np.where(slope > 0,
+                                    (c - c_best[:, np.newaxis]) / slope,
+                                    np.inf)
+            next_best = np.argmin(crossing, axis=1)
+            stop = np.searchsorted(grid, crossing[rows, next_best])
+
+            effect_diff += np.bincount(start, e_best, n_grid + 1) - \
+                np.bincount(stop, e_best, n_grid + 1)
+            cost_diff += np.bincount(start, c_best, n_grid + 1) - \
+                np.bincount(stop, c_best, n_grid + 1)
+
+            # only samples switching within the grid go on
+            switching = stop < n_grid
+            if not np.any(switching):
+                break
+            e = e[switching]
+            c = c[switching]
+            best = next_best[switching]
+            start = stop[switching]
+
+    # expected value given perfect information
+    ev_pi = np.empty(n_grid)
+    ev_pi[order] = (grid * np.cumsum(effect_diff[:-1]) -
+                    np.cumsum(cost_diff[:-1])) / n_samples
+
+    # expected maximum value
+    emv = np.max(np.outer(wtp, np.mean(effects, axis=0)) -
+                 np.mean(costs, axis=0), axis=1)
+
+    return ev_pi - emv
+
+
+def net_benefit_multi_evppi(x, effects, costs, wtp, n_bins=None,
+                            significance_threshold=1e-3, binning=None):
+    """EVPPI of multiple input variables for the net benefit
+    `wtp * effects - costs` at every willingness to pay. S. `multi_evppi`.
+    Since the net benefit is linear in the willingness to pay, so are its
+    bin sums. The inputs are binned and the effects and costs reduced only
+    once, afterwards each willingness to pay only costs
+    O(n_variables * n_bins * n_options) instead of a pass over all samples.
+
+    Parameters
+    ----------
+    x : 2D array_like or BinnedInputs
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    effects : 2D array_like
+        The respective effects (e.g. QALYs) of each decision option. Samples
+        are rows, decision options are columns.
+    costs : 2D array_like
+        The respective costs, same shape as `effects`.
+    wtp : 1D array_like
+        Willingness to pay per unit of effect (lambda).
+    n_bins : int
+        Number of non-empty bins to use for the histogram. Defaults to 3rd
+        root of sample number.
+    significance_threshold : float
+        Percentage of the total EVPI at the same willingness to pay, below
+        which EVPI values will be set to zero, since really small positive
+        values are mostly numerical artifacts.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples. S.
+        `multi_evppi`. Defaults to the binning of `BinnedInputs` and to
+        "uniform" otherwise.
+
+    Returns
+    -------
+    2D array
+        EVPPI for each willingness to pay (rows) and variable (columns).
+    """
+    _check_binning(binning)
+    effects, costs = _as_effects_costs(effects, costs)
+    wtp = np.asarray(wtp, dtype=float)
+    bin_idxs, is_const, n_bins = _bin_inputs(x, n_bins, binning)
+    n_samples = effects.shape[0]
+    if bin_idxs.shape[0] != n_samples:
+        raise ValueError("Number of samples in x and y must match.")
+
+    # sums per variable, bin and decision option
+    effect_sums = _bin_sums(bin_idxs, effects, n_bins)
+    cost_sums = _bin_sums(bin_idxs, costs, n_bins)
+
+    # expected maximum value, every bin row sums up to the option totals
+    emv = np.max(np.outer(wtp, np.sum(effect_sums[0], axis=0)) -
+                 np.sum(cost_sums[0], axis=0), axis=1) / n_samples
+
+    evppi_results = np.empty((len(wtp), bin_idxs.shape[1]))
+    for wtp_i, wtp_value in enumerate(wtp):
+        net_benefit_sums = wtp_value * effect_sums - cost_sums
+        evppi_results[wtp_i] = np.sum(np.max(net_benefit_sums, axis=2),
+                                      axis=1) / n_samples - emv[wtp_i]
+
+    # if input is deterministic, further information can not have any value
+    evppi_results[:, is_const] = 0
+
+    # Since this method tends to overestimate EVPIs, that are actually
+    # zero, we want to test, if the EVPI is "significant" (not in the
+    # sense of a statistical test).
+    evpi_results = net_benefit_evpi(effects, costs, wtp)
+    evppi_results[evppi_results <
+                  evpi_results[:, np.newaxis] * significance_threshold] = 0
+    return evppi_results
@@ -0,0 +1,137 @@
+import mmap
+import os
+
+import numpy as np
+
+from .accumulator import EVPPIAccumulator
+
+# Default upper limit for the memory used by the temporary arrays of one chunk
+# in bytes.
+DEFAULT_MEMORY_BUDGET = 2**28
+
+# Rough number of bytes needed per (sample, variable) pair while binning:
+# the input value itself, its scaled copy, the bin index, the bin key and
+# the broadcast output weight.
+_BYTES_PER_ELEMENT = 40
+
+
+def open_samples(path, n_columns=None, dtype=np.float64):
+    """Memory-maps Monte Carlo samples stored on disk without reading them.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Either a `.npy` file or a raw binary file, that contains the samples
+        column by column (Fortran order), i.e. all samples of the first
+        variable, then all samples of the second one, and so on.
+    n_columns : int
+        Number of variables or decision options stored in a raw binary file.
+        Ignored for `.npy` files.
+    dtype : data-type
+        Data type of a raw binary file.
+
+    Returns
+    -------
+    np.memmap
+        Read-only 2D array, samples are rows.
+    """
+    path = os.fspath(path)
+    if path.endswith(".npy"):
+        samples = np.load(path, mmap_mode="r")
+    else:
+        if n_columns is None:
+            raise ValueError("The number of columns of a raw binary file "
+                             "must be given.")
+        n_values = os.path.getsize(path) // np.dtype(dtype).itemsize
+        samples = np.memmap(path, dtype=dtype, mode="r", order="F",
+                            shape=(n_values // n_columns, n_columns))
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    _advise_sequential(samples)
+    return samples
+
+
+def _advise_sequential(samples):
+    # tell the kernel to read ahead aggressively, since every pass goes
+    # through the file from the beginning to the end
+    samples_mmap = getattr(samples, "_mmap", None)
+    if samples_mmap is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+        samples_mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+
+def _as_samples(a, n_columns):
+    if isinstance(a, (str, os.PathLike)):
+        return open_samples(a, n_columns)
+    if not isinstance(a, np.ndarray):
+        a = np.asarray(a, dtype=float)
+    if a.ndim == 1:
+        a = a[:, np.newaxis]
+    return a
+
+
+def out_of_core_multi_evppi(x, y, n_bins=None, significance_threshold=1e-3,
+                            memory_budget=DEFAULT_MEMORY_BUDGET,
+                            n_variables=None, n_options=None):
+    """Calculate EVPPI for multiple input variables, that do not fit into
+    memory. S. `multi_evppi`.
+    The samples are processed in chunks of rows in two passes, one for the
+    range of each variable and one for the bin sums, so at most
+    `memory_budget` bytes of temporary memory are used in addition to the
+    (constant) bin sums. Memory-mapped inputs are read sequentially from
+    disk and never loaded as a whole.
+
+    Parameters
+    ----------
+    x : 2D array_like, np.memmap, str or os.PathLike
+        Monte Carlo samples of the input variables. Columns are variables,
+        rows are samples. Paths are opened with `open_samples`.
+    y : 2D array_like, np.memmap, str or os.PathLike
+        The respective utility (aka outcome) samples. Samples are rows,
+        decision options are columns. Paths are opened with `open_samples`.
+    n_bins : int
+        Number of non-empty bins to use for the histogram. Defaults to 3rd
+        root of sample number.
+    significance_threshold : float
+        Percentage of the total EVPI, below which EVPI values will be set to
+        zero, since really small positive values are mostly numerical
+        artifacts.
+    memory_budget : int
+        Upper limit for the temporary memory of one chunk in bytes.
+    n_variables : int
+        Number of variables in a raw binary file `x`.
+    n_options : int
+        Number of decision options in a raw binary file `y`.
+
+    Returns
+    -------
+    1D array
+        One EVPPI value per variable.
+    """
+    x = _as_samples(x, n_variables)
+    y = _as_samples(y, n_options)
+    if x.shape[0] != y.shape[0]:
+        raise ValueError("Number of samples in x and y must match.")
+
+    n_samples = x.shape[0]
+    if n_bins is None:
+        n_bins = int(np.cbrt(n_samples))
+
+    bytes_per_sample = _BYTES_PER_ELEMENT * x.shape[1] + \
+        2 * y.dtype.itemsize * y.shape[1]
+    chunk_size = max(1, memory_budget // bytes_per_sample)
+
+    # first pass: range of every variable
+    x_min = np.full(x.shape[1], np.inf)
+    x_max = np.full(x.shape[1], -np.inf)
+    for start in range(0, n_samples, chunk_size):
+        x_chunk = np.asarray(x[start:start + chunk_size], dtype=float)
+        np.minimum(x_min, np.min(x_chunk, axis=0), out=x_min)
+        np.maximum(x_max, np.max(x_chunk, axis=0), out=x_max)
+
+    # second pass: output sums per bin
+    acc = EVPPIAccumulator(n_bins, x_min, x_max)
+    for start in range(0, n_samples, chunk_size):
+        acc.partial_fit(x[start:start + chunk_size],
+                        y[start:start + chunk_size])
+
+    return acc.result(significance_threshold)
@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .evpi import BinnedInputs, _bin_dtype, _bin_inputs, _check_binning, \
+    _default_group_n_bins, _ev_pi
+
+# Default upper limit for the temporary memory of all pairs processed at the
+# same time in bytes.
+DEFAULT_MEMORY_BUDGET = 2**28
+
+# Rough number of bytes needed per (sample, pair) while reducing a block of
+# pairs: the joint bin index, its offset key and the broadcast output weight.
+_BYTES_PER_ELEMENT = 24
+
+
+def _pair_ev_pi(bin_idxs, y, n_bins, variable_i, start, stop):
+    # the bins of a pair are the `n_bins**2` cells of the grid of the two
+    # variables, so a block of pairs is reduced like a block of variables
+    cell_idxs = bin_idxs[:, variable_i, np.newaxis].astype(np.intp) * n_bins
+    cell_idxs = cell_idxs + bin_idxs[:, start:stop]
+    return _ev_pi(cell_idxs, y, n_bins * n_bins)
+
+
+def pairwise_evppi(x, y, n_bins=None, binning=None, n_threads=None,
+                   memory_budget=DEFAULT_MEMORY_BUDGET):
+    """EVPPI of every pair of input variables (s. `group_evppi`) and its
+    excess over the EVPPIs of both variables alone, which indicates an
+    interaction of the two for the decision.
+    Every variable is binned only once and its compact bin indices are
+    reused for all of its pairs. The pairs are split into blocks, whose
+    temporary memory stays within `memory_budget`, and the blocks are
+    processed by a pool of threads, since the reductions of numpy release
+    the GIL.
+
+    Parameters
+    ----------
+    x : 2D array_like or BinnedInputs
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples. `BinnedInputs` bring their own bin
+        number and binning.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bins : int
+        Number of bins per variable. Defaults to 4th root of the sample
+        number, so a pair has as many cells as a single variable of
+        `multi_evppi` has bins squared.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples. S.
+        `multi_evppi`. Defaults to the binning of `BinnedInputs` and to
+        "uniform" otherwise.
+    n_threads : int
+        Number of threads. Defaults to the number of CPUs.
+    memory_budget : int
+        Upper limit for the temporary memory of all threads in bytes.
+
+    Returns
+    -------
+    pair_evppi : 2D array
+        Symmetric matrix of the EVPPI of each pair of variables. The
+        diagonal holds the EVPPI of the single variables with the same bins.
+        No significance threshold is applied, so the excess is not distorted
+        by single values set to zero.
+    excess : 2D array
+        `pair_evppi[i, j] - pair_evppi[i, i] - pair_evppi[j, j]`, zero on the
+        diagonal.
+    """
+    _check_binning(binning)
+    if n_bins is None and not isinstance(x, BinnedInputs):
+        n_bins = _default_group_n_bins(np.shape(x)[0], 2)
+    bin_idxs, is_const, n_bins = _bin_inputs(x, n_bins, binning)
+    # column by column, so every pair reads two contiguous columns
+    bin_idxs = np.asfortranarray(bin_idxs, dtype=_bin_dtype(n_bins))
+    y = np.asarray(y, dtype=float)
+    n_samples, n_variables = bin_idxs.shape
+    if y.shape[0] != n_samples:
+        raise ValueError("Number of samples in x and y must match.")
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+
+    emv = np.max(np.mean(y, axis=0))
+    single_evppi = _ev_pi(bin_idxs, y, n_bins) - emv
+    # if input is deterministic, further information can not have any value
+    single_evppi[is_const] = 0
+
+    block_size = max(1, memory_budget //
+                     (n_threads * n_samples * _BYTES_PER_ELEMENT))
+    blocks = [(variable_i, start, min(start + block_size, n_variables))
+              for variable_i in range(n_variables)
+              for start in range(variable_i + 1, n_variables, block_size)]
+
+    pair_evppi = np.diag(single_evppi)
+    with ThreadPoolExecutor(n_threads) as executor:
+        results = executor.map(
+            lambda block: _pair_ev_pi(bin_idxs, y, n_bins, *block), blocks)
+        for (variable_i, start, stop), ev_pi in zip(blocks, results):
+            pair_evppi[variable_i, start:stop] = ev_pi - emv
+    pair_evppi = np.triu(pair_evppi) + np.triu(pair_evppi, 1).T
+
+    excess = pair_evppi - single_evppi[:, np.newaxis] - single_evppi
+    np.fill_diagonal(excess, 0)
+    return pair_evppi, excess
@@ -0,0 +1,235 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .binary_evpi import _binary_histogram
+from .evpi import _bin_inputs, _check_binning, _ev_pi
+
+# Default number of permutations of the null distributions.
+DEFAULT_N_PERMUTATIONS = 100
+
+
+def _bin_counts(bin_idxs, n_bins):
+    # column by column, so no offset keys of all variables are needed
+    return np.stack([np.bincount(bin_idxs[:, i], minlength=n_bins)
+                     for i in range(bin_idxs.shape[1])])
+
+
+def _permuted_ev_pi(ends, differences, seed):
+    """Sum of the highest output sums of all bins relative to the first
+    decision option, after the outputs have been shuffled relative to the
+    inputs.
+    Shuffling the bin labels keeps the number of samples per bin, so the
+    samples of the bins are consecutive segments of one permutation of the
+    outputs, and their sums are differences of its cumulative sums at the
+    bin ends. One permutation serves all variables.
+    """
+    n_samples = differences.shape[1]
+    permuted = differences[:, np.random.default_rng(seed).permutation(
+        n_samples)]
+    # centered outputs, so the difference of two large sums does not cancel
+    # out the precision of small bins
+    means = np.mean(differences, axis=1)
+    permuted -= means[:, np.newaxis]
+    y_cumsum = np.zeros((len(differences), n_samples + 1))
+    np.cumsum(permuted, axis=1, out=y_cumsum[:, 1:])
+
+    counts = np.diff(ends, axis=1, prepend=0)
+    y_sums = y_cumsum[:, ends] - y_cumsum[:, ends - counts] + \
+        counts * means[:, np.newaxis, np.newaxis]
+    # the first option has the relative sum zero, empty bins have zero sums
+    # anyway, so they do not add anything
+    return np.sum(np.maximum(np.max(y_sums, axis=0), 0), axis=1)
+
+
+def permutation_null(counts, y, n_permutations=DEFAULT_N_PERMUTATIONS,
+                     seed=None, n_threads=None):
+    """Null distribution of the EVPPI of every variable, i.e. its values for
+    inputs without any information on the outputs.
+    The binning estimator is biased upwards, since the bin means fit some
+    of the noise of the outputs. Shuffling the bin labels relative to the
+    outputs destroys any real dependence, but keeps the number of samples
+    per bin, which is all the bias depends on. Only the bin counts are
+    needed and each permutation costs one shuffle and cumulative sum of the
+    output differences between the options for all variables together (s.
+    `_permuted_ev_pi`). The
+    permutations are shared by a pool of threads, each with its own seed
+    derived from `seed`, so the result does not depend on the number of
+    threads.
+
+    Parameters
+    ----------
+    counts : 2D array of int
+        Number of samples in each bin (columns) of each variable (rows).
+    y : 2D array
+        Output samples. Samples are rows, decision options are columns.
+    n_permutations : int
+        Number of permutations.
+    seed : int or np.random.SeedSequence
+        Seed of the permutations.
+    n_threads : int
+        Number of threads. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    2D array
+        EVPPI of each variable (columns) for each permutation (rows).
+    """
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+    ends = np.cumsum(counts, axis=1)
+    if np.any(ends[:, -1] != y.shape[0]):
+        raise ValueError("The bin counts must add up to the sample number.")
+    n_samples, n_options = y.shape
+    if n_options == 1:
+        # there is nothing to decide, so no information can have any value
+        return np.zeros((n_permutations, len(counts)))
+    emv = np.max(np.mean(y, axis=0))
+    # only the differences to the first option are permuted, the sum of the
+    # first option is the same in every bin partition
+    differences = np.ascontiguousarray((y[:, 1:] - y[:, :1]).T)
+    first_sum = np.sum(y[:, 0])
+    seeds = np.random.SeedSequence(seed).spawn(n_permutations)
+    with ThreadPoolExecutor(n_threads) as executor:
+        ev_pi = np.stack(list(executor.map(
+            lambda permutation_seed: _permuted_ev_pi(ends, differences,
+                                                     permutation_seed),
+            seeds)))
+    return (first_sum + ev_pi) / n_samples - emv
+
+
+def _calibrate(evppi_results, null):
+    # the mean null EVPPI is the bias, the p-value counts the permutations,
+    # that are at least as large as the observed value (including itself)
+    bias_corrected = np.maximum(evppi_results - np.mean(null, axis=0), 0)
+    p_values = (1 + np.sum(null >= evppi_results, axis=0)) / \
+        (1 + null.shape[0])
+    return bias_corrected, p_values
+
+
+def calibrated_multi_evppi(x, y, n_bins=None, binning=None,
+                           n_permutations=DEFAULT_N_PERMUTATIONS, seed=None,
+                           n_threads=None):
+    """EVPPI of multiple input variables (s. `multi_evppi`) calibrated by its
+    null distribution instead of a fixed significance threshold.
+    The mean EVPPI of inputs shuffled relative to the outputs (s.
+    `permutation_null`) is the bias of the estimator, which is subtracted.
+    The share of permutations reaching the observed EVPPI is its p-value
+    for the hypothesis, that the variable has no value of information.
+
+    Parameters
+    ----------
+    x : 2D array_like or BinnedInputs
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bins : int
+        Number of histogram bins. Defaults to 3rd root of sample number.
+    binning : {"uniform", "quantile"}
+        Equally wide bins or bins with the same number of samples. S.
+        `multi_evppi`. Defaults to the binning of `BinnedInputs` and to
+        "uniform" otherwise.
+    n_permutations : int
+        Number of permutations of the null distribution. The smallest
+        possible p-value is `1 / (n_permutations + 1)`.
+    seed : int
+        Seed of the permutations.
+    n_threads : int
+        Number of threads. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    evppi : 1D array
+        Bias-corrected EVPPI of each variable, not below zero.
+    p_values : 1D array
+        Permutation p-value of each variable, 1 for deterministic ones.
+    """
+    _check_binning(binning)
+    bin_idxs, is_const, n_bins = _bin_inputs(x, n_bins, binning)
+    y = np.asarray(y, dtype=float)
+    if y.shape[0] != bin_idxs.shape[0]:
+        raise ValueError("Number of samples in x and y must match.")
+    n_variables = bin_idxs.shape[1]
+    if y.shape[1] == 1:
+        # there is nothing to decide, so no information can have any value
+        return np.zeros(n_variables), np.ones(n_variables)
+    emv = np.max(np.mean(y, axis=0))
+
+    evppi_results = _ev_pi(bin_idxs, y, n_bins) - emv
+
+    null = permutation_null(_bin_counts(bin_idxs, n_bins), y,
+                            n_permutations, seed, n_threads)
+    bias_corrected, p_values = _calibrate(evppi_results, null)
+    # if input is deterministic, further information can not have any value
+    bias_corrected[is_const] = 0
+    p_values[is_const] = 1
+    return bias_corrected, p_values
+
+
+def calibrated_binary_multi_evppi(x, y, n_bins=None,
+                                  n_permutations=DEFAULT_N_PERMUTATIONS,
+                                  seed=None, n_threads=None):
+    """EVPPI of multiple input variables for a binary decision (s.
+    `binary_multi_evppi`) calibrated by its null distribution instead of a
+    fixed significance threshold. S. `calibrated_multi_evppi`.
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered estimates or "input" variables. Columns are variables,
+        rows are samples.
+    y : 1D array_like
+        The respective utility (aka outcome) samples. A positive expected
+        value leads to `yes` and a negative one to `no`.
+    n_bins : int
+        Number of non-empty bins to use for the histogram. Defaults to 3rd
+        root of sample number.
+    n_permutations : int
+        Number of permutations of the null distribution.
+    seed : int
+        Seed of the permutations.
+    n_threads : int
+        Number of threads. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    evppi : 1D array
+        Bias-corrected EVPPI of each variable, not below zero.
+    p_values : 1D array
+        Permutation p-value of each variable, 1 for deterministic ones.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_samples, n_variables = x.shape
+    if n_bins is None:
+        n_bins = int(np.cbrt(n_samples))
+    # the outputs of "no" are zero
+    y_options = np.column_stack((y, np.zeros(n_samples)))
+    emv = max(0, np.mean(y))
+
+    is_const = np.all(x == x[0], axis=0)
+    histograms = [_binary_histogram(x[:, i], n_bins)
+                  for i in range(n_variables)]
+    # the variables have different bin numbers, the empty bins of the
+    # padding do not change anything
+    counts = np.zeros((n_variables, max(len(hist) for hist, _ in histograms)),
+                      dtype=np.intp)
+    evppi_results = np.zeros(n_variables)
+    for i, (hist, bin_idxs) in enumerate(histograms):
+        counts[i, :len(hist)] = hist
+        bin_sums = np.bincount(bin_idxs, weights=y, minlength=len(hist))
+        evppi_results[i] = np.sum(np.maximum(bin_sums, 0)) / n_samples - emv
+
+    null = permutation_null(counts, y_options, n_permutations, seed,
+                            n_threads)
+    bias_corrected, p_values = _calibrate(evppi_results, null)
+    # if input is deterministic, further information can not have any value
+    bias_corrected[is_const] = 0
+    p_values[is_const] = 1
+    return bias_corrected, p_values
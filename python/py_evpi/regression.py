@@ -0,0 +1,187 @@
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+from .evpi import evpi
+
+# Default number of samples, whose basis functions are evaluated at once.
+DEFAULT_CHUNK_SIZE = 2**16
+
+# Candidate penalties of the generalized cross-validation, relative to the
+# ratio of the traces of the Gram matrix and the penalty matrix.
+PENALTY_GRID = np.logspace(-6, 3, 28)
+
+
+def _basis(x, x_min, x_max, n_segments):
+    # positions in units of the knot distance, clipped to the fitted range
+    scale = n_segments / (x_max - x_min) if x_max > x_min else 0
+    t = np.clip((x - x_min) * scale, 0, n_segments)
+    segment = np.minimum(t.astype(np.intp), n_segments - 1)
+    u = t - segment
+    u2 = u * u
+    u3 = u2 * u
+    weights = np.stack(((1 - 3 * u + 3 * u2 - u3) / 6,
+                        (4 - 6 * u2 + 3 * u3) / 6,
+                        (1 + 3 * u + 3 * u2 - 3 * u3) / 6,
+                        u3 / 6))
+    return segment, weights
+
+
+def _difference_penalty(n_splines):
+    # second order differences of neighboring coefficients, which leave
+    # constant and linear fits unpenalized
+    d = np.diff(np.eye(n_splines), n=2, axis=0)
+    return d.T @ d
+
+
+def _solve(gram, moments, penalty_matrix, penalty):
+    factor = cho_factor(gram + penalty * penalty_matrix)
+    return factor, cho_solve(factor, moments)
+
+
+def _fit(gram, moments, y_squares, n_samples, penalty_matrix, penalty):
+    """Coefficients of the penalized least squares fit of all decision
+    options, with the penalty chosen by generalized cross-validation, if
+    `penalty` is None. Only the normal equations are needed: the residual
+    sum of squares is `y'y - 2 c'B'y + c'B'Bc` and the effective degrees of
+    freedom are `tr((B'B + lambda P)^-1 B'B)`.
+    """
+    scale = np.trace(gram) / np.trace(penalty_matrix)
+    if penalty is not None:
+        return _solve(gram, moments, penalty_matrix, penalty * scale)[1]
+
+    best_score = np.inf
+    best_coefs = None
+    for candidate in PENALTY_GRID * scale:
+        try:
+            factor, coefs = _solve(gram, moments, penalty_matrix, candidate)
+        except np.linalg.LinAlgError:
+            continue
+        rss = np.sum(y_squares - 2 * np.sum(coefs * moments, axis=0) +
+                     np.sum(coefs * (gram @ coefs), axis=0))
+        dof = np.trace(cho_solve(factor, gram))
+        score = n_samples * rss / (n_samples - dof)**2
+        if score < best_score:
+            best_score = score
+            best_coefs = coefs
+    return best_coefs
+
+
+def regression_evppi(x, y, n_splines=20, penalty=None,
+                     significance_threshold=1e-3,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    """Calculates EVPPI for one or multiple input variables by nonparametric
+    regression of the outputs on each variable (Strong & Oakley 2013).
+    The conditional expectation of every decision option is a penalized
+    cubic spline (P-spline) of the variable. Since every sample has only four
+    non-zero B-spline values, the normal equations are accumulated with
+    bincounts chunk by chunk, so the design matrix is never built. All
+    decision options share the design of a variable, so it is factorized
+    once and solved for all options as multiple right-hand sides. The
+    smoothness is chosen by generalized cross-validation from the normal
+    equations alone.
+
+    Parameters
+    ----------
+    x : 1D or 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_splines : int
+        Number of cubic B-splines per variable (at least 4).
+    penalty : float
+        Fixed smoothing penalty relative to the scale of the data. Defaults
+        to the choice of generalized cross-validation.
+    significance_threshold : float
+        Percentage of the total EVPI, below which EVPI values will be set to
+        zero, since really small positive values are mostly numerical
+        artifacts.
+    chunk_size : int
+        Number of samples processed at once, which bounds the temporary
+        memory.
+
+    Returns
+    -------
+    float or 1D array
+        EVPPI of each variable, a float for 1D `x`.
+    """
+    if n_splines < 4:
+        raise ValueError("At least 4 splines are needed for cubic splines.")
+    x = np.asarray(x, dtype=float)
+    is_single = x.ndim == 1
+    if is_single:
+        x = x[:, np.newaxis]
+    y = np.asarray(y, dtype=float)
+    n_samples, n_variables = x.shape
+    n_options = y.shape[1]
+    if y.shape[0] != n_samples:
+        raise ValueError("Number of samples in x and y must match.")
+
+    # centered outputs, so the residual sums of squares do not cancel out
+    y_mean = np.mean(y, axis=0)
+    emv = np.max(y_mean)
+    n_segments = n_splines - 3
+    x_min = np.min(x, axis=0)
+    x_max = np.max(x, axis=0)
+
+    # normal equations of all variables, accumulated chunk by chunk
+    gram = np.zeros((n_variables, n_splines * n_splines))
+    moments = np.zeros((n_variables, n_splines, n_options))
+    y_squares = np.zeros(n_options)
+    for start in range(0, n_samples, chunk_size):
+        y_chunk = y[start:start + chunk_size] - y_mean
+        y_squares += np.sum(y_chunk * y_chunk, axis=0)
+        for variable_i in range(n_variables):
+            segment, weights = _basis(x[start:start + chunk_size, variable_i],
+                                      x_min[variable_i], x_max[variable_i],
+                                      n_segments)
+            for a in range(4):
+                # upper triangle only, the Gram matrix is symmetric
+                for b in range(a, 4):
+                    gram[variable_i] += np.bincount(
+                        (segment + a) * n_splines + segment + b,
+                        weights=weights[a] * weights[b],
+                        minlength=n_splines * n_splines)
+                for option_i in range(n_options):
+                    moments[variable_i, :, option_i] += np.bincount(
+                        segment + a, weights=weights[a] * y_chunk[:, option_i],
+                        minlength=n_splines)
+
+    penalty_matrix = _difference_penalty(n_splines)
+    coefs = np.zeros((n_variables, n_splines, n_options))
+    for variable_i in range(n_variables):
+        if x_max[variable_i] > x_min[variable_i]:
+            upper = gram[variable_i].reshape(n_splines, n_splines)
+            coefs[variable_i] = _fit(
+                upper + np.triu(upper, 1).T, moments[variable_i], y_squares,
+                n_samples, penalty_matrix, penalty)
+
+    # expected value of the best option given the fitted conditional
+    # expectations, again chunk by chunk
+    ev_pi = np.zeros(n_variables)
+    for start in range(0, n_samples, chunk_size):
+        for variable_i in range(n_variables):
+            segment, weights = _basis(x[start:start + chunk_size, variable_i],
+                                      x_min[variable_i], x_max[variable_i],
+                                      n_segments)
+            fitted = np.zeros((len(segment), n_options))
+            for a in range(4):
+                fitted += weights[a, :, np.newaxis] * \
+                    coefs[variable_i, segment + a]
+            ev_pi[variable_i] += np.sum(np.max(fitted + y_mean, axis=1))
+
+    evppi_results = ev_pi / n_samples - emv
+    # if input is deterministic, further information can not have any value
+    evppi_results[x_max == x_min] = 0
+
+    # Since this method tends to overestimate EVPIs, that are actually
+    # zero, we want to test, if the EVPI is "significant" (not in the
+    # sense of a statistical test).
+    evppi_results[evppi_results < evpi(y) * significance_threshold] = 0
+
+    if is_single:
+        return evppi_results[0]
+    return evppi_results
@@ -0,0 +1,123 @@
+import numpy as np
+
+from .accumulator import EVPPIAccumulator
+
+
+def _is_same_ranking(previous, current, tolerance):
+    # no two variables swapped places by more than the tolerance, i.e. the
+    # previous values in the current order only decrease within it
+    previous = previous[np.argsort(current, kind="stable")]
+    return np.all(np.maximum.accumulate(previous) - previous <= tolerance)
+
+
+def sequential_evppi(sampler, utility, tolerance=1e-2, initial_samples=1000,
+                     growth=2, max_samples=10**6, n_bins=None, x_min=None,
+                     x_max=None, n_groups=4, significance_threshold=1e-3):
+    """EVPPI of multiple input variables, with just as many Monte Carlo
+    samples as needed for stable results.
+    Samples are drawn in batches, each `growth` times as large as all
+    samples so far, and added to accumulators (s. `EVPPIAccumulator`), so
+    no sample is kept in memory. After every batch, the EVPPIs are
+    evaluated with the cubic root of the current sample number as bins,
+    which are merged from the fixed fine bins of the accumulators. The
+    samples of every batch are dealt to `n_groups` interleaved
+    accumulators, whose spread estimates the standard error. The sampling
+    stops, once neither the values nor their ranking changed by more than
+    `tolerance` times the total EVPI since the previous batch and the
+    standard errors are below it as well.
+
+    Parameters
+    ----------
+    sampler : callable
+        `sampler(n_samples)` returns a 2D array of new input samples.
+        Columns are variables, rows are samples.
+    utility : callable
+        `utility(x)` returns the output samples for the input samples `x` as
+        a 2D array. Samples are rows, decision options are columns.
+    tolerance : float
+        Largest change of any EVPPI between two batches relative to the
+        total EVPI, that counts as stable.
+    initial_samples : int
+        Size of the first batch.
+    growth : float
+        Ratio between the total sample number after and before each batch.
+    max_samples : int
+        Upper limit for the number of samples.
+    n_bins : int
+        Number of fine bins per variable. Defaults to the cubic root of
+        `max_samples`.
+    x_min, x_max : 1D array_like
+        Lower and upper bound of each input variable, given together.
+        Default to the minimum and maximum of the first batch, later samples
+        outside are counted in the first or last bin.
+    n_groups : int
+        Number of interleaved accumulators for the error estimate.
+    significance_threshold : float
+        Percentage of the total EVPI, below which EVPI values will be set to
+        zero. S. `multi_evppi`.
+
+    Returns
+    -------
+    evppi : 1D array
+        EVPPI of each variable.
+    error : 1D array
+        Estimated standard error of each EVPPI.
+    n_samples : int
+        Number of samples drawn.
+    converged : bool
+        Whether the results were stable before reaching `max_samples`.
+    """
+    if growth <= 1:
+        raise ValueError("The batches must grow, use a growth above 1.")
+    if n_groups < 2:
+        raise ValueError("At least 2 groups are needed for the error.")
+    if min(initial_samples, max_samples) < 1:
+        raise ValueError("The first batch needs at least 1 sample.")
+    if (x_min is None) != (x_max is None):
+        raise ValueError("Give both x_min and x_max or none of them.")
+    if n_bins is None:
+        n_bins = int(np.cbrt(max_samples))
+
+    groups = None
+    previous = None
+    n_samples = 0
+    batch_size = min(initial_samples, max_samples)
+    while batch_size > 0:
+        x = np.asarray(sampler(batch_size), dtype=float)
+        if x.ndim == 1:
+            x = x[:, np.newaxis]
+        y = np.asarray(utility(x), dtype=float)
+        # the first batch fixes the bins of all groups
+        if groups is None:
+            if x_min is None:
+                x_min = np.min(x, axis=0)
+                x_max = np.max(x, axis=0)
+            groups = [EVPPIAccumulator(n_bins, x_min, x_max)
+                      for _ in range(n_groups)]
+        # every group gets every `n_groups`-th sample
+        for group_i, acc in enumerate(groups):
+            acc.partial_fit(x[group_i::n_groups], y[group_i::n_groups])
+        n_samples += len(x)
+
+        total = EVPPIAccumulator(n_bins, x_min, x_max)
+        for acc in groups:
+            total.merge(acc)
+        current_n_bins = max(1, int(np.cbrt(n_samples)))
+        current = total.result(significance_threshold, current_n_bins)
+        group_results = np.array([acc.result(significance_threshold,
+                                             current_n_bins)
+                                  for acc in groups])
+        error = np.std(group_results, axis=0, ddof=1) / np.sqrt(n_groups)
+
+        # a small change alone might be luck, so the error has to be small,
+        # too
+        absolute_tolerance = tolerance * total.evpi()
+        if previous is not None and \
+                np.max(error) <= absolute_tolerance and \
+                np.max(np.abs(current - previous)) <= absolute_tolerance and \
+                _is_same_ranking(previous, current, absolute_tolerance):
+            break
+        previous = current
+        batch_size = min(int(np.ceil(n_samples * (growth - 1))),
+                         max_samples - n_samples)
+    return current, error, n_samples, batch_size > 0
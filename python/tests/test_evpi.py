@@ -1,6 +1,16 @@
 import numpy as np
 import pandas as pd
-from py_evpi import evpi, evppi, multi_evppi, binary_evppi
+import pytest
+from scipy.spatial import cKDTree
+from py_evpi import evpi, evppi, multi_evppi, evppi_curve, binary_evppi, \
+    binary_evpi, BinnedInputs, BinningCache, EVPPIAccumulator, \
+    out_of_core_multi_evppi, net_benefit_evpi, net_benefit_multi_evppi, \
+    evipi, multi_evipi, group_evppi, pairwise_evppi, regression_evppi, \
+    knn_evppi, calibrated_multi_evppi, calibrated_binary_multi_evppi, \
+    sequential_evppi, screen_evppi
+from py_evpi.bootstrap import bootstrap_intervals
+from py_evpi.evpi import _bin_inputs, _ev_pi, _quantile_bin_idxs
+from py_evpi.permutation import permutation_null
 
 x = pd.read_csv("../test_data/x.csv", index_col=0)
 y = pd.read_csv("../test_data/y.csv", index_col=0)
@@ -27,3 +37,313 @@ def test_multi_evppi():
 
 def test_binary_evpi():
     assert np.isclose(binary_evppi(x.x1, y.y1), 5.9, atol=atol)
+
+
+def test_multi_evppi_matches_evppi():
+    single = [evppi(x[col], y) for col in x.columns]
+    assert np.allclose(multi_evppi(x, y, significance_threshold=0), single)
+
+
+def test_accumulator():
+    n_bins = int(np.cbrt(len(x)))
+    accumulators = [EVPPIAccumulator(n_bins, x.min(), x.max())
+                    for i in range(2)]
+    for i, (x_chunk, y_chunk) in enumerate(zip(np.array_split(x, 7),
+                                               np.array_split(y, 7))):
+        accumulators[i % 2].partial_fit(x_chunk, y_chunk)
+    acc = accumulators[0].merge(accumulators[1])
+    assert acc.n_samples == len(x)
+    assert np.isclose(acc.evpi(), evpi(y))
+    assert np.allclose(acc.result(), multi_evppi(x, y))
+
+
+def test_out_of_core_multi_evppi(tmp_path):
+    np.save(tmp_path / "x.npy", x.to_numpy())
+    y.to_numpy().T.tofile(tmp_path / "y.bin")
+    res = out_of_core_multi_evppi(tmp_path / "x.npy", tmp_path / "y.bin",
+                                  n_options=y.shape[1], memory_budget=2**20)
+    assert np.allclose(res, multi_evppi(x, y))
+
+
+def test_quantile_binning():
+    n_bins = 21
+    bin_idxs = _quantile_bin_idxs(x.to_numpy(), n_bins)
+    for variable_i in range(x.shape[1]):
+        counts = np.bincount(bin_idxs[:, variable_i], minlength=n_bins)
+        assert counts.sum() == len(x)
+        assert counts.max() - counts.min() <= 1
+    res = multi_evppi(x, y, binning="quantile")
+    assert np.allclose(res, [7.1, 2.3, 9.9], atol=atol)
+    assert np.isclose(evppi(x.x1, y, binning="quantile"), res[0])
+
+
+def test_evppi_curve():
+    n_bins_range = [1, 2, 17, 46]
+    for binning in ["uniform", "quantile"]:
+        curve = evppi_curve(x, y, n_bins_range, binning=binning)
+        for n_bins, res in zip(n_bins_range, curve):
+            assert np.allclose(res, multi_evppi(x, y, n_bins,
+                                                binning=binning))
+    assert np.allclose(evppi_curve(x.x1, y, n_bins_range, binning=binning),
+                       curve[:, 0])
+    for invalid_range in [[], [0], [4, -1]]:
+        with pytest.raises(ValueError, match="bin number"):
+            evppi_curve(x, y, invalid_range)
+
+
+def test_binned_inputs():
+    for binning in ["uniform", "quantile"]:
+        binned = BinnedInputs(x, binning=binning)
+        assert binned.bin_idxs.dtype == np.uint8
+        assert np.allclose(multi_evppi(binned, y),
+                           multi_evppi(x, y, binning=binning))
+        assert np.isclose(evppi(BinnedInputs(x.x2, binning=binning), y),
+                          evppi(x.x2, y, binning=binning))
+        assert np.allclose(multi_evppi(binned, y, binning=binning),
+                           multi_evppi(binned, y))
+    # the binning of the inputs can not be changed afterwards
+    binned = BinnedInputs(x, binning="uniform")
+    for function in [multi_evppi, pairwise_evppi]:
+        with pytest.raises(ValueError, match="binning"):
+            function(binned, y, binning="quantile")
+    with pytest.raises(ValueError, match="binning"):
+        evppi(BinnedInputs(x.x2), y, binning="quantile")
+
+
+def test_binning_cache():
+    cache = BinningCache()
+    res = multi_evppi(cache.bin(x), y)
+    assert np.allclose(res, multi_evppi(x, y))
+    # only the new column is binned again
+    assert np.allclose(multi_evppi(cache.bin(x[["x3", "x1"]]), y),
+                       res[[2, 0]])
+    assert (cache.hits, cache.misses) == (2, 3)
+    # the default binning is the uniform one
+    binned = cache.bin(x, binning=None)
+    assert binned.binning == "uniform" and cache.misses == 3
+    assert np.allclose(multi_evppi(binned, y, binning="uniform"), res)
+    small_cache = BinningCache(max_bytes=len(x))
+    small_cache.bin(x)
+    assert len(small_cache) == 1 and small_cache.nbytes == len(x)
+
+
+def test_net_benefit():
+    effects = y.to_numpy() / 100 + 1
+    costs = x.to_numpy() * [1, 2, -1]
+    wtp = [0, 50, 120]
+    evpis = net_benefit_evpi(effects, costs, wtp)
+    evppis = net_benefit_multi_evppi(x, effects, costs, wtp)
+    for wtp_value, evpi_res, evppi_res in zip(wtp, evpis, evppis):
+        net_benefit = wtp_value * effects - costs
+        assert np.isclose(evpi_res, evpi(net_benefit))
+        assert np.allclose(evppi_res, multi_evppi(x, net_benefit))
+
+
+def test_evipi():
+    # X ~ N(0, 1) with utilities X and -X: the posterior mean after
+    # information with posterior std s is N(0, 1 - s**2) distributed
+    rng = np.random.default_rng(0)
+    x_normal = rng.normal(size=10**5)
+    std = np.array([0, 0.3, 0.6, 0.9])
+    expected = np.sqrt(1 - std**2) * np.sqrt(2 / np.pi)
+    res = evipi(x_normal, np.column_stack([x_normal, -x_normal]), std)
+    assert np.allclose(res, expected, atol=0.01)
+
+    grid = multi_evipi(x, y, [0, 3, 100])
+    assert np.allclose(grid[0], multi_evppi(x, y), atol=atol)
+    assert np.all(grid[1] <= grid[0]) and np.all(grid[2] == 0)
+    assert np.isclose(evipi(x.x1, y, 3), grid[1, 0])
+
+
+def test_group_evppi():
+    # a group of one is a single variable
+    assert np.isclose(group_evppi(x.x1, y, 46), evppi(x.x1, y))
+    res = group_evppi(x, y)
+    assert np.isclose(res, 17.3, atol=atol)
+    assert res <= evpi(y)
+    assert group_evppi(x[["x1", "x3"]], y) > multi_evppi(x, y)[2]
+    assert group_evppi(np.ones((100, 2)), y[:100]) == 0
+
+    # sum of independent standard normals, whose total EVPI is known
+    rng = np.random.default_rng(0)
+    x_normal = rng.normal(size=(10**5, 4))
+    y_normal = np.column_stack((np.sum(x_normal, axis=1), np.zeros(10**5)))
+    # most of the 30**4 cells are empty
+    assert np.isclose(group_evppi(x_normal, y_normal, 30),
+                      2 / np.sqrt(2 * np.pi), atol=0.05)
+
+
+def test_pairwise_evppi():
+    pair_evppi, excess = pairwise_evppi(x, y)
+    assert np.allclose(pair_evppi, pair_evppi.T)
+    # the same bins as the single variables and the groups of two
+    assert np.allclose(np.diag(pair_evppi),
+                       multi_evppi(x, y, 17, significance_threshold=0))
+    assert np.isclose(pair_evppi[0, 2], group_evppi(x[["x1", "x3"]], y, 17))
+    assert np.isclose(excess[0, 2],
+                      pair_evppi[0, 2] - pair_evppi[0, 0] - pair_evppi[2, 2])
+    assert np.all(np.diag(excess) == 0)
+
+    # a budget for a single pair at a time does not change the results
+    small_budget = pairwise_evppi(x, y, n_threads=2, memory_budget=1)
+    assert np.allclose(small_budget[0], pair_evppi)
+
+
+def test_regression_evppi():
+    res = regression_evppi(x, y)
+    assert np.allclose(res, [7.1, 2.3, 9.9], atol=atol)
+    assert np.isclose(regression_evppi(x.x1, y), res[0])
+    # the normal equations do not depend on the chunks
+    assert np.allclose(regression_evppi(x, y, chunk_size=999), res)
+    # a huge penalty leaves a straight line, i.e. ordinary least squares
+    design = np.column_stack((np.ones(len(y)), x.x1))
+    fitted = design @ np.linalg.lstsq(design, y, rcond=None)[0]
+    linear = np.mean(np.max(fitted, axis=1)) - np.max(np.mean(y, axis=0))
+    assert np.isclose(regression_evppi(x.x1, y, penalty=1e9), linear)
+    assert regression_evppi(np.ones(len(y)), y) == 0
+
+
+def test_knn_evppi():
+    assert np.isclose(knn_evppi(x.x1, y), 7.1, atol=atol)
+    approx = knn_evppi(x[["x1", "x3"]], y, eps=0.5, n_queries=10**4)
+    assert np.isclose(approx, group_evppi(x[["x1", "x3"]], y), atol=atol)
+    assert knn_evppi(np.ones(len(y)), y) == 0
+
+    # the sorted windows of a single variable are its nearest neighbors
+    x_small = np.asarray(x.x1[:2000])
+    y_small = np.asarray(y[:2000])
+    _, neighbors = cKDTree(x_small[:, np.newaxis]).query(
+        x_small[:, np.newaxis], 50)
+    brute_force = np.mean(np.max(np.mean(y_small[neighbors], axis=1),
+                                 axis=1)) - np.max(np.mean(y_small, axis=0))
+    assert np.isclose(knn_evppi(x_small, y_small, 50), brute_force)
+    assert np.isclose(knn_evppi(np.column_stack((x_small, x_small)),
+                                y_small, 50), brute_force)
+
+
+def test_bootstrap():
+    values, intervals = multi_evppi(x, y, n_bootstrap=200, seed=1)
+    assert np.all(intervals[:, 0] <= values)
+    assert np.all(values <= intervals[:, 1])
+    assert np.array_equal(
+        multi_evppi(x, y, n_bootstrap=200, seed=1)[1], intervals)
+    value, interval = evppi(x.x1, y, n_bootstrap=200, seed=1)
+    assert interval == tuple(intervals[0])
+    assert evppi(np.ones(len(y)), y, n_bootstrap=200) == (0, (0.0, 0.0))
+
+    # the batches have their own seeds, so the threads do not matter
+    bin_idxs, is_const, n_bins = _bin_inputs(x, None, "uniform")
+    y_array = np.asarray(y, dtype=float)
+    assert np.array_equal(
+        bootstrap_intervals(bin_idxs, is_const, y_array, n_bins, 200, seed=2,
+                            n_threads=1),
+        bootstrap_intervals(bin_idxs, is_const, y_array, n_bins, 200, seed=2,
+                            n_threads=4))
+
+
+def test_permutation_null():
+    rng = np.random.default_rng(0)
+    x_noise = np.column_stack((x, rng.normal(size=len(y))))
+    values, p_values = calibrated_multi_evppi(x_noise, y, seed=1)
+    raw = multi_evppi(x_noise, y, significance_threshold=0)
+    assert np.allclose(values[:3], [7.1, 2.3, 9.9], atol=atol)
+    assert np.all(values <= raw)
+    assert np.all(p_values[:3] == 1 / 101)
+    assert values[3] < 1e-2 and p_values[3] > 0.05
+
+    y_binary = np.asarray(y.iloc[:, 0] - y.iloc[:, 1])
+    values, p_values = calibrated_binary_multi_evppi(x_noise, y_binary,
+                                                     seed=1)
+    raw = [binary_evppi(x.x1, y_binary), binary_evppi(x.x2, y_binary)]
+    assert np.allclose(values[:2], raw, atol=atol)
+    assert p_values[0] == 1 / 101
+
+    # the segments of a permutation are the bins of shuffled bin labels
+    y_array = np.asarray(y, dtype=float)
+    bin_idxs, _, n_bins = _bin_inputs(x.x1, None, "uniform")
+    counts = np.bincount(bin_idxs[:, 0], minlength=n_bins)
+    null = permutation_null(counts[np.newaxis], y_array, 3, seed=2,
+                            n_threads=2)
+    seeds = np.random.SeedSequence(2).spawn(3)
+    for permutation_i, seed in enumerate(seeds):
+        shuffled = np.empty(len(y), dtype=np.intp)
+        shuffled[np.random.default_rng(seed).permutation(len(y))] = \
+            np.repeat(np.arange(n_bins), counts)
+        expected = _ev_pi(shuffled[:, np.newaxis], y_array, n_bins)[0] - \
+            np.max(np.mean(y_array, axis=0))
+        assert np.isclose(null[permutation_i, 0], expected)
+
+    # a single decision option has no value of information at all
+    values, p_values = calibrated_multi_evppi(x, y.iloc[:, :1], seed=1)
+    assert np.all(values == 0) and np.all(p_values == 1)
+    assert np.all(permutation_null(counts[np.newaxis], y_array[:, :1]) == 0)
+
+
+def test_weights():
+    # integer weights are the same as repeating the samples, as long as the
+    # bins stay the same
+    weights = np.arange(len(y)) % 3 + 1
+    repeated = np.repeat(np.arange(len(y)), weights)
+    x_repeated = np.asarray(x)[repeated]
+    y_repeated = np.asarray(y)[repeated]
+    assert np.allclose(multi_evppi(x, y, 46, 0, weights=weights),
+                       multi_evppi(x_repeated, y_repeated, 46, 0))
+    assert np.isclose(evppi(x.x1, y, weights=weights),
+                      evppi(x_repeated[:, 0], y_repeated, 46))
+    assert np.isclose(evpi(y, weights), evpi(y_repeated))
+    assert np.allclose(multi_evppi(x, y, weights=np.full(len(y), 0.5)),
+                       multi_evppi(x, y))
+
+    y_binary = np.asarray(y.iloc[:, 0] - y.iloc[:, 1])
+    assert np.isclose(binary_evppi(x.x1, y_binary, weights=weights),
+                      binary_evppi(x_repeated[:, 0], y_binary[repeated], 46))
+    assert np.isclose(binary_evpi(y_binary, weights),
+                      binary_evpi(y_binary[repeated]))
+
+    interval = evppi(x.x1, y, n_bootstrap=100, seed=1, weights=weights)[1]
+    assert interval[0] < evppi(x.x1, y, weights=weights) < interval[1]
+
+
+def test_sequential_evppi():
+    # fine bins are merged to the bins of `multi_evppi`
+    acc = EVPPIAccumulator(92, x.min(), x.max()).partial_fit(x, y)
+    assert np.allclose(acc.result(n_bins=46), multi_evppi(x, y))
+
+    # linear problem with known EVPPIs (s. `benchmarks/benchmark_linear.py`)
+    rng = np.random.default_rng(0)
+    coefficients = np.array([[-2, 3, 0], [5, -4, 0], [0, -3, 2]])
+
+    def sampler(n_samples):
+        return rng.normal([4, 3, 6], [8, 2, 15], (n_samples, 3))
+
+    def utility(x_samples):
+        return x_samples @ coefficients.T
+
+    values, error, n_samples, converged = sequential_evppi(
+        sampler, utility, tolerance=1e-2)
+    assert converged and n_samples < 10**6
+    assert np.allclose(values, [19.0150780, 2.7691518, 9.63411], atol=atol)
+    assert np.all(error < 1e-2 * evpi(utility(sampler(10**5))))
+
+    _, _, n_samples, converged = sequential_evppi(
+        sampler, utility, tolerance=0, max_samples=5000)
+    assert not converged and n_samples == 5000
+
+    for kwargs in [{"initial_samples": 0}, {"x_min": [0, 0, 0]}]:
+        with pytest.raises(ValueError):
+            sequential_evppi(sampler, utility, **kwargs)
+
+
+def test_screen_evppi():
+    # the variables of the test data hidden among many worthless ones
+    rng = np.random.default_rng(0)
+    x_many = np.column_stack((rng.normal(size=(len(x), 100)), x))
+    x_many = x_many[:, rng.permutation(x_many.shape[1])]
+    full = multi_evppi(x_many, y)
+    for top_k in [1, 3]:
+        indices, values, kept = screen_evppi(x_many, y, top_k)
+        assert np.array_equal(indices, np.argsort(-full)[:top_k])
+        assert np.allclose(values, full[indices])
+        assert top_k <= np.sum(kept) < x_many.shape[1]
+    with pytest.raises(ValueError):
+        screen_evppi(x, y, 0)
@@ -1,5 +1,7 @@
-from .evpi import evpi, evppi, multi_evppi
+from .evpi import evpi, evppi, multi_evppi, group_evppi, evipi, \
+    multi_evipi, multi_evppi_bootstrap
 from .binary_evpi import binary_evpi, binary_evppi, binary_multi_evppi
 
-__all__ = ["evpi", "evppi", "multi_evppi",
+__all__ = ["evpi", "evppi", "multi_evppi", "group_evppi", "evipi",
+           "multi_evipi", "multi_evppi_bootstrap",
            "binary_evpi", "binary_evppi", "binary_multi_evppi"]
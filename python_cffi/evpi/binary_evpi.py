@@ -7,7 +7,7 @@ def _fill_y(y):
     return np.c_[y, np.zeros(y.shape[0])]
 
 
-def binary_evppi(x, y):
+def binary_evppi(x, y, n_threads=None, weights=None):
     """Calculates EVPPI for one estimate and one decision criterion.
     EVPI means "Expected Value of Perfect Parameter Information" and can be
     described as a measure for what a decision maker would be willing to pay
@@ -24,11 +24,16 @@ def binary_evppi(x, y):
         decision criterion for a risk-neutral decision maker facing a binary
         decision, so that a positive expected value will lead to `yes` and a
         negative one to `no`.
+    n_threads : int
+        Number of threads sharing the samples. Defaults to all available
+        cores.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
-    return evppi(x, _fill_y(y))
+    return evppi(x, _fill_y(y), n_threads, weights=weights)
 
 
-def binary_evpi(y):
+def binary_evpi(y, weights=None):
     """Total EVPI.
     Expected value of making always the best decision. If the model itself is
     deterministic, i.e. the only source of uncertainty are the input variables,
@@ -38,11 +43,14 @@ def binary_evpi(y):
     ----------
     y : 1D array_like
         Monte carlo samples of model output (utility). S. `evppi`.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
-    return evpi(_fill_y(y))
+    return evpi(_fill_y(y), weights=weights)
 
 
-def binary_multi_evppi(x, y, significance_threshold=5e-2):
+def binary_multi_evppi(x, y, significance_threshold=5e-2, n_threads=None,
+                       weights=None):
     """Calculate evppi for multiple input variables and one output variable.
 
     Parameters
@@ -61,5 +69,10 @@ def binary_multi_evppi(x, y, significance_threshold=5e-2):
         Percentage of the total EVPI, below which EVPI values will be set to
         zero, since really small positive values are mostly numerical
         artifacts.
+    n_threads : int
+        Number of threads. Defaults to all available cores.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
-    return multi_evppi(x, _fill_y(y), significance_threshold)
+    return multi_evppi(x, _fill_y(y), significance_threshold, n_threads,
+                       weights=weights)
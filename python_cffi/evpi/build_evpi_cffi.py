@@ -3,10 +3,81 @@ from cffi import FFI
 ffibuilder = FFI()
 
 ffibuilder.cdef("""
-double evppi(double* x, double** y, size_t n_samples, size_t n_options);
+typedef struct evpi_workspace evpi_workspace;
+evpi_workspace* evpi_workspace_new(size_t n_samples, size_t n_options,
+                                   unsigned int n_bins, int n_threads);
+void evpi_workspace_free(evpi_workspace* ws);
+typedef enum {
+    EVPI_BINNING_UNIFORM = 0,
+    EVPI_BINNING_QUANTILE = 1
+} evpi_binning;
+int evpi_workspace_set_binning(evpi_workspace* ws, evpi_binning binning);
+double evppi(double* x, double** y, size_t n_samples, size_t n_options,
+             int n_threads);
 double* multi_evppi(double** x, double** y, size_t n_samples,
-                    size_t n_variables, size_t n_options, double threshold);
+                    size_t n_variables, size_t n_options, double threshold,
+                    int n_threads);
 double evpi(double** y, size_t n_samples, size_t n_options);
+double evppi_strided(double* x, ptrdiff_t x_stride, double* y,
+                     ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                     size_t n_samples, size_t n_options, int n_threads);
+double* multi_evppi_strided(double* x, ptrdiff_t x_row_stride,
+                            ptrdiff_t x_col_stride, double* y,
+                            ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                            size_t n_samples, size_t n_variables,
+                            size_t n_options, double threshold, int n_threads);
+double evpi_strided(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_options);
+double evppi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, evpi_workspace* ws);
+void multi_evppi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    double threshold, evpi_workspace* ws, double* out);
+double evpi_ws(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+               size_t n_samples, size_t n_options, evpi_workspace* ws);
+double evipi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, double std,
+                evpi_workspace* ws);
+void multi_evipi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    const double* std, size_t n_std, evpi_workspace* ws,
+                    double* out);
+double evppi_weighted_ws(double* x, ptrdiff_t x_stride, double* y,
+                         ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                         const double* weights, ptrdiff_t w_stride,
+                         size_t n_samples, size_t n_options,
+                         evpi_workspace* ws);
+void multi_evppi_weighted_ws(double* x, ptrdiff_t x_row_stride,
+                             ptrdiff_t x_col_stride, double* y,
+                             ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                             const double* weights, ptrdiff_t w_stride,
+                             size_t n_samples, size_t n_variables,
+                             size_t n_options, double threshold,
+                             evpi_workspace* ws, double* out);
+double evpi_weighted_ws(double* y, ptrdiff_t y_row_stride,
+                        ptrdiff_t y_col_stride, const double* weights,
+                        ptrdiff_t w_stride, size_t n_samples,
+                        size_t n_options, evpi_workspace* ws);
+int evpi_workspace_reserve_groups(evpi_workspace* ws);
+double group_evppi_ws(double* x, ptrdiff_t x_row_stride,
+                      ptrdiff_t x_col_stride, double* y,
+                      ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                      size_t n_samples, size_t n_dims,
+                      size_t n_options, const unsigned int* n_bins_per_dim,
+                      evpi_workspace* ws);
+int evpi_workspace_reserve_bootstrap(evpi_workspace* ws, size_t n_bootstrap);
+void multi_evppi_bootstrap_ws(double* x, ptrdiff_t x_row_stride,
+                              ptrdiff_t x_col_stride, double* y,
+                              ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                              size_t n_samples, size_t n_variables,
+                              size_t n_options, size_t n_bootstrap,
+                              double confidence, uint64_t seed,
+                              evpi_workspace* ws, double* lower,
+                              double* upper);
 """)
 
 ffibuilder.set_source("_evpi",
@@ -15,7 +86,9 @@ ffibuilder.set_source("_evpi",
                       """,
                       sources=["evpi/evpi.c"],
                       libraries=["m"],
-                      include_dirs=["evpi"])
+                      include_dirs=["evpi"],
+                      extra_compile_args=["-fopenmp"],
+                      extra_link_args=["-fopenmp"])
 
 if __name__ == "__main__":
     ffibuilder.compile(verbose=True)
@@ -1,9 +1,80 @@
+import threading
+
 import numpy as np
 
 from _evpi import ffi, lib
 
+# every Python thread keeps its own workspace of the C library
+_local = threading.local()
+
+_BINNINGS = {"uniform": lib.EVPI_BINNING_UNIFORM,
+             "quantile": lib.EVPI_BINNING_QUANTILE}
+
 
-def evppi(x, y):
+def _n_threads(n_threads):
+    # the C library uses all available cores for non-positive values
+    return 0 if n_threads is None else n_threads
+
+
+def _workspace(n_samples, n_options, n_threads, binning="uniform"):
+    """Workspace of the C library, that is kept alive between calls.
+    It is only replaced, if it is too small for the data or the number of
+    threads changes, so repeated calls of similar size do not allocate any
+    memory in C.
+    """
+    if binning not in _BINNINGS:
+        raise ValueError("Unknown binning {!r}, use one of {}.".format(
+            binning, ", ".join(_BINNINGS)))
+    n_threads = _n_threads(n_threads)
+    size = getattr(_local, "size", None)
+    if size is None or size[0] < n_samples or size[1] < n_options or \
+            size[2] != n_threads:
+        ws = lib.evpi_workspace_new(n_samples, n_options, 0, n_threads)
+        if ws == ffi.NULL:
+            raise MemoryError("Could not allocate the EVPI workspace.")
+        _local.workspace = ffi.gc(ws, lib.evpi_workspace_free)
+        _local.size = (n_samples, n_options, n_threads)
+    if lib.evpi_workspace_set_binning(_local.workspace,
+                                      _BINNINGS[binning]) != 0:
+        raise MemoryError("Could not allocate the EVPI workspace.")
+    return _local.workspace
+
+
+def _as_strided(a):
+    """Pointer to the data of `a` and its strides in elements.
+    Float arrays are used in place regardless of their memory layout, only
+    other types (or strides that are no multiple of the item size) are
+    copied.
+
+    Returns
+    -------
+    a : ndarray
+        The array, that the pointer refers to. Keep a reference to it as long
+        as the pointer is used.
+    ptr : cdata
+        `double *` to the first element.
+    strides : tuple of int
+        Distance between neighboring elements along each axis in elements.
+    """
+    a = np.asarray(a, dtype=float)
+    if any(stride % a.itemsize for stride in a.strides):
+        a = np.ascontiguousarray(a)
+    strides = tuple(stride // a.itemsize for stride in a.strides)
+    return a, ffi.cast("double *", a.ctypes.data), strides
+
+
+def _as_weights(weights, n_samples):
+    """Pointer to the sample weights and their stride, NULL for equally
+    weighted samples. S. `_as_strided`."""
+    if weights is None:
+        return None, ffi.NULL, 0
+    weights, ww, w_strides = _as_strided(weights)
+    if weights.shape != (n_samples,):
+        raise ValueError("There must be one weight per sample.")
+    return weights, ww, w_strides[0]
+
+
+def evppi(x, y, n_threads=None, binning="uniform", weights=None):
     """Calculates EVPPI for one estimate and one decision criterion.
     EVPI means "Expected Value of Perfect Parameter Information" and can be
     described as a measure for what a decision maker would be willing to pay
@@ -21,29 +92,42 @@ def evppi(x, y):
         decision criterion for a risk-neutral decision maker, that chooses
         the option with the highest expected utility. Samples are rows,
         decision options are columns.
+    n_threads : int
+        Number of threads sharing the samples. Defaults to all available
+        cores.
+    binning : {"uniform", "quantile"}
+        Equally wide bins between the minimum and maximum of each variable
+        or bins with the same number of samples.
+    weights : 1D array_like
+        Weight of each sample, e.g. the likelihood ratios of importance
+        sampling. The bin sums are weighted and all means are divided by the
+        total weight. Equally weighted by default.
+
     Returns
     -------
     evppi : float
         Expected Value of Perfect Parameter Information
     """
-    x = np.asfortranarray(x, dtype=float)
-    y = np.asfortranarray(y, dtype=float)
-
-    xx = ffi.cast("double *", x.ctypes.data)
-
-    yy = ffi.new("double* [%d]" % (y.shape[1]))
-    for i in range(y.shape[1]):
-        yy[i] = ffi.cast("double *", y[:, i].ctypes.data)
+    x, xx, x_strides = _as_strided(x)
+    y, yy, y_strides = _as_strided(y)
+    weights, ww, w_stride = _as_weights(weights, x.shape[0])
 
-    res = lib.evppi(xx,
-                    yy,
-                    x.shape[0],
-                    y.shape[1])
+    res = lib.evppi_weighted_ws(xx,
+                                x_strides[0],
+                                yy,
+                                y_strides[0],
+                                y_strides[1],
+                                ww,
+                                w_stride,
+                                x.shape[0],
+                                y.shape[1],
+                                _workspace(x.shape[0], y.shape[1], n_threads,
+                                           binning))
 
     return res
 
 
-def evpi(y):
+def evpi(y, n_threads=None, weights=None):
     """Total EVPI.
     Expected value of making always the best decision. If the model itself is
     deterministic, i.e. the only source of uncertainty are the input variables,
@@ -58,21 +142,29 @@ def evpi(y):
         decision criterion for a risk-neutral decision maker, that chooses
         the option with the highest expected utility. Samples are rows,
         decision options are columns.
+    n_threads : int
+        Number of threads sharing the samples. Defaults to all available
+        cores.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
-    y = np.asfortranarray(y, dtype=float)
-
-    yy = ffi.new("double* [%d]" % (y.shape[1]))
-    for i in range(y.shape[1]):
-        yy[i] = ffi.cast("double *", y[:, i].ctypes.data)
+    y, yy, y_strides = _as_strided(y)
+    weights, ww, w_stride = _as_weights(weights, y.shape[0])
 
-    res = lib.evpi(yy,
-                   y.shape[0],
-                   y.shape[1])
+    res = lib.evpi_weighted_ws(yy,
+                               y_strides[0],
+                               y_strides[1],
+                               ww,
+                               w_stride,
+                               y.shape[0],
+                               y.shape[1],
+                               _workspace(y.shape[0], y.shape[1], n_threads))
 
     return res
 
 
-def multi_evppi(x, y, significance_threshold=1e-3):
+def multi_evppi(x, y, significance_threshold=1e-3, n_threads=None,
+                binning="uniform", weights=None):
     """Calculate EVPPI for multiple input variables and one output variable.
 
     Parameters
@@ -91,24 +183,231 @@ def multi_evppi(x, y, significance_threshold=1e-3):
         Percentage of the total EVPI, below which EVPI values will be set to
         zero, since really small positive values are mostly numerical
         artifacts.
+    n_threads : int
+        Number of threads. Defaults to all available cores.
+    binning : {"uniform", "quantile"}
+        Equally wide bins between the minimum and maximum of each variable
+        or bins with the same number of samples.
+    weights : 1D array_like
+        Weight of each sample. S. `evppi`.
     """
-    x = np.asfortranarray(x, dtype=float)
-    y = np.asfortranarray(y, dtype=float)
-
-    xx = ffi.new("double* [%d]" % (x.shape[1]))
-    yy = ffi.new("double* [%d]" % (y.shape[1]))
-    for i in range(x.shape[1]):
-        xx[i] = ffi.cast("double *", x[:, i].ctypes.data)
+    x, xx, x_strides = _as_strided(x)
+    y, yy, y_strides = _as_strided(y)
+    weights, ww, w_stride = _as_weights(weights, x.shape[0])
 
-    for i in range(y.shape[1]):
-        yy[i] = ffi.cast("double *", y[:, i].ctypes.data)
+    res = np.empty(x.shape[1])
 
-    res_cdata = lib.multi_evppi(xx,
+    lib.multi_evppi_weighted_ws(xx,
+                                x_strides[0],
+                                x_strides[1],
                                 yy,
+                                y_strides[0],
+                                y_strides[1],
+                                ww,
+                                w_stride,
                                 x.shape[0],
                                 x.shape[1],
                                 y.shape[1],
-                                significance_threshold)
-    res = np.frombuffer(ffi.buffer(
-        res_cdata, x.shape[1]*np.dtype(float).itemsize), float)
+                                significance_threshold,
+                                _workspace(x.shape[0], y.shape[1], n_threads,
+                                           binning),
+                                ffi.from_buffer("double[]", res))
     return res
+
+
+def group_evppi(x_group, y, n_bins_per_dim=None, n_threads=None):
+    """Calculates EVPPI for a group of input variables, i.e. the value of
+    learning all of them at once. Only the occupied cells of the joint bins
+    are accumulated, so memory and time are proportional to the number of
+    samples.
+
+    Parameters
+    ----------
+    x_group : 2D array_like
+        Monte Carlo samples of the variables of the group. Columns are
+        variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bins_per_dim : int or 1D array_like of int
+        Number of equally wide bins per variable, either one for all
+        variables or one each. Defaults to
+        `n_samples ** (1 / (n_variables + 2))`.
+    n_threads : int
+        Number of threads binning the samples. Defaults to all available
+        cores.
+
+    Returns
+    -------
+    float
+        EVPPI of the group.
+    """
+    x_group = np.asarray(x_group, dtype=float)
+    if x_group.ndim == 1:
+        x_group = x_group[:, np.newaxis]
+    x_group, xx, x_strides = _as_strided(x_group)
+    y, yy, y_strides = _as_strided(y)
+    if n_bins_per_dim is None:
+        n_bins_per_dim = 0
+    n_bins = np.ascontiguousarray(np.broadcast_to(
+        n_bins_per_dim, (x_group.shape[1],)), dtype=np.uintc)
+
+    ws = _workspace(x_group.shape[0], y.shape[1], n_threads)
+    if lib.evpi_workspace_reserve_groups(ws) != 0:
+        raise MemoryError("Could not allocate the EVPI workspace.")
+    return lib.group_evppi_ws(xx,
+                              x_strides[0],
+                              x_strides[1],
+                              yy,
+                              y_strides[0],
+                              y_strides[1],
+                              x_group.shape[0],
+                              x_group.shape[1],
+                              y.shape[1],
+                              ffi.cast("unsigned int *", n_bins.ctypes.data),
+                              ws)
+
+
+def multi_evppi_bootstrap(x, y, n_bootstrap=1000, confidence=0.95, seed=0,
+                          n_threads=None, binning="uniform"):
+    """Percentile bootstrap confidence intervals of the EVPPI of multiple
+    input variables. The bins of a variable are assigned only once and every
+    replicate reweights the samples with Poisson(1) counts, that only depend
+    on `seed`, the replicate and the sample, so the intervals do not depend
+    on the number of threads.
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    n_bootstrap : int
+        Number of bootstrap replicates.
+    confidence : float
+        Confidence level of the intervals.
+    seed : int
+        Seed of the resampling weights.
+    n_threads : int
+        Number of threads sharing the replicates. Defaults to all available
+        cores.
+    binning : {"uniform", "quantile"}
+        Equally wide bins between the minimum and maximum of each variable
+        or bins with the same number of samples.
+
+    Returns
+    -------
+    2D array
+        Lower and upper bound (columns) for each variable (rows).
+    """
+    x, xx, x_strides = _as_strided(x)
+    y, yy, y_strides = _as_strided(y)
+
+    ws = _workspace(x.shape[0], y.shape[1], n_threads, binning)
+    if lib.evpi_workspace_reserve_bootstrap(ws, n_bootstrap) != 0:
+        raise MemoryError("Could not allocate the EVPI workspace.")
+    intervals = np.empty((2, x.shape[1]))
+    lib.multi_evppi_bootstrap_ws(xx,
+                                 x_strides[0],
+                                 x_strides[1],
+                                 yy,
+                                 y_strides[0],
+                                 y_strides[1],
+                                 x.shape[0],
+                                 x.shape[1],
+                                 y.shape[1],
+                                 n_bootstrap,
+                                 confidence,
+                                 seed,
+                                 ws,
+                                 ffi.from_buffer("double[]", intervals[0]),
+                                 ffi.from_buffer("double[]", intervals[1]))
+    return intervals.T
+
+
+def multi_evipi(x, y, std, n_threads=None):
+    """Calculates EVIPI for multiple input variables.
+    EVIPI means "Expected Value of Imperfect Parameter Information" and can
+    be described as a measure for what a decision maker would be willing to
+    pay for a given uncertainty on a certain variable.
+
+    Parameters
+    ----------
+    x : 2D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered parameter (aka estimates aka "input" variables). Columns
+        are variables, rows are samples.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    std : float or 1D array_like
+        Standard deviation(s) of x after new information. 0 corresponds to
+        perfect information.
+    n_threads : int
+        Number of threads, each processing whole variables. Defaults to all
+        available cores.
+
+    Returns
+    -------
+    1D or 2D array
+        One EVIPI value per variable, for a grid of standard deviations one
+        row per standard deviation.
+    """
+    x, xx, x_strides = _as_strided(x)
+    y, yy, y_strides = _as_strided(y)
+    std_grid = np.ascontiguousarray(np.atleast_1d(std), dtype=float)
+
+    # the C library writes the results variable by variable
+    res = np.empty((x.shape[1], len(std_grid)))
+
+    lib.multi_evipi_ws(xx,
+                       x_strides[0],
+                       x_strides[1],
+                       yy,
+                       y_strides[0],
+                       y_strides[1],
+                       x.shape[0],
+                       x.shape[1],
+                       y.shape[1],
+                       ffi.from_buffer("double[]", std_grid),
+                       len(std_grid),
+                       _workspace(x.shape[0], y.shape[1], n_threads),
+                       ffi.from_buffer("double[]", res))
+    if np.ndim(std) == 0:
+        return res[:, 0]
+    return res.T
+
+
+def evipi(x, y, std, n_threads=None):
+    """Calculates EVIPI for one estimate. S. `multi_evipi`.
+
+    Parameters
+    ----------
+    x : 1D array_like
+        Monte Carlo samples from the probability distribution of the
+        considered estimates or "input" variables.
+    y : 2D array_like
+        The respective utility (aka outcome) samples calculated using the
+        estimate samples of x. Samples are rows, decision options are
+        columns.
+    std : float or 1D array_like
+        Standard deviation(s) of x after new information.
+    n_threads : int
+        Number of threads. Defaults to all available cores.
+
+    Returns
+    -------
+    float or 1D array
+        EVIPI for each standard deviation.
+    """
+    x = np.asarray(x, dtype=float)
+    res = multi_evipi(x[:, np.newaxis], y, std, n_threads)
+    if np.ndim(std) == 0:
+        return res[0]
+    return res[:, 0]
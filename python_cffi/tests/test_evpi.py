@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
-from evpi import evpi, evppi, multi_evppi, binary_evppi
+from evpi import evpi, evppi, multi_evppi, binary_evppi, evipi, multi_evipi, \
+    group_evppi, multi_evppi_bootstrap
 
 x = pd.read_csv("../test_data/x.csv", index_col=0)
 y = pd.read_csv("../test_data/y.csv", index_col=0)
@@ -27,3 +28,64 @@ def test_multi_evppi():
 
 def test_binary_evpi():
     assert np.isclose(binary_evppi(x.x1, y.y1), 5.9, atol=atol)
+
+
+def test_multi_evppi_memory_layout():
+    x_c = np.ascontiguousarray(x)
+    y_c = np.ascontiguousarray(y)
+    res = multi_evppi(x_c, y_c)
+    assert np.allclose(multi_evppi(np.asfortranarray(x_c), y), res)
+    assert np.allclose(multi_evppi(x_c[::-1], y_c[::-1]), res)
+    assert np.allclose(multi_evppi(x_c[:, ::2], y_c), res[::2])
+
+
+def test_quantile_binning():
+    res = multi_evppi(x, y, significance_threshold=0, binning="quantile")
+    assert np.allclose(res, [7.1, 2.3, 9.9], atol=atol)
+    assert np.isclose(evppi(x.x1, y, binning="quantile"), res[0])
+    # switching back reuses the workspace with equally wide bins
+    assert np.isclose(evppi(x.x1, y), multi_evppi(x, y)[0])
+
+
+def test_evipi():
+    # reference values of the Python implementation
+    res = multi_evipi(x, y, [0, 3])
+    assert np.allclose(res, [[7.04826602, 2.40557449, 10.09189495],
+                             [6.57017756, 0, 9.85579795]], atol=1e-6)
+    assert np.isclose(evipi(x.x1, y, 3), res[1, 0])
+    assert np.allclose(evipi(x.x3, y, [0, 3]), res[:, 2])
+
+
+def test_group_evppi():
+    # reference values of the Python implementation
+    assert np.isclose(group_evppi(x, y), 17.27202464, atol=1e-6)
+    assert np.isclose(group_evppi(np.ascontiguousarray(x[["x1", "x3"]]), y,
+                                  [17, 5]), 14.51532502, atol=1e-6)
+    assert np.isclose(group_evppi(x.x1, y, 46), evppi(x.x1, y))
+
+
+def test_multi_evppi_bootstrap():
+    intervals = multi_evppi_bootstrap(x, y, 100, seed=1, n_threads=2)
+    assert np.array_equal(
+        multi_evppi_bootstrap(x, y, 100, seed=1, n_threads=1), intervals)
+    values = multi_evppi(x, y)
+    assert np.all(intervals[:, 0] <= values)
+    assert np.all(values <= intervals[:, 1])
+    # the Python implementation draws other weights, so the intervals only
+    # agree up to the resampling noise
+    assert np.allclose(intervals, [[7.03466361, 7.27133583],
+                                   [2.21203939, 2.59044432],
+                                   [9.89993966, 10.26619169]], atol=0.1)
+
+
+def test_weights():
+    weights = np.arange(len(y)) % 3 + 1
+    repeated = np.repeat(np.arange(len(y)), weights)
+    # integer weights are the same as repeating the samples
+    assert np.isclose(evpi(y, weights=weights), evpi(np.asarray(y)[repeated]))
+    # reference values of the Python implementation
+    assert np.allclose(multi_evppi(x, y, 0, weights=weights),
+                       [7.18808324, 2.41030452, 10.07913543])
+    assert np.isclose(evppi(x.x1, y, weights=weights), 7.18808324)
+    assert np.allclose(multi_evppi(x, y, 0, weights=np.full(len(y), 0.5)),
+                       multi_evppi(x, y, 0))
@@ -2,6 +2,58 @@
 #define EVPI_H
 
 #include <stddef.h>
+#include <stdint.h>
+
+/*
+    Reusable memory for all temporary results of the `_ws` functions, so
+    these do not allocate any memory themselves. A workspace can be used for
+    any number of calls with at most `n_samples` samples and `n_options`
+    decision options, but only by one call at a time.
+
+    Parameters
+    ----------
+    n_samples : size_t
+        Maximum number of Monte Carlo samples.
+    n_options : size_t
+        Maximum number of decision options.
+    n_bins : unsigned int
+        Number of histogram bins. 0 uses the cubic root of the sample number
+        of each call.
+    n_threads : int
+        Number of threads. Values below one use the OpenMP default (usually
+        all cores). Ignored without OpenMP.
+
+    Returns
+    -------
+    Pointer to the new workspace or NULL, if the memory could not be
+    allocated. Release it with `evpi_workspace_free`.
+*/
+typedef struct evpi_workspace evpi_workspace;
+
+evpi_workspace* evpi_workspace_new(size_t n_samples, size_t n_options,
+                                   unsigned int n_bins, int n_threads);
+
+void evpi_workspace_free(evpi_workspace* ws);
+
+/*
+    Ways to place the histogram bins of the `_ws` functions.
+    `EVPI_BINNING_UNIFORM` (default) uses equally wide bins between the
+    minimum and maximum of each variable. `EVPI_BINNING_QUANTILE` uses bins
+    with equal sample counts, whose cut points are found by selection
+    (expected linear time) instead of sorting. This resolves skewed or
+    heavy-tailed inputs much better.
+
+    `evpi_workspace_set_binning` selects the binning for all following calls
+    with the workspace. Quantile binning needs a copy of the input samples
+    per thread, which is allocated here. Returns 0 on success and -1 if the
+    memory could not be allocated.
+*/
+typedef enum {
+    EVPI_BINNING_UNIFORM = 0,
+    EVPI_BINNING_QUANTILE = 1
+} evpi_binning;
+
+int evpi_workspace_set_binning(evpi_workspace* ws, evpi_binning binning);
 
 /*
     Calculates EVPPI for one estimate and one decision criterion.
@@ -21,8 +73,12 @@
         decision criterion for a risk-neutral decision maker, that chooses
         the option with the highest expected utility. Samples are columns,
         decision options are rows(!).
+    n_threads : int
+        Number of threads sharing the samples. Values below one use the
+        OpenMP default (usually all cores). Ignored without OpenMP.
 */
-double evppi(double* x, double** y, size_t n_samples, size_t n_options);
+double evppi(double* x, double** y, size_t n_samples, size_t n_options,
+             int n_threads);
 
 /*
     "Calculate EVPPI for multiple input variables and one output variable.
@@ -43,9 +99,20 @@ double evppi(double* x, double** y, size_t n_samples, size_t n_options);
         Percentage of the total EVPI, below which EVPI values will be set to
         zero, since really small positive values are mostly numerical
         artifacts.
+    n_threads : int
+        Number of threads. Each thread processes whole variables, if there
+        are at least as many variables as threads, otherwise the threads
+        share the samples of each variable. Values below one use the OpenMP
+        default (usually all cores). Ignored without OpenMP.
+
+    Returns
+    -------
+    Newly allocated array with one EVPPI per variable. Release it with
+    `free`.
 */
 double* multi_evppi(double** x, double** y, size_t n_samples,
-                    size_t n_variables, size_t n_options, double threshold);
+                    size_t n_variables, size_t n_options, double threshold,
+                    int n_threads);
 
 /*
     Total EVPI.
@@ -65,4 +132,206 @@ double* multi_evppi(double** x, double** y, size_t n_samples,
 */
 double evpi(double** y, size_t n_samples, size_t n_options);
 
+/*
+    Strided variants of `evppi`, `multi_evppi` and `evpi`.
+    Instead of an array of column pointers, every matrix is given by a
+    pointer to its first element and the distance (in elements, not bytes)
+    between two consecutive rows and two consecutive columns. This way C- and
+    Fortran-ordered arrays as well as sliced views can be used in place
+    without copying. Here, samples are always rows and variables or decision
+    options are columns, i.e. a C-ordered matrix of shape
+    (n_samples, n_options) has `y_row_stride = n_options` and
+    `y_col_stride = 1`, a Fortran-ordered one `y_row_stride = 1` and
+    `y_col_stride = n_samples`.
+
+    All other parameters are the same as for the functions above. The
+    result of `multi_evppi_strided` has to be released with `free`.
+*/
+double evppi_strided(double* x, ptrdiff_t x_stride, double* y,
+                     ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                     size_t n_samples, size_t n_options, int n_threads);
+
+double* multi_evppi_strided(double* x, ptrdiff_t x_row_stride,
+                            ptrdiff_t x_col_stride, double* y,
+                            ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                            size_t n_samples, size_t n_variables,
+                            size_t n_options, double threshold, int n_threads);
+
+double evpi_strided(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_options);
+
+/*
+    Allocation-free variants of the strided functions above. All temporary
+    memory is taken from the workspace `ws`, the bin number and the number
+    of threads are the ones of the workspace. `multi_evppi_ws` writes one
+    EVPPI per variable into the caller-provided array `out`.
+    If the data does not fit into the workspace, the result is NAN.
+*/
+double evppi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, evpi_workspace* ws);
+
+void multi_evppi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    double threshold, evpi_workspace* ws, double* out);
+
+double evpi_ws(double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+               size_t n_samples, size_t n_options, evpi_workspace* ws);
+
+/*
+    Variants of the `_ws` functions above for samples with weights, e.g.
+    from importance sampling or a stratified design. `weights` holds one
+    non-negative weight per sample, `w_stride` elements apart. The output
+    sums of every bin are weighted and all means are divided by the total
+    weight instead of the sample number. Quantile bins still have equal
+    sample counts. NULL weighs all samples equally, like the unweighted
+    functions.
+*/
+double evppi_weighted_ws(double* x, ptrdiff_t x_stride, double* y,
+                         ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                         const double* weights, ptrdiff_t w_stride,
+                         size_t n_samples, size_t n_options,
+                         evpi_workspace* ws);
+
+void multi_evppi_weighted_ws(double* x, ptrdiff_t x_row_stride,
+                             ptrdiff_t x_col_stride, double* y,
+                             ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                             const double* weights, ptrdiff_t w_stride,
+                             size_t n_samples, size_t n_variables,
+                             size_t n_options, double threshold,
+                             evpi_workspace* ws, double* out);
+
+double evpi_weighted_ws(double* y, ptrdiff_t y_row_stride,
+                        ptrdiff_t y_col_stride, const double* weights,
+                        ptrdiff_t w_stride, size_t n_samples, size_t n_options,
+                        evpi_workspace* ws);
+
+/*
+    Calculates EVIPI for one estimate.
+    EVIPI means "Expected Value of Imperfect Parameter Information" and can
+    be described as a measure for what a decision maker would be willing to
+    pay for a given uncertainty on a certain variable. Information leaving
+    a normal posterior with standard deviation `std` is assumed, equally wide
+    bins are used regardless of the binning of the workspace.
+
+    `multi_evipi_ws` evaluates all variables for all `n_std` standard
+    deviations of `std` at once and writes them variable by variable into
+    `out`, i.e. `out[variable_i * n_std + std_i]`. Each thread processes
+    whole variables. All other parameters are the same as for the
+    functions above.
+*/
+double evipi(double* x, double** y, size_t n_samples, size_t n_options,
+             double std);
+
+double evipi_ws(double* x, ptrdiff_t x_stride, double* y,
+                ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                size_t n_samples, size_t n_options, double std,
+                evpi_workspace* ws);
+
+void multi_evipi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                    double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                    size_t n_samples, size_t n_variables, size_t n_options,
+                    const double* std, size_t n_std, evpi_workspace* ws,
+                    double* out);
+
+/*
+    Calculates EVPPI for a group of `n_dims` input variables, i.e. the value
+    of learning all of them at once. The variables are binned jointly into
+    equally wide bins per dimension, regardless of the binning of the
+    workspace, with `n_bins_per_dim[dim_i]` bins for each dimension. NULL or
+    entries of 0 use `n_samples^(1/(n_dims+2))` bins. Only the occupied
+    cells are accumulated (in a hash table), so memory and time do not
+    depend on the number of cells.
+
+    `group_evppi` takes the variables as column pointers like `multi_evppi`,
+    `group_evppi_ws` as strided samples (s. above). The latter needs a
+    workspace prepared by `evpi_workspace_reserve_groups`, which allocates
+    the hash table and returns 0 on success and -1 if the memory could not
+    be allocated. Without it, or if the cells can not be numbered with 64
+    bit keys, the result is NAN.
+*/
+int evpi_workspace_reserve_groups(evpi_workspace* ws);
+
+double group_evppi(double** x, double** y, size_t n_samples, size_t n_dims,
+                   size_t n_options, const unsigned int* n_bins_per_dim,
+                   int n_threads);
+
+double group_evppi_ws(double* x, ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                      double* y, ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                      size_t n_samples, size_t n_dims, size_t n_options,
+                      const unsigned int* n_bins_per_dim, evpi_workspace* ws);
+
+/*
+    Percentile bootstrap confidence intervals of the EVPPI of every variable
+    with the bins and binning of the workspace. The bins of each variable
+    are assigned once, then every replicate reweights the samples with
+    Poisson(1) counts (instead of resampling them) while summing them per
+    bin. The counts are derived from `seed`, the replicate and the sample
+    index alone, so the intervals do not depend on the number of threads,
+    which share the replicates.
+
+    `evpi_workspace_reserve_bootstrap` prepares the workspace for up to
+    `n_bootstrap` replicates and returns 0 on success and -1 if the memory
+    could not be allocated. `multi_evppi_bootstrap_ws` writes the lower and
+    upper bound of the `confidence` interval of each variable into `lower`
+    and `upper`, which are NAN if the workspace is not prepared. No
+    significance threshold is applied.
+*/
+int evpi_workspace_reserve_bootstrap(evpi_workspace* ws, size_t n_bootstrap);
+
+void multi_evppi_bootstrap_ws(double* x, ptrdiff_t x_row_stride,
+                              ptrdiff_t x_col_stride, double* y,
+                              ptrdiff_t y_row_stride, ptrdiff_t y_col_stride,
+                              size_t n_samples, size_t n_variables,
+                              size_t n_options, size_t n_bootstrap,
+                              double confidence, uint64_t seed,
+                              evpi_workspace* ws, double* lower, double* upper);
+
+/*
+    Streaming EVPPI for samples, that arrive in chunks or do not fit into
+    memory. The accumulator only keeps the output sums per variable, bin
+    and decision option, so its memory does not depend on the number of
+    samples. The bins are fixed by the bounds `x_min` and `x_max` of every
+    variable (e.g. from a first pass with `evpi_column_ranges`), samples
+    outside are counted in the first or last bin.
+
+    `evpi_accumulator_add` adds a chunk of strided samples (s. above),
+    `evpi_accumulator_merge` adds the sums of another accumulator with the
+    same bins and returns -1 if the bins differ, `evpi_accumulator_result`
+    writes one EVPPI per variable into `out` and `evpi_accumulator_evpi`
+    returns the total EVPI of all samples added so far.
+*/
+typedef struct evpi_accumulator evpi_accumulator;
+
+evpi_accumulator* evpi_accumulator_new(size_t n_variables, size_t n_options,
+                                       unsigned int n_bins, double* x_min,
+                                       double* x_max);
+
+void evpi_accumulator_free(evpi_accumulator* acc);
+
+void evpi_accumulator_add(evpi_accumulator* acc, double* x,
+                          ptrdiff_t x_row_stride, ptrdiff_t x_col_stride,
+                          double* y, ptrdiff_t y_row_stride,
+                          ptrdiff_t y_col_stride, size_t n_samples,
+                          int n_threads);
+
+int evpi_accumulator_merge(evpi_accumulator* acc,
+                           const evpi_accumulator* other);
+
+void evpi_accumulator_result(const evpi_accumulator* acc, double threshold,
+                             double* out);
+
+double evpi_accumulator_evpi(const evpi_accumulator* acc);
+
+/*
+    Updates the running minimum `x_min` and maximum `x_max` of every
+    variable with a chunk of strided samples. Initialize them with INFINITY
+    and -INFINITY before the first chunk.
+*/
+void evpi_column_ranges(double* x, ptrdiff_t x_row_stride,
+                        ptrdiff_t x_col_stride, size_t n_samples,
+                        size_t n_variables, double* x_min, double* x_max,
+                        int n_threads);
+
 #endif
\ No newline at end of file
@@ -5,40 +5,159 @@
 #include <stdio.h>
 #include <stdlib.h>
 
-double **create_c_matrix(double *flat_fortran_array, size_t n_rows,
-                         size_t n_cols) {
-  double *data = malloc(n_cols * n_rows * sizeof(double));
-  double **res = malloc(n_cols * sizeof(double *));
-  for (size_t i = 0; i < n_cols; i++) {
-    res[i] = data + i * n_rows;
-    for (size_t j = 0; j < n_rows; j++) {
-      res[i][j] = flat_fortran_array[j + i * n_rows];
+/*
+  R stores matrices column by column, so `REAL()` of an n x m matrix is a
+  Fortran-ordered array with a row stride of 1 and a column stride of n. It
+  is handed to the strided functions of the C library without copying.
+*/
+
+// workspace, that is kept alive between calls and only grows if needed
+static evpi_workspace *ws = NULL;
+static size_t ws_n_samples = 0;
+static size_t ws_n_options = 0;
+static unsigned int ws_n_bins = 0;
+static int ws_n_threads = 0;
+
+evpi_workspace *get_workspace(size_t n_samples, size_t n_options,
+                              unsigned int n_bins, int n_threads, int binning) {
+  if (ws == NULL || ws_n_samples < n_samples || ws_n_options < n_options ||
+      ws_n_bins != n_bins || ws_n_threads != n_threads) {
+    evpi_workspace_free(ws);
+    ws = evpi_workspace_new(n_samples, n_options, n_bins, n_threads);
+    if (ws == NULL) {
+      ws_n_samples = 0;
+      error("Could not allocate the EVPI workspace.");
     }
+    ws_n_samples = n_samples;
+    ws_n_options = n_options;
+    ws_n_bins = n_bins;
+    ws_n_threads = n_threads;
   }
-  return res;
+  if (evpi_workspace_set_binning(ws, binning) != 0)
+    error("Could not allocate the EVPI workspace.");
+  return ws;
+}
+
+// sample weights or NULL, which weighs all samples equally
+const double *as_weights(SEXP weights) {
+  return isNull(weights) ? NULL : REAL(weights);
 }
 
-SEXP multi_evppi_wrapper(SEXP x, SEXP y, SEXP significance_threshold) {
+SEXP multi_evppi_wrapper(SEXP x, SEXP y, SEXP significance_threshold,
+                         SEXP n_bins, SEXP n_threads, SEXP binning,
+                         SEXP weights) {
   size_t n_samples = nrows(x);
   size_t n_variables = ncols(x);
   size_t n_options = ncols(y);
 
-  double *c_out;
-  double *c_multi_evppi = malloc(n_variables * sizeof(double));
+  evpi_workspace *workspace =
+      get_workspace(n_samples, n_options, asInteger(n_bins),
+                    asInteger(n_threads), asInteger(binning));
 
-  double **xx = create_c_matrix(REAL(x), n_samples, n_variables);
-  double **yy = create_c_matrix(REAL(y), n_samples, n_options);
+  SEXP out = PROTECT(allocVector(REALSXP, n_variables));
 
-  c_multi_evppi = multi_evppi(xx, yy, n_samples, n_variables, n_options,
-                              asReal(significance_threshold));
+  multi_evppi_weighted_ws(REAL(x), 1, n_samples, REAL(y), 1, n_samples,
+                          as_weights(weights), 1, n_samples, n_variables,
+                          n_options, asReal(significance_threshold), workspace,
+                          REAL(out));
 
-  SEXP out = PROTECT(allocVector(REALSXP, n_variables));
-  c_out = REAL(out);
+  UNPROTECT(1);
+  return out;
+}
 
-  for (size_t i = 0; i < n_variables; i++) {
-    c_out[i] = c_multi_evppi[i];
-  }
+SEXP evppi_wrapper(SEXP x, SEXP y, SEXP n_bins, SEXP n_threads, SEXP binning,
+                   SEXP weights) {
+  size_t n_samples = nrows(y);
+  size_t n_options = ncols(y);
+
+  evpi_workspace *workspace =
+      get_workspace(n_samples, n_options, asInteger(n_bins),
+                    asInteger(n_threads), asInteger(binning));
+
+  SEXP out = PROTECT(allocVector(REALSXP, 1));
+  double *c_out = REAL(out);
+  c_out[0] =
+      evppi_weighted_ws(REAL(x), 1, REAL(y), 1, n_samples, as_weights(weights),
+                        1, n_samples, n_options, workspace);
+
+  UNPROTECT(1);
+  return out;
+}
+
+SEXP evpi_wrapper(SEXP y, SEXP n_threads, SEXP weights) {
+  size_t n_samples = nrows(y);
+  size_t n_options = ncols(y);
+
+  evpi_workspace *workspace = get_workspace(
+      n_samples, n_options, 0, asInteger(n_threads), EVPI_BINNING_UNIFORM);
+
+  SEXP out = PROTECT(allocVector(REALSXP, 1));
+  double *c_out = REAL(out);
+  c_out[0] = evpi_weighted_ws(REAL(y), 1, n_samples, as_weights(weights), 1,
+                              n_samples, n_options, workspace);
+
+  UNPROTECT(1);
+  return out;
+}
+
+SEXP group_evppi_wrapper(SEXP x, SEXP y, SEXP n_bins_per_dim, SEXP n_threads) {
+  size_t n_samples = nrows(x);
+  size_t n_dims = ncols(x);
+  size_t n_options = ncols(y);
+
+  evpi_workspace *workspace = get_workspace(
+      n_samples, n_options, 0, asInteger(n_threads), EVPI_BINNING_UNIFORM);
+  if (evpi_workspace_reserve_groups(workspace) != 0)
+    error("Could not allocate the EVPI workspace.");
+
+  SEXP out = PROTECT(allocVector(REALSXP, 1));
+  double *c_out = REAL(out);
+  c_out[0] = group_evppi_ws(
+      REAL(x), 1, n_samples, REAL(y), 1, n_samples, n_samples, n_dims,
+      n_options, (const unsigned int *)INTEGER(n_bins_per_dim), workspace);
 
   UNPROTECT(1);
   return out;
-}
\ No newline at end of file
+}
+
+SEXP multi_evipi_wrapper(SEXP x, SEXP y, SEXP std, SEXP n_bins,
+                         SEXP n_threads) {
+  size_t n_samples = nrows(x);
+  size_t n_variables = ncols(x);
+  size_t n_options = ncols(y);
+  size_t n_std = length(std);
+
+  evpi_workspace *workspace =
+      get_workspace(n_samples, n_options, asInteger(n_bins),
+                    asInteger(n_threads), EVPI_BINNING_UNIFORM);
+
+  // the C library writes all standard deviations of one variable in a row,
+  // which is one column of an n_std x n_variables matrix
+  SEXP out = PROTECT(allocMatrix(REALSXP, n_std, n_variables));
+
+  multi_evipi_ws(REAL(x), 1, n_samples, REAL(y), 1, n_samples, n_samples,
+                 n_variables, n_options, REAL(std), n_std, workspace,
+                 REAL(out));
+
+  UNPROTECT(1);
+  return out;
+}
+
+SEXP evipi_wrapper(SEXP x, SEXP y, SEXP std, SEXP n_bins, SEXP n_threads) {
+  size_t n_samples = nrows(y);
+  size_t n_options = ncols(y);
+  size_t n_std = length(std);
+
+  evpi_workspace *workspace =
+      get_workspace(n_samples, n_options, asInteger(n_bins),
+                    asInteger(n_threads), EVPI_BINNING_UNIFORM);
+
+  SEXP out = PROTECT(allocVector(REALSXP, n_std));
+  double *c_out = REAL(out);
+  for (size_t i = 0; i < n_std; i++)
+    c_out[i] = evipi_ws(REAL(x), 1, REAL(y), 1, n_samples, n_samples, n_options,
+                        REAL(std)[i], workspace);
+
+  UNPROTECT(1);
+  return out;
+}